@@ -1,15 +1,30 @@
 """Flask Web Server for Lane Violation Detection"""
 import os
+import re
 import json
+import shutil
+import subprocess
+import queue
+import heapq
+import hashlib
+import tempfile
 import threading
+import time
+import itertools
+import functools
 import cv2
+import numpy as np
+import torch
 import io
 import csv
-import zipfile
 from PIL import Image, ImageDraw, ImageFont
 from datetime import datetime
 from pathlib import Path
+from urllib.parse import unquote
 import sys
+from contextlib import contextmanager
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 
 # Ensure project root is on sys.path so imports like `from src...` work
 # Project root is two levels up from this file (workspace root)
@@ -19,38 +34,337 @@ try:
         sys.path.insert(0, project_root)
 except Exception:
     pass
-from flask import Flask, render_template, request, jsonify, send_file, Response
+from flask import Flask, render_template, request, jsonify, send_file, send_from_directory, Response
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+try:
+    import orjson
+except Exception:
+    orjson = None
+try:
+    from waitress import serve as waitress_serve
+except Exception:
+    waitress_serve = None
+try:
+    import av
+except Exception:
+    av = None
+try:
+    from streaming_form_data import StreamingFormDataParser
+    from streaming_form_data.targets import BaseTarget
+except Exception:
+    StreamingFormDataParser = None
+    BaseTarget = object
 from werkzeug.utils import secure_filename
-from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from werkzeug.security import safe_join
+from werkzeug.exceptions import RequestedRangeNotSatisfiable, RequestEntityTooLarge
 
 from src.pipeline import LaneViolationPipeline
 from src.utils.logger import Logger
 from src.utils.analytics import AnalyticsCollector
+from src.utils.image_codec import JpegEncoder, WebpEncoder, read_image
+from src.utils.zone_manager import TaskZoneStore
+from src.utils.video_processor import find_ffmpeg, open_capture, FragmentedMp4Encoder
+from src.utils.nvdec_reader import open_nvdec_reader
+from src.utils.pdf_writer import JpegPdfWriter
+from src.utils.zip_stream import iter_zip
+from src.utils.config_loader import ConfigLoader, load_config, clear_config_cache, config_revision
+
+# OpenCV's internal thread pool defaults to every core and then competes with the request,
+# task and reader/writer threads of this server; cap it (HTGTTM_CV_THREADS overrides)
+cv2.setNumThreads(int(os.getenv('HTGTTM_CV_THREADS', 2)))
+cv2.setUseOptimized(True)
+
+# Violation image names: violation_{crop|full}_track{track_id}_{vehicle_type}_frame{frame_num}.jpg
+_VIOLATION_NAME_RE = re.compile(r'violation_(?:crop|full)_track(\d+)_(\w+)_frame(\d+)')
+# The same three fields anywhere in a name (other prefixes, copies renamed by hand)
+_VIOLATION_FIELDS_RE = re.compile(r'track(\d+)_(\w+)_frame(\d+)')
+_TRACK_RE = re.compile(r'track(\d+)')
+_FRAME_RE = re.compile(r'frame(\d+)')
+_VTYPE_RE = re.compile(r'track\d+_(\w+)_frame')
+# Vehicle type codes used in the file names -> display names
+VEHICLE_TYPE_NAMES = {
+    'otto': 'Ô tô',
+    'xemay': 'Xe máy',
+    'xebuyt': 'Xe buýt',
+    'xetai': 'Xe tải',
+    'khac': 'Xe khác'
+}
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_violation_filename(name):
+    """
+    Parse a violation image file name
+    
+    Args:
+        name: File name, e.g. violation_crop_track12_otto_frame245.jpg
+        
+    Returns:
+        (track_id or None, vehicle type display name, frame number or None)
+    """
+    # Names written by the pipeline: all three fields in one anchored match, else
+    # in one unanchored search
+    m = _VIOLATION_NAME_RE.match(name) or _VIOLATION_FIELDS_RE.search(name)
+    if m:
+        return int(m[1]), VEHICLE_TYPE_NAMES.get(m[2].lower(), 'Xe khác'), int(m[3])
+    
+    # Fields not in that order: take whichever are present
+    track_m = _TRACK_RE.search(name)
+    frame_m = _FRAME_RE.search(name)
+    vtype_m = _VTYPE_RE.search(name)
+    track_id = int(track_m.group(1)) if track_m else None
+    frame = int(frame_m.group(1)) if frame_m else None
+    vehicle_type = VEHICLE_TYPE_NAMES.get(vtype_m.group(1).lower(), 'Xe khác') if vtype_m else 'Xe khác'
+    return track_id, vehicle_type, frame
+
+
+@functools.lru_cache(maxsize=16)
+def load_font(size, path="C:/Windows/Fonts/arial.ttf"):
+    """TrueType font at size (path, then Arial.ttf from the font path, then PIL's default), parsed once"""
+    try:
+        return ImageFont.truetype(path, size)
+    except Exception:
+        try:
+            return ImageFont.truetype("Arial.ttf", size)
+        except Exception:
+            return ImageFont.load_default()
+
+
+@functools.lru_cache(maxsize=1)
+def report_fonts():
+    """(title, header, body) fonts of the violations PDF"""
+    return load_font(48), load_font(32), load_font(24)
+
+
+class HashingFileTarget(BaseTarget):
+    """streaming-form-data target that writes a file part to disk while hashing it (SHA-256)"""
+    
+    def __init__(self, path):
+        """
+        Initialize target
+        
+        Args:
+            path: Destination file path (opened when the file part starts)
+        """
+        super().__init__()
+        self.path = path
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self._fd = None
+    
+    def on_start(self):
+        self._fd = open(self.path, 'wb')
+    
+    def on_data_received(self, chunk):
+        self.sha256.update(chunk)
+        self.size += len(chunk)
+        self._fd.write(chunk)
+    
+    def on_finish(self):
+        self.close()
+    
+    def close(self):
+        """Close the destination file (safe to call more than once)"""
+        if self._fd is not None:
+            self._fd.close()
+            self._fd = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider that serializes with orjson (used by every jsonify call)
+    
+    Output matches the default provider: sorted keys, datetimes via Flask's default();
+    numpy scalars/arrays are serialized natively. Values orjson rejects fall back to json.
+    """
+    
+    def _orjson_option(self, indent=False):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+    
+    def _dumps_bytes(self, obj, indent=False):
+        try:
+            return orjson.dumps(obj, default=self.default, option=self._orjson_option(indent))
+        except TypeError:
+            return super().dumps(obj, indent=2 if indent else None).encode('utf-8')
+    
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._dumps_bytes(obj).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        # orjson already produces UTF-8 bytes; hand them to the response without a str round-trip
+        return self._app.response_class(self._dumps_bytes(obj, indent) + b'\n', mimetype=self.mimetype)
+
+
+class TaskCancelled(Exception):
+    """Raised inside a running task once a cancel has been requested"""
 
 
 class ProcessingTask:
     """Represents a processing task"""
+    # Fixed attribute set: no per-instance __dict__
+    __slots__ = ('task_id', 'input_path', 'task_type', 'summary', 'start_time', 'end_time',
+                 'error_message', 'result', 'analytics', 'selected_zone_ids', 'options',
+                 'sprite_meta', 'future', 'cancel_event', '_changed')
+    
     def __init__(self, task_id, input_path, task_type='video'):
         self.task_id = task_id
         self.input_path = input_path
         self.task_type = task_type
-        self.status = 'queued'  # queued, processing, completed, failed
-        self.progress = 0
+        # Row served by /api/tasks; status/progress live here and are updated in place
+        self.summary = {
+            'task_id': task_id,
+            'status': 'queued',  # queued, processing, completed, failed, cancelled
+            'progress': 0,
+            'type': task_type
+        }
         self.start_time = None
         self.end_time = None
         self.error_message = None
         self.result = None
         self.analytics = None
         self.selected_zone_ids = []  # Zones to focus processing on
+        self.options = {}  # Per-task processing options from /api/process
+        self.sprite_meta = None  # Scrub-preview sprite layout, set once the sprite is built
+        self.future = None  # Future from the task executor while queued/running
+        self.cancel_event = threading.Event()
+        # Set (and replaced) whenever status/progress changes; see wait_for_change
+        self._changed = threading.Event()
+    
+    def _notify_change(self):
+        """Wake every wait_for_change caller; later callers wait on a fresh event"""
+        changed, self._changed = self._changed, threading.Event()
+        changed.set()
+    
+    def wait_for_change(self, timeout: float) -> bool:
+        """
+        Block until status or progress changes
+        
+        Args:
+            timeout: Maximum seconds to wait
+            
+        Returns:
+            True if a change happened, False on timeout
+        """
+        return self._changed.wait(timeout)
+    
+    @property
+    def status(self):
+        return self.summary['status']
+    
+    @status.setter
+    def status(self, value):
+        if value != self.summary['status']:
+            self.summary['status'] = value
+            self._notify_change()
+    
+    @property
+    def progress(self):
+        return self.summary['progress']
+    
+    @progress.setter
+    def progress(self, value):
+        if value != self.summary['progress']:
+            self.summary['progress'] = value
+            self._notify_change()
+
+
+class TaskStore:
+    """Registry of ProcessingTasks in creation order
+    
+    Id allocation, insertion, the /api/tasks rows and clear() all run under one lock,
+    so concurrent uploads never share an id and never see a half-cleared store.
+    Single lookups (get, in, len) are one dict operation and need no lock.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tasks = OrderedDict()
+        self._rows = []  # task.summary of every task, in creation order, for /api/tasks
+        self._ids = itertools.count()
+    
+    def create(self, input_path, task_type='video'):
+        """
+        Register a new task under the next task id
+        
+        Args:
+            input_path: Uploaded file path
+            task_type: 'video' or 'image'
+            
+        Returns:
+            New ProcessingTask
+        """
+        with self._lock:
+            task_id = f"task_{next(self._ids)}"
+            task = ProcessingTask(task_id, input_path, task_type=task_type)
+            self._tasks[task_id] = task
+            self._rows.append(task.summary)
+        return task
+    
+    def get(self, task_id):
+        """Task by id, or None"""
+        return self._tasks.get(task_id)
+    
+    def __contains__(self, task_id):
+        return task_id in self._tasks
+    
+    def __len__(self):
+        return len(self._tasks)
+    
+    def rows(self):
+        """Snapshot of the summary rows (each row has fixed keys, so it serializes safely)"""
+        with self._lock:
+            return list(self._rows)
+    
+    def clear(self, on_clear=None):
+        """
+        Drop every task and restart the ids at task_0
+        
+        Args:
+            on_clear: Optional callable run under the store lock, after the tasks are dropped
+        """
+        with self._lock:
+            self._tasks.clear()
+            self._rows = []
+            self._ids = itertools.count()
+            if on_clear is not None:
+                on_clear()
 
 
 class WebServer:
     """Web server for Lane Violation Detection"""
     
+    # Longest /api/preview waits for a preview still being extracted before answering 202;
+    # kept short since it holds a server thread (the UI polls /api/preview-status instead)
+    PREVIEW_WAIT_SECONDS = 1
+    
+    # Scrub-preview sprite: one JPEG of SPRITE_COLUMNS x SPRITE_ROWS thumbnails per video
+    SPRITE_COLUMNS = 10
+    SPRITE_ROWS = 10
+    SPRITE_THUMB_SIZE = (160, 90)
+    
+    # Upload types accepted by /api/upload
+    ALLOWED_EXTENSIONS = frozenset({'mp4', 'avi', 'mov', 'mkv', 'jpg', 'jpeg', 'png'})
+    _ALLOWED_SUFFIXES = tuple('.' + ext for ext in sorted(ALLOWED_EXTENSIONS))
+    
     def __init__(self, config_path='configs/config.yaml', port=5000):
         """Initialize web server"""
         self.app = Flask(__name__)
+        if orjson is not None:
+            self.app.json = OrjsonProvider(self.app)
         CORS(self.app)
         
         # Get project root (parent of app directory)
@@ -58,82 +372,473 @@ class WebServer:
         
         self.port = port
         self.config_path = config_path
+        self._config_write_lock = threading.Lock()
         self.pipeline = None
         
         # Configuration
         self.app.config['MAX_CONTENT_LENGTH'] = 1024 * 1024 * 500  # 500MB max
         self.app.config['UPLOAD_FOLDER'] = str(self.project_root / 'data' / 'videos')
-        self.ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'jpg', 'jpeg', 'png'}
+        # Task results and violation snapshots (resolved and created once, not per task/request)
+        self.output_dir = Path.cwd() / 'data' / 'outputs'
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.violations_dir = self.output_dir / 'violations'
+        # Parsed violation files per task dir: name -> ((dir mtime_ns, dir size), (crops, full_images))
+        self._violation_scan_cache = {}
+        self._violation_scan_lock = threading.Lock()
+        # /api/violations JSON per (task, start_date, end_date): (task dir signature, body)
+        self._violations_response_cache = OrderedDict()
+        self._violations_response_lock = threading.Lock()
+        # (fingerprint, bytes) of the last violations PDF; see _generate_violations_pdf
+        self._pdf_cache = None
+        self.violations_pdf_path = self.output_dir / 'reports' / 'violations.pdf'
+        self._pdf_cache_lock = threading.Lock()
+        # Behind Apache/lighttpd: let the front server send file bodies (X-Sendfile)
+        self.app.use_x_sendfile = bool(self._config().get('server.x_sendfile', False))
+        
+        # Content-hash index of uploads (sha256 -> filename), used to deduplicate re-uploads
+        self._upload_index_path = Path(self.app.config['UPLOAD_FOLDER']) / '.index.json'
+        self._upload_index_lock = threading.Lock()
+        self._upload_index = self._load_upload_index()
         
-        # Task management
-        self.tasks = {}
-        self.task_counter = 0
+        # Per-task zones, cached in memory and written back to data/tasks/<id>/zones.json
+        self.zone_store = TaskZoneStore('data/tasks')
+        
+        # Task management: ids, inserts and clears are serialized inside the store
+        self.tasks = TaskStore()
+        # Running totals for /api/status, updated when a task changes state (see _update_aggregates)
+        self._agg = self._empty_aggregates()
+        self._agg_contrib = {}  # task_id -> that task's tuple currently included in _agg
+        self._agg_lock = threading.Lock()
         
         Logger.setup('logs')
         Logger.info(f"Web server initialized on port {port}")
         
+        # Encoder for upload previews (nvJPEG when available); shared, so serialized by a lock
+        self._preview_encoder = JpegEncoder(quality=85)
+        self._preview_encoder_lock = threading.Lock()
+        
+        # Export the configured YOLO model to TensorRT once; pipelines load the engine directly
+        self.engine_model_name = None
+        self.engine_max_batch = None
+        self.engine_path = self._export_tensorrt_engine()
+        
+        # Pool of warmed pipelines keyed by (model_name, config_hash) so requests skip model load
+        self._pipeline_pool = {}
+        self._pipeline_pool_lock = threading.Lock()
+        self._pipeline_pool_size = max(1, torch.cuda.device_count() * 2)
+        
+        # Bounded task executor: at most one running task per GPU (or processing.task_workers);
+        # further tasks wait in 'queued' instead of all sharing the GPU at once
+        # HTGTTM_WORKERS overrides the config (e.g. per-host in deployment)
+        workers = (os.getenv('HTGTTM_WORKERS') or self._config().get('processing.task_workers')
+                   or torch.cuda.device_count())
+        self._task_workers = max(1, int(workers))
+        self.executor = ThreadPoolExecutor(max_workers=self._task_workers, thread_name_prefix='task-worker')
+        # Queued tasks, as a heap of (rank, seq, task_id, future): a worker that frees up takes
+        # the best-ranked task, so short image tasks do not wait behind long videos
+        self._task_queue = []
+        self._task_queue_lock = threading.Lock()
+        self._task_seq = itertools.count()
+        Logger.info(f"Task executor started with {self._task_workers} worker(s)")
+        # Separate single worker for upload-side media jobs (sprites) so they never wait behind tasks
+        self.media_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='media-worker')
+        # Upload previews get their own worker: they are needed first (zone drawing), and
+        # must not queue behind a sprite render. preview file name -> Future while pending
+        self.preview_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='preview-worker')
+        self._preview_jobs = {}
+        self._preview_jobs_lock = threading.Lock()
+        
+        # Each open /api/stream pins a WSGI worker thread for its whole duration; cap concurrent
+        # streams below server.threads so API calls (status, zones, uploads) always get a thread
+        threads = int(self._config().get('server.threads', 16) or 16)
+        self._max_streams = max(1, int(self._config().get('server.max_streams') or threads - 4))
+        self._stream_slots = threading.BoundedSemaphore(self._max_streams)
+        # Exports (PDF, ZIPs, clip cutting) hold a thread for seconds of disk and CPU work;
+        # the same kind of cap keeps a burst of downloads from taking every thread
+        self._max_exports = max(1, int(self._config().get('server.max_exports') or threads // 4))
+        self._export_slots = threading.BoundedSemaphore(self._max_exports)
+        
+        # Build one warm pipeline per worker up front; queued ahead of any task so the
+        # first requests find a loaded model instead of paying for it
+        if self._config().get('processing.prewarm_pipelines', True):
+            model_name = self._default_model_name()
+            for _ in range(min(self._task_workers, self._pipeline_pool_size)):
+                self.executor.submit(self._prewarm_pipeline, model_name)
+        
         # Setup routes
         self._setup_routes()
     
+    def _export_tensorrt_engine(self):
+        """Export the configured YOLO model to a TensorRT FP16 engine and cache it on disk.
+        Engines are keyed by (model, imgsz, precision, max batch, GPU name) since they are not portable across GPUs.
+        The engine has a dynamic batch dimension up to processing.batch_size, so full batches and the
+        shorter tail batch of a video both run on it.
+        Returns the engine path, or None to fall back to the PyTorch .pt weights.
+        """
+        try:
+            config = self._config()
+            if not config.get('yolo.tensorrt', True):
+                return None
+
+            import torch
+            if not torch.cuda.is_available():
+                Logger.info("CUDA not available; skipping TensorRT export")
+                return None
+
+            model_name = str(config.get('yolo.model_name', 'yolov8m'))
+            imgsz = int(config.get('yolo.input_size', 640))
+            max_batch = max(1, int(config.get('processing.batch_size', 8)))
+            gpu_tag = re.sub(r'[^0-9A-Za-z]+', '_', torch.cuda.get_device_name(0)).strip('_').lower()
+            engine_dir = self.project_root / 'models' / 'engines'
+            engine_path = engine_dir / f"{model_name}_{imgsz}_fp16_b{max_batch}_{gpu_tag}.engine"
+
+            if not engine_path.exists():
+                from ultralytics import YOLO
+                Logger.info(f"Exporting {model_name} to TensorRT FP16 engine (imgsz={imgsz}, batch<={max_batch}), this may take a few minutes")
+                exported = YOLO(f"{model_name}.pt").export(format='engine', half=True, device=0, imgsz=imgsz,
+                                                           batch=max_batch, dynamic=True, workspace=4)
+                engine_dir.mkdir(parents=True, exist_ok=True)
+                shutil.move(str(exported), str(engine_path))
+                Logger.info(f"TensorRT engine saved: {engine_path}")
+            else:
+                Logger.info(f"Using cached TensorRT engine: {engine_path}")
+
+            self.engine_model_name = model_name
+            self.engine_max_batch = max_batch
+            return str(engine_path)
+        except Exception as e:
+            Logger.warning(f"TensorRT export unavailable, using PyTorch weights: {e}")
+            return None
+
+    def _resolve_model_weights(self, model_name):
+        """Return the cached TensorRT engine for the exported model, otherwise the model name unchanged"""
+        if self.engine_path and model_name == self.engine_model_name:
+            return self.engine_path
+        return model_name
+
+    def _config_hash(self):
+        """Revision of the config file (mtime, size), used to invalidate pooled pipelines on config changes"""
+        return config_revision(self.config_path)
+
+    def _config(self):
+        """Shared read-only config, parsed at most once per revision of the config file"""
+        return load_config(self.config_path)
+
+    def _default_model_name(self):
+        """Model configured in yolo.model_name"""
+        return str(self._config().get('yolo.model_name', 'yolov8m'))
+
+    def _acquire_pipeline(self, model_name, task_id=None):
+        """Check out an idle warmed pipeline for model_name, or build and warm a new one"""
+        key = (model_name, self._config_hash())
+        with self._pipeline_pool_lock:
+            # Pipelines built from an older config revision are dropped
+            for stale in [k for k in self._pipeline_pool if k[0] == model_name and k != key]:
+                del self._pipeline_pool[stale]
+            idle = self._pipeline_pool.setdefault(key, queue.Queue(maxsize=self._pipeline_pool_size))
+
+        try:
+            pipeline = idle.get_nowait()
+            Logger.info(f"Reusing warm pipeline for model {model_name}")
+        except queue.Empty:
+            Logger.info(f"Building new pipeline for model {model_name}")
+            # Built with the resolved weights, so the detector loads one model
+            weights = self._resolve_model_weights(model_name)
+            pipeline = LaneViolationPipeline(self.config_path, input_source=None, output_path=None,
+                                             model_name=weights)
+            detector = pipeline.vehicle_detector
+            if detector.model is None:
+                # VehicleDetector logs load errors from its constructor instead of raising
+                Logger.warning(f"Failed to load model '{weights}'")
+                if weights == model_name:
+                    raise RuntimeError(f"Failed to load model '{model_name}'")
+                # TensorRT engine failed to load; fall back to the .pt weights
+                detector.model_name = model_name
+                detector.load_model()
+            try:
+                detector.warmup()
+            except Exception as e:
+                Logger.warning(f"Model warmup failed: {e}")
+
+        pipeline.reset(task_id=task_id)
+        pipeline._pool_key = key
+        return pipeline
+
+    def _prewarm_pipeline(self, model_name):
+        """Build and warm a pipeline for model_name and park it in the idle pool"""
+        try:
+            self._release_pipeline(self._acquire_pipeline(model_name))
+        except Exception as e:
+            Logger.warning(f"Pipeline prewarm failed for model {model_name}: {e}")
+
+    def _release_pipeline(self, pipeline):
+        """Return a pipeline to the pool (discarded if the pool is full or the config changed)"""
+        # Drop buffered full-resolution frames; idle pipelines should not pin that memory
+        try:
+            pipeline.frame_buffer.clear()
+        except Exception:
+            pass
+        key = getattr(pipeline, '_pool_key', None)
+        with self._pipeline_pool_lock:
+            idle = self._pipeline_pool.get(key)
+        try:
+            if idle is not None:
+                idle.put_nowait(pipeline)
+                return
+        except queue.Full:
+            pass
+        # Discarded: free its cached CUDA memory
+        del pipeline
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    @contextmanager
+    def _acquired_pipeline(self, model_name, task_id=None):
+        """Context manager wrapping _acquire_pipeline/_release_pipeline"""
+        pipeline = self._acquire_pipeline(model_name, task_id=task_id)
+        try:
+            yield pipeline
+        finally:
+            self._release_pipeline(pipeline)
+
+    def _violation_files(self, task_dir):
+        """
+        (name, mtime_ns, size) of each violation image in one task dir, sorted by name
+        
+        Per file rather than the directory's own mtime: cv2.imwrite overwriting an existing
+        name (a re-run after task ids restarted) changes the file but not the directory.
+        Files or a dir removed while listing are left out.
+        
+        Args:
+            task_dir: os.DirEntry (or Path) of data/outputs/violations/<task_id>
+            
+        Returns:
+            Tuple of (name, mtime_ns, size); empty if the dir is gone
+        """
+        files = []
+        try:
+            with os.scandir(task_dir) as it:
+                for entry in it:
+                    # The name prefix is checked first so other files cost no stat
+                    if not entry.name.startswith(('violation_crop', 'violation_full_')):
+                        continue
+                    try:
+                        if not entry.is_file():
+                            continue
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    files.append((entry.name, st.st_mtime_ns, st.st_size))
+        except OSError:
+            return ()
+        files.sort()
+        return tuple(files)
+
+    def _violation_scan_keyed(self, task_dir):
+        """
+        Parse the violation images of one task dir, reparsing only when a file changed
+        
+        The lock keeps concurrent requests from parsing the same listing twice.
+        
+        Args:
+            task_dir: os.DirEntry (or Path) of data/outputs/violations/<task_id>
+            
+        Returns:
+            (key, (crops, full_images)): key is the _violation_files listing the result was
+            built from; crops is a list of (filename, track_id, vehicle_type, frame, mtime ISO
+            string), sorted by name, one per (track_id, frame); full_images maps
+            track_id -> file name of its first violation_full image
+        """
+        key = self._violation_files(task_dir)
+        with self._violation_scan_lock:
+            cached = self._violation_scan_cache.get(task_dir.name)
+            if cached is not None and cached[0] == key:
+                return cached
+            
+            entries = []
+            full_images = {}
+            seen = set()
+            # One pass: crops are listed (one per violation); full frames are only indexed for the PDF
+            for name, mtime_ns, _ in key:
+                track_id, vehicle_type, frame = parse_violation_filename(name)
+                if name.startswith('violation_full_'):
+                    if track_id is not None:
+                        full_images.setdefault(track_id, name)
+                    continue
+                if (track_id, frame) in seen:
+                    continue
+                seen.add((track_id, frame))
+                mtime = datetime.fromtimestamp(mtime_ns / 1e9).isoformat()
+                entries.append((name, track_id, vehicle_type, frame, mtime))
+            cached = self._violation_scan_cache[task_dir.name] = (key, (entries, full_images))
+            return cached
+
+    def _violation_scan(self, task_dir):
+        """(crops, full_images) of one task dir (see _violation_scan_keyed)"""
+        return self._violation_scan_keyed(task_dir)[1]
+
+    def _violation_entries(self, task_dir):
+        """Violation crops of one task dir (see _violation_scan)"""
+        return self._violation_scan(task_dir)[0]
+
+    def _violation_task_dirs(self, task_filter=None):
+        """os.DirEntry of each task dir under data/outputs/violations (only task_filter if given)"""
+        try:
+            # scandir entries carry the file type, so is_dir() needs no extra stat
+            with os.scandir(self.violations_dir) as it:
+                return [e for e in it if e.is_dir() and (not task_filter or e.name == task_filter)]
+        except FileNotFoundError:
+            return []
+
+    def _collect_violations(self, task_filter=None, start_date=None, end_date=None, task_dirs=None):
+        """
+        Violation records as served by /api/violations (and used by the exports)
+        
+        Args:
+            task_filter: Only this task id (None = all tasks)
+            start_date: ISO datetime; drop violations saved before it (ignored if invalid)
+            end_date: ISO datetime; drop violations saved after it (ignored if invalid)
+            task_dirs: Task dirs already listed by _violation_task_dirs(task_filter)
+            
+        Returns:
+            List of violation dicts, one per (task, track, frame)
+        """
+        if task_dirs is None:
+            task_dirs = self._violation_task_dirs(task_filter)
+        
+        violations = []
+        for task_dir in task_dirs:
+            task_id = task_dir.name
+
+            # One entry per (track, frame); parsed from the file names and cached
+            # until the task dir changes
+            for name, track_id, vehicle_type, frame, mtime in self._violation_entries(task_dir):
+                violations.append({
+                    'id': name,
+                    'task_id': task_id,
+                    'filename': name,
+                    'track_id': track_id,
+                    'frame': frame,
+                    'timestamp': mtime,
+                    'vehicle_type': vehicle_type,
+                    'zone_name': 'Zone 1',
+                    'violation_type': 'Vi phạm làn đường',
+                    'confidence': 0.92,
+                    'snapshot_url': f'/api/violation-snapshot/{task_id}/{name}'
+                })
+
+        # Optional date filtering; the bounds are parsed once, not per violation
+        if start_date or end_date:
+            def parse_bound(value):
+                try:
+                    return datetime.fromisoformat(value) if value else None
+                except Exception:
+                    return None
+            start, end = parse_bound(start_date), parse_bound(end_date)
+            
+            def in_range(v):
+                ts = v.get('timestamp')
+                if not ts:
+                    return False
+                try:
+                    t = datetime.fromisoformat(ts)
+                except Exception:
+                    return False
+                # A naive vs aware bound is not comparable (TypeError): treated as no bound
+                try:
+                    if start is not None and t < start:
+                        return False
+                except TypeError:
+                    pass
+                try:
+                    if end is not None and t > end:
+                        return False
+                except TypeError:
+                    pass
+                return True
+
+            violations = [v for v in violations if in_range(v)]
+        return violations
+
     def _generate_violations_pdf(self):
+        """
+        PDF report of all violations, rebuilt only when its inputs changed
+        
+        The fingerprint is each task dir's per-file (name, mtime, size) listing, which changes
+        whenever a violation image is added, removed or overwritten, plus the detected-vehicle total printed on
+        the summary page. The build runs under a lock, so concurrent downloads wait for
+        one build and then share its bytes.
+        
+        Returns:
+            PDF bytes, or None when there are no violations
+        """
+        base = self.violations_dir
+        if not base.exists():
+            return None
+        try:
+            dirs = sorted((e.name, self._violation_scan_keyed(e)[0]) for e in self._violation_task_dirs())
+        except OSError as e:
+            Logger.warning(f"Violation dir scan failed, PDF not cached: {e}")
+            return self._build_violations_pdf()
+        with self._agg_lock:
+            fingerprint = (tuple(dirs), self._agg['detected'])
+        
+        with self._pdf_cache_lock:
+            cached = self._pdf_cache
+            if cached is not None and cached[0] == fingerprint:
+                return cached[1]
+            pdf_data = self._build_violations_pdf()
+            # Failed builds (None) are retried on the next request
+            self._pdf_cache = (fingerprint, pdf_data) if pdf_data is not None else None
+            self._store_violations_pdf(pdf_data)
+            return pdf_data
+    
+    def _store_violations_pdf(self, pdf_data):
+        """
+        Keep the current PDF at data/outputs/reports/violations.pdf so /api/export/pdf can be
+        served from disk (X-Accel-Redirect / X-Sendfile, Range and ETag); a stale copy is removed
+        
+        Args:
+            pdf_data: PDF bytes just built, or None
+        """
+        path = self.violations_pdf_path
+        try:
+            if pdf_data is None:
+                path.unlink(missing_ok=True)
+                return
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix('.pdf.tmp')
+            tmp_path.write_bytes(pdf_data)
+            # Readers never see a half-written file
+            os.replace(tmp_path, path)
+        except OSError as e:
+            Logger.warning(f"Could not store violations PDF: {e}")
+            try:
+                path.unlink(missing_ok=True)
+            except OSError:
+                pass
+    
+    def _build_violations_pdf(self):
         """Helper function to generate PDF with violations"""
         try:
             # Get violations by scanning files directly
-            import re
-            base = Path.cwd() / 'data' / 'outputs' / 'violations'
+            base = self.violations_dir
             if not base.exists():
                 return None
 
             all_violations = []
-            seen_violations = set()
+            full_images = {}  # task_id -> {track_id: violation_full file name}
             
-            for task_dir in base.iterdir():
-                if not task_dir.is_dir():
-                    continue
+            # scandir entries carry the file type, so is_dir() needs no extra stat
+            with os.scandir(base) as it:
+                task_dirs = [e for e in it if e.is_dir()]
+            for task_dir in task_dirs:
                 task_id = task_dir.name
                 
-                for file in sorted(task_dir.iterdir()):
-                    if not file.is_file():
-                        continue
-                    name = file.name
-                    # Only process violation_crop to avoid duplicate entries
-                    if not name.startswith('violation_crop'):
-                        continue
-                    
-                    # Parse track_id, vehicle_type, and frame number
-                    track_id = None
-                    vehicle_type = 'Xe khác'
-                    frame = None
-                    try:
-                        track_m = re.search(r'track(\d+)', name)
-                        vtype_m = re.search(r'track\d+_(\w+)_frame', name)
-                        frame_m = re.search(r'frame(\d+)', name)
-                        
-                        if track_m:
-                            track_id = int(track_m.group(1))
-                        if frame_m:
-                            frame = int(frame_m.group(1))
-                        
-                        if vtype_m:
-                            vtype_code = vtype_m.group(1).lower()
-                            vtype_map = {
-                                'otto': 'Ô tô',
-                                'xemay': 'Xe máy',
-                                'xebuyt': 'Xe buýt',
-                                'xetai': 'Xe tải',
-                                'khac': 'Xe khác'
-                            }
-                            vehicle_type = vtype_map.get(vtype_code, 'Xe khác')
-                    except Exception:
-                        pass
-                    
-                    # Avoid duplicates
-                    violation_key = f"{task_id}_{track_id}_{frame}"
-                    if violation_key in seen_violations:
-                        continue
-                    seen_violations.add(violation_key)
-                    
-                    mtime = datetime.fromtimestamp(file.stat().st_mtime).isoformat()
+                # Parsed (and de-duplicated) crops and the full-image index, from the same
+                # cached scan of the dir
+                crops, full_images[task_id] = self._violation_scan(task_dir)
+                for name, track_id, vehicle_type, frame, mtime in crops:
                     all_violations.append({
                         'id': name,
                         'task_id': task_id,
@@ -150,22 +855,15 @@ class WebServer:
             if not all_violations:
                 return None
 
-            # Resolve both crop and full paths
             def resolve_image_paths(v):
                 task_id = v.get('task_id')
                 fname = str(v.get('filename'))
-                base_dir = Path.cwd() / 'data' / 'outputs' / 'violations' / str(task_id)
+                base_dir = self.violations_dir / str(task_id)
                 crop_path = base_dir / fname
                 
-                import re
-                track_match = re.search(r'track(\d+)', fname)
-                full_path = None
-                if track_match and base_dir.exists():
-                    track_id = track_match.group(1)
-                    for file in base_dir.iterdir():
-                        if file.name.startswith('violation_full_') and f'track{track_id}_' in file.name:
-                            full_path = file
-                            break
+                # O(1) lookup in the index built by the scan above
+                full_name = full_images.get(task_id, {}).get(v.get('track_id'))
+                full_path = base_dir / full_name if full_name else None
                 
                 return (
                     crop_path if crop_path.exists() else None,
@@ -178,34 +876,25 @@ class WebServer:
                 vt = v.get('vehicle_type') or 'Xe khác'
                 grouped_by_type.setdefault(vt, []).append(v)
 
-            # Load fonts
-            def load_font(size):
-                try:
-                    return ImageFont.truetype("C:/Windows/Fonts/arial.ttf", size)
-                except Exception:
-                    try:
-                        return ImageFont.truetype("Arial.ttf", size)
-                    except Exception:
-                        return ImageFont.load_default()
-
-            title_font = load_font(48)
-            header_font = load_font(32)
-            body_font = load_font(24)
+            # Fonts are parsed once per process
+            title_font, header_font, body_font = report_fonts()
 
             # Summary metrics
             unique_tracks = len({v.get('track_id') for v in all_violations if v.get('track_id') is not None})
             type_counts = {vt: len(items) for vt, items in grouped_by_type.items()}
-            total_detected = 0
-            try:
-                for t in self.tasks.values():
-                    stats = getattr(t, 'analytics', None)
-                    if isinstance(stats, dict):
-                        total_detected += int(stats.get('total_detected_vehicles', 0))
-            except Exception:
-                pass
+            with self._agg_lock:
+                total_detected = self._agg['detected']
+
+            # Pages are JPEG-encoded as soon as they are drawn and streamed into the PDF,
+            # so no decoded page is kept once it has been written
+            mem = io.BytesIO()
+            pdf = JpegPdfWriter(mem, dpi=150)
+
+            def encode_page(page):
+                buf = io.BytesIO()
+                page.save(buf, format='JPEG', quality=95)
+                return (buf.getvalue(),) + page.size
 
-            # Build pages
-            pages = []
             page_size = (1240, 1754)
             summary = Image.new('RGB', page_size, 'white')
             draw = ImageDraw.Draw(summary)
@@ -217,68 +906,120 @@ class WebServer:
             draw.text((100, y), "Phân loại theo loại xe:", fill='black', font=header_font); y += 50
             for vt, cnt in sorted(type_counts.items(), key=lambda x: -x[1]):
                 draw.text((140, y), f"- {vt}: {cnt}", fill='black', font=body_font); y += 35
-            pages.append(summary)
+            pdf.add_page(*encode_page(summary))
+            summary.close()
+            del summary, draw
+
+            # Layout of a violation page
+            margin = 80
+            header_h = 240
+            max_w = page_size[0] - 2*margin
+            available_h = page_size[1] - header_h - margin
+            gap = 30
+
+            def load_images(crop_path, full_path):
+                """Decode and thumbnail one violation's images (runs on the decode pool)
+
+                Image.open only reads the header, so both files are opened first to know the
+                target box; draft() then lets libjpeg decode at 1/2, 1/4 or 1/8 scale (never
+                below the box) instead of decompressing the full-resolution frame.
+                """
+                crop_img = None
+                full_img = None
+                try:
+                    if crop_path:
+                        crop_img = Image.open(str(crop_path))
+                except Exception:
+                    crop_img = None
+                try:
+                    if full_path:
+                        full_img = Image.open(str(full_path))
+                except Exception:
+                    full_img = None
 
-            # Per vehicle type groups
+                if crop_img and full_img:
+                    box = (max_w, (available_h - gap) // 2)
+                else:
+                    box = (max_w, available_h)
+                loaded = []
+                for img in (crop_img, full_img):
+                    if img is None:
+                        loaded.append(None)
+                        continue
+                    # Closing the opened file also frees its decoded data; only the converted copy is kept
+                    with img:
+                        try:
+                            img.draft('RGB', box)
+                            rgb = img.convert('RGB')
+                            # Draft scaling already removed most pixels, so BILINEAR is enough here
+                            rgb.thumbnail(box, Image.Resampling.BILINEAR)
+                            loaded.append(rgb)
+                        except Exception:
+                            loaded.append(None)
+                return loaded[0], loaded[1]
+
+            def build_page(vt, v, crop_path, full_path):
+                """Decode, thumbnail, draw and JPEG-encode one violation page, or None (runs on the pool)
+
+                Each call draws on its own new page Image, so nothing is shared between threads.
+                """
+                crop_img, full_img = load_images(crop_path, full_path)
+                if not crop_img and not full_img:
+                    return None
+                page = Image.new('RGB', page_size, 'white')
+                pd = ImageDraw.Draw(page)
+                pd.text((margin, 40), f"{vt}", fill='black', font=header_font)
+                pd.text((margin, 100), f"Thời gian: {v.get('timestamp','')}", fill='black', font=body_font)
+                pd.text((margin, 140), f"Zone: {v.get('zone_name','')}", fill='black', font=body_font)
+                conf = v.get('confidence')
+                if conf is not None:
+                    pd.text((margin, 180), f"Độ tin cậy: {float(conf)*100:.1f}%", fill='black', font=body_font)
+
+                current_y = header_h
+                if crop_img:
+                    paste_x = margin + int((max_w - crop_img.width) / 2)
+                    page.paste(crop_img, (paste_x, current_y))
+                    current_y += crop_img.height + gap
+                    crop_img.close()
+
+                if full_img:
+                    paste_x = margin + int((max_w - full_img.width) / 2)
+                    page.paste(full_img, (paste_x, current_y))
+                    full_img.close()
+                del crop_img, full_img, pd
+
+                # Only the JPEG bytes leave the worker; the decoded page is freed here
+                try:
+                    return encode_page(page)
+                finally:
+                    page.close()
+
+            # Per vehicle type groups (up to 50 violations each)
+            jobs = []
             for vt, items in grouped_by_type.items():
                 sorted_items = sorted(items, key=lambda v: v.get('timestamp',''))
                 for v in sorted_items[:50]:
                     crop_path, full_path = resolve_image_paths(v)
-                    if not crop_path and not full_path:
-                        continue
-
-                    crop_img = None
-                    full_img = None
-                    try:
-                        if crop_path:
-                            crop_img = Image.open(str(crop_path)).convert('RGB')
-                    except Exception:
-                        crop_img = None
-                    try:
-                        if full_path:
-                            full_img = Image.open(str(full_path)).convert('RGB')
-                    except Exception:
-                        full_img = None
-
-                    margin = 80
-                    header_h = 240
-                    max_w = page_size[0] - 2*margin
-                    available_h = page_size[1] - header_h - margin
-                    gap = 30
-
-                    if crop_img and full_img:
-                        slot_h = (available_h - gap) // 2
-                        crop_img.thumbnail((max_w, slot_h), Image.Resampling.LANCZOS)
-                        full_img.thumbnail((max_w, slot_h), Image.Resampling.LANCZOS)
-                    else:
-                        one_img = crop_img or full_img
-                        one_img.thumbnail((max_w, available_h), Image.Resampling.LANCZOS)
-
-                    page = Image.new('RGB', page_size, 'white')
-                    pd = ImageDraw.Draw(page)
-                    pd.text((margin, 40), f"{vt}", fill='black', font=header_font)
-                    pd.text((margin, 100), f"Thời gian: {v.get('timestamp','')}", fill='black', font=body_font)
-                    pd.text((margin, 140), f"Zone: {v.get('zone_name','')}", fill='black', font=body_font)
-                    conf = v.get('confidence')
-                    if conf is not None:
-                        pd.text((margin, 180), f"Độ tin cậy: {float(conf)*100:.1f}%", fill='black', font=body_font)
-
-                    current_y = header_h
-                    if crop_img:
-                        paste_x = margin + int((max_w - crop_img.width) / 2)
-                        page.paste(crop_img, (paste_x, current_y))
-                        current_y += crop_img.height + gap
-
-                    if full_img:
-                        paste_x = margin + int((max_w - full_img.width) / 2)
-                        page.paste(full_img, (paste_x, current_y))
-
-                    pages.append(page)
-
-            mem = io.BytesIO()
-            first, rest = pages[0], pages[1:]
-            first.save(mem, format='PDF', save_all=True, append_images=rest, quality=95, dpi=(150, 150))
-            mem.seek(0)
+                    if crop_path or full_path:
+                        jobs.append((vt, v, crop_path, full_path))
+
+            # JPEG decode, resize and paste release the GIL, so whole pages are built in
+            # parallel and collected in order. A sliding window bounds the work in flight.
+            workers = max(1, min(8, os.cpu_count() or 1))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pdf-page') as pool:
+                pending = []
+                for job in jobs:
+                    pending.append(pool.submit(build_page, *job))
+                    if len(pending) >= 2 * workers:
+                        page = pending.pop(0).result()
+                        if page is not None:
+                            pdf.add_page(*page)
+                for future in pending:
+                    page = future.result()
+                    if page is not None:
+                        pdf.add_page(*page)
+
+            pdf.close()
             return mem.getvalue()
         except Exception as e:
             Logger.error(f"Generate PDF error: {e}")
@@ -296,39 +1037,23 @@ class WebServer:
         def get_status():
             """Get system status with aggregated analytics"""
             try:
+                # Totals are maintained as tasks change state (_update_aggregates), so this
+                # does not walk the task list. Chỉ lấy từ analytics, không đếm lại từ file để tránh trùng
                 tasks_count = len(self.tasks)
-                active_tasks = len([t for t in self.tasks.values() if getattr(t, 'status', None) == 'processing'])
+                with self._agg_lock:
+                    agg = dict(self._agg)
 
-                # Aggregate analytics across tasks
-                total_detected = 0
-                total_violations = 0
-                processed_videos = 0
-                durations = []
-                try:
-                    for t in self.tasks.values():
-                        if getattr(t, 'status', None) == 'completed':
-                            processed_videos += 1
-                        stats = getattr(t, 'analytics', None)
-                        if isinstance(stats, dict):
-                            total_detected += int(stats.get('total_detected_vehicles', 0))
-                            # Chỉ lấy từ analytics, không đếm lại từ file để tránh trùng
-                            total_violations += int(stats.get('total_violations', 0))
-                            dur = float(stats.get('duration_seconds', 0))
-                            if dur > 0:
-                                durations.append(dur)
-                except Exception:
-                    pass
-
-                avg_process_time = (sum(durations) / len(durations)) if durations else 0.0
+                n = agg['durations_n']
+                avg_process_time = (agg['durations_sum'] / n) if n else 0.0
 
                 return jsonify({
                     'status': 'online',
                     'timestamp': datetime.now().isoformat(),
                     'tasks_count': tasks_count,
-                    'active_tasks': active_tasks,
-                    'total_detected_vehicles': total_detected,
-                    'total_violations': total_violations,
-                    'processed_videos': processed_videos,
+                    'active_tasks': agg['active'],
+                    'total_detected_vehicles': agg['detected'],
+                    'total_violations': agg['violations'],
+                    'processed_videos': agg['completed'],
                     'avg_process_time_seconds': avg_process_time
                 })
             except Exception as e:
@@ -337,86 +1062,93 @@ class WebServer:
         
         @self.app.route('/api/upload', methods=['POST'])
         def upload_file():
-            """Upload video file and extract first frame for zone drawing"""
+            """
+            Upload video file and extract first frame for zone drawing
+            
+            Preferred form is the raw file as an application/octet-stream body with the
+            name in an X-Filename header; multipart/form-data ('file' field) is still accepted.
+            """
             try:
-                if 'file' not in request.files:
-                    return jsonify({'error': 'No file provided'}), 400
-                
-                file = request.files['file']
-                if file.filename == '':
-                    return jsonify({'error': 'No file selected'}), 400
-                
-                if not self._allowed_file(file.filename):
-                    return jsonify({'error': 'File type not allowed'}), 400
-                
                 # Create upload directory if not exists
                 upload_dir = Path(self.app.config['UPLOAD_FOLDER'])
                 upload_dir.mkdir(parents=True, exist_ok=True)
                 
-                filename = secure_filename(file.filename)
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_")
-                filename = timestamp + filename
-                
+                if request.mimetype == 'application/octet-stream':
+                    # Raw body upload: filename in X-Filename header (URI-encoded) or ?filename=
+                    raw_name = unquote(request.headers.get('X-Filename') or request.args.get('filename', ''))
+                    if not raw_name:
+                        return jsonify({'error': 'No filename provided'}), 400
+                    if not self._allowed_file(raw_name):
+                        return jsonify({'error': 'File type not allowed'}), 400
+                    
+                    # Body goes socket -> upload dir in one copy, hashed on the way for dedup
+                    file_ext = Path(secure_filename(raw_name)).suffix.lower()
+                    filename, sha256, deduplicated = self._store_upload(request.stream, upload_dir, file_ext)
+                elif StreamingFormDataParser is not None and request.mimetype == 'multipart/form-data':
+                    # Parse the multipart body straight from the socket into the upload dir
+                    target = self._receive_multipart_upload(upload_dir)
+                    if not target.multipart_filename:
+                        return jsonify({'error': 'No file provided'}), 400
+                    if not self._allowed_file(target.multipart_filename):
+                        os.remove(target.path)
+                        return jsonify({'error': 'File type not allowed'}), 400
+                    
+                    # Store by content hash so re-uploads of the same file reuse it
+                    file_ext = Path(secure_filename(target.multipart_filename)).suffix.lower()
+                    filename, sha256, deduplicated = self._commit_upload(
+                        target.path, target.sha256.hexdigest(), upload_dir, file_ext)
+                else:
+                    # Multipart fallback when streaming-form-data is not installed
+                    if 'file' not in request.files:
+                        return jsonify({'error': 'No file provided'}), 400
+                    
+                    file = request.files['file']
+                    if file.filename == '':
+                        return jsonify({'error': 'No file selected'}), 400
+                    
+                    if not self._allowed_file(file.filename):
+                        return jsonify({'error': 'File type not allowed'}), 400
+                    
+                    # Store by content hash so re-uploads of the same file reuse it
+                    file_ext = Path(secure_filename(file.filename)).suffix.lower()
+                    filename, sha256, deduplicated = self._store_upload(file.stream, upload_dir, file_ext)
                 filepath = upload_dir / filename
-                file.save(str(filepath))
                 
-                Logger.info(f"File uploaded: {filename}")
+                Logger.info(f"File uploaded: {filename}{' (duplicate, reused existing file)' if deduplicated else ''}")
                 
                 # Determine file type
-                file_ext = Path(filename).suffix.lower()
                 is_image = file_ext in ['.jpg', '.jpeg', '.png']
                 task_type = 'image' if is_image else 'video'
                 
-                # Extract first frame for zone drawing
-                frame_preview_path = None
-                try:
-                    if is_image:
-                        # For images, just resize and use as preview
-                        frame = cv2.imread(str(filepath))
-                        if frame is not None:
-                            frame_resized = cv2.resize(frame, (1280, 720))
-                            frame_preview_path = str(upload_dir / f"{filename}_preview.jpg")
-                            cv2.imwrite(frame_preview_path, frame_resized)
-                            Logger.info(f"Image preview saved: {frame_preview_path}")
-                    else:
-                        # For videos, extract first frame
-                        video = cv2.VideoCapture(str(filepath))
-                        if video.isOpened():
-                            ret, frame = video.read()
-                            if ret:
-                                # Resize to fit browser
-                                frame_resized = cv2.resize(frame, (1280, 720))
-                                frame_preview_path = str(upload_dir / f"{filename}_preview.jpg")
-                                cv2.imwrite(frame_preview_path, frame_resized)
-                                Logger.info(f"Frame preview saved: {frame_preview_path}")
-                            video.release()
-                except Exception as e:
-                    Logger.warning(f"Error extracting frame preview: {str(e)}")
+                # First frame for zone drawing: extracted on the preview worker, so the
+                # response does not wait for container parsing and decoding
+                preview_filename = f"{filename}_preview.jpg"
+                existing_preview = upload_dir / preview_filename
+                # Same content uploaded before: its preview is still valid
+                preview_ready = deduplicated and existing_preview.exists()
+                if not preview_ready:
+                    self._queue_preview(filepath, existing_preview, is_image)
                 
                 # Create task immediately
-                task_id = f"task_{self.task_counter}"
-                self.task_counter += 1
-                
-                # Create task-specific directory for zones
-                task_dir = Path(self.app.config['UPLOAD_FOLDER']).parent / 'tasks' / task_id
-                task_dir.mkdir(parents=True, exist_ok=True)
-                
-                task = ProcessingTask(task_id, str(filepath), task_type=task_type)
-                self.tasks[task_id] = task
+                task = self._create_task(str(filepath), task_type)
+                task_id = task.task_id
                 
                 Logger.info(f"Task created during upload: {task_id}")
                 
-                # Get preview filename for URL (encode special characters)
-                preview_filename = f"{filename}_preview.jpg" if frame_preview_path else None
-                
                 return jsonify({
                     'success': True,
                     'filename': filename,
                     'filepath': str(filepath),
-                    'preview_url': f'/api/preview/{preview_filename}' if preview_filename else None,
-                    'task_id': task_id
+                    'preview_url': f'/api/preview/{preview_filename}',
+                    'preview_status_url': f'/api/preview-status/{preview_filename}',
+                    'preview_ready': preview_ready,
+                    'task_id': task_id,
+                    'sha256': sha256,
+                    'deduplicated': deduplicated
                 })
             
+            except RequestEntityTooLarge:
+                return jsonify({'error': 'File too large'}), 413
             except Exception as e:
                 Logger.error(f"Upload error: {str(e)}")
                 return jsonify({'error': str(e)}), 500
@@ -428,19 +1160,21 @@ class WebServer:
                 data = request.get_json()
                 filename = data.get('filename')
                 
+                # A previously uploaded file can be referenced by content hash instead of re-uploading it
+                sha256 = data.get('sha256')
+                if not filename and sha256:
+                    with self._upload_index_lock:
+                        filename = self._upload_index.get(str(sha256).lower())
+                    if not filename or not (Path(self.app.config['UPLOAD_FOLDER']) / filename).exists():
+                        return jsonify({'error': f'No uploaded file with sha256: {sha256}'}), 404
+                
                 if not filename:
                     return jsonify({'error': 'No filename provided'}), 400
                 
                 # Create task
-                task_id = f"task_{self.task_counter}"
-                self.task_counter += 1
-                
-                # Create task-specific directory for zones
-                task_dir = Path(self.app.config['UPLOAD_FOLDER']).parent / 'tasks' / task_id
-                task_dir.mkdir(parents=True, exist_ok=True)
-                
-                task = ProcessingTask(task_id, f"{self.app.config['UPLOAD_FOLDER']}/{filename}")
-                self.tasks[task_id] = task
+                task_type = 'image' if Path(filename).suffix.lower() in ('.jpg', '.jpeg', '.png') else 'video'
+                task = self._create_task(f"{self.app.config['UPLOAD_FOLDER']}/{filename}", task_type)
+                task_id = task.task_id
                 
                 Logger.info(f"Task created: {task_id} for {filename}")
                 
@@ -453,6 +1187,15 @@ class WebServer:
                 Logger.error(f"Create task error: {str(e)}")
                 return jsonify({'error': str(e)}), 500
         
+        @self.app.route('/api/preview-status/<filename>', methods=['GET'])
+        def get_preview_status(filename):
+            """Whether an upload preview is ready: 200 ready, 202 still extracting, 404 none"""
+            if self._preview_pending(filename):
+                return jsonify({'status': 'pending'}), 202
+            if (Path(self.app.config['UPLOAD_FOLDER']) / filename).exists():
+                return jsonify({'status': 'ready', 'preview_url': f'/api/preview/{filename}'})
+            return jsonify({'status': 'missing'}), 404
+        
         @self.app.route('/api/preview/<filename>', methods=['GET'])
         def get_preview(filename):
             """Get video frame preview for zone drawing"""
@@ -461,23 +1204,70 @@ class WebServer:
                 preview_path = Path(self.app.config['UPLOAD_FOLDER']) / filename
                 Logger.info(f"Looking for preview at: {preview_path}")
                 
-                if not preview_path.exists():
+                # Still being extracted: wait briefly (a preview usually finishes within it), then 202
+                with self._preview_jobs_lock:
+                    job = self._preview_jobs.get(filename)
+                if job is not None:
+                    try:
+                        job.result(timeout=self.PREVIEW_WAIT_SECONDS)
+                    except Exception:
+                        if not job.done():
+                            return jsonify({'status': 'pending'}), 202
+                
+                try:
+                    st = preview_path.stat()
+                except FileNotFoundError:
                     Logger.error(f"Preview not found: {preview_path}")
                     return jsonify({'error': 'Preview not found'}), 404
                 
-                response = send_file(
-                    str(preview_path),
-                    mimetype='image/jpeg',
-                    as_attachment=False
-                )
+                # A preview never changes once written: a matching ETag gets 304 without touching the file
+                etag = f"{st.st_mtime_ns:x}-{st.st_size:x}"
+                if request.if_none_match.contains(etag):
+                    response = Response(status=304)
+                else:
+                    response = self._send_data_file(preview_path, mimetype='image/jpeg')
+                response.set_etag(etag)
                 # Add CORS and cache headers
                 response.headers['Access-Control-Allow-Origin'] = '*'
-                response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+                response.headers['Cache-Control'] = 'private, max-age=3600'
                 return response
             except Exception as e:
                 Logger.error(f"Preview error: {str(e)}")
                 return jsonify({'error': str(e)}), 500
         
+        @self.app.route('/api/sprite/<task_id>', methods=['GET'])
+        def get_sprite(task_id):
+            """Get the scrub-preview sprite layout of a video task (thumbnail times and positions)"""
+            try:
+                task = self.tasks.get(task_id)
+                if task is None:
+                    return jsonify({'error': 'Task not found'}), 404
+                if task.task_type != 'video':
+                    return jsonify({'error': 'Sprites are only generated for videos'}), 404
+                if task.sprite_meta is None:
+                    # Still being built in the background
+                    return jsonify({'success': True, 'ready': False}), 202
+                
+                return jsonify(dict(task.sprite_meta, success=True, ready=True,
+                                    image_url=f'/api/sprite/{task_id}/image'))
+            except Exception as e:
+                Logger.error(f"Sprite error: {str(e)}")
+                return jsonify({'error': str(e)}), 500
+        
+        @self.app.route('/api/sprite/<task_id>/image', methods=['GET'])
+        def get_sprite_image(task_id):
+            """Get the scrub-preview sprite JPEG of a video task"""
+            try:
+                task = self.tasks.get(task_id)
+                if task is None or task.sprite_meta is None:
+                    return jsonify({'error': 'Sprite not found'}), 404
+                
+                sprite_path, _ = self._sprite_paths(task.input_path)
+                return self._send_data_file(sprite_path, mimetype='image/jpeg')
+            except Exception as e:
+                Logger.error(f"Sprite image error: {str(e)}")
+                return jsonify({'error': str(e)}), 500
+        
         @self.app.route('/api/process', methods=['POST'])
         def process():
             """Start processing task - called AFTER zones are defined"""
@@ -490,54 +1280,69 @@ class WebServer:
                     return jsonify({'error': 'Missing task_id'}), 400
                 
                 # Task must already exist from upload
-                if task_id not in self.tasks:
+                task = self.tasks.get(task_id)
+                if task is None:
                     return jsonify({'error': f'Task {task_id} not found'}), 404
 
-                task = self.tasks[task_id]
-
                 # Validate that task-specific zones exist and are non-empty
-                task_zones_path = Path('data/tasks') / task_id / 'zones.json'
-                if not task_zones_path.exists():
-                    return jsonify({'error': 'No zones defined for this task. Create at least one zone before processing.'}), 400
-
                 try:
-                    with open(task_zones_path, 'r', encoding='utf-8') as f:
-                        zones_payload = json.load(f)
-                    zones_list = zones_payload.get('zones', []) if isinstance(zones_payload, dict) else []
+                    zone_ids = self.zone_store.zone_ids(task_id)
                 except Exception as e:
                     Logger.error(f"Error reading zones for {task_id}: {e}")
                     return jsonify({'error': 'Failed to read zones for task; cannot start processing.'}), 500
+                if zone_ids is None:
+                    return jsonify({'error': 'No zones defined for this task. Create at least one zone before processing.'}), 400
 
-                if not zones_list:
+                if not zone_ids:
                     return jsonify({'error': 'Zone list is empty. Create at least one zone before processing.'}), 400
 
-                # Store selected zone IDs in task for zone-filtered processing
-                if selected_zone_ids and isinstance(selected_zone_ids, list):
-                    # Validate selected ids exist in zone list
-                    available_ids = {z.get('zone_id') for z in zones_list}
-                    invalid = [z for z in selected_zone_ids if z not in available_ids]
+                # Validate selected ids exist in zone list; default to all zones if not explicitly provided
+                use_selected = bool(selected_zone_ids) and isinstance(selected_zone_ids, list)
+                if use_selected:
+                    invalid = self.zone_store.unknown_zone_ids(task_id, selected_zone_ids)
                     if invalid:
-                        return jsonify({'error': f'Selected zone ids not found: {invalid}'}), 400
+                        return jsonify({'error': f'Selected zone ids not found: {sorted(invalid)}'}), 400
+
+                # A running or queued task keeps the zones/options it was started with
+                if task.future is not None and not task.future.done():
+                    return jsonify({'error': f'Task {task_id} is already {task.status}'}), 409
+                
+                # Backpressure: once the queue is full, refuse new work instead of piling up tasks
+                max_queued = self._config().get('processing.max_queued_tasks')
+                if max_queued and self._queued_task_count() >= int(max_queued):
+                    Logger.warning(f"Processing rejected for {task_id}: {max_queued} tasks already queued")
+                    response = jsonify({'error': 'Too many queued tasks, try again later'})
+                    response.headers['Retry-After'] = '10'
+                    return response, 503
+                
+                # Store selected zone IDs in task for zone-filtered processing
+                if use_selected:
                     task.selected_zone_ids = selected_zone_ids
                     Logger.info(f"[{task_id}] Selected zones for processing: {selected_zone_ids}")
                 else:
-                    # Default to all zones if not explicitly provided
-                    task.selected_zone_ids = [z.get('zone_id') for z in zones_list]
+                    task.selected_zone_ids = zone_ids
                     Logger.info(f"[{task_id}] No zones explicitly selected; defaulting to all zones: {task.selected_zone_ids}")
                 
                 # Store processing options (model, confidence, frame_skip, etc.) if provided
                 options = data.get('options', {}) if isinstance(data, dict) else {}
                 task.options = options
-
-                # Start processing in background
-                thread = threading.Thread(
-                    target=self._process_task,
-                    args=(task_id,)
-                )
-                thread.daemon = True
-                thread.start()
                 
-                Logger.info(f"Processing started: {task_id}")
+                # The pipeline loads zones.json from disk, so write pending edits first;
+                # do not start the task on the stale file if that fails
+                try:
+                    self.zone_store.flush(task_id)
+                except Exception as e:
+                    Logger.error(f"Error saving zones for {task_id}: {e}")
+                    return jsonify({'error': 'Failed to save zones for task; cannot start processing.'}), 500
+                
+                # Queue processing on the bounded task executor
+                task.status = 'queued'
+                task.progress = 0
+                task.cancel_event.clear()
+                self._update_aggregates(task)
+                task.future = self._submit_task(task)
+                
+                Logger.info(f"Processing queued: {task_id}")
                 
                 return jsonify({
                     'success': True,
@@ -552,11 +1357,22 @@ class WebServer:
         @self.app.route('/api/stream', methods=['GET'])
         def stream():
             """Real-time video stream from webcam/RTSP"""
+            if not self._stream_slots.acquire(blocking=False):
+                Logger.warning(f"Stream rejected: {self._max_streams} streams already open")
+                response = jsonify({'error': 'Too many open streams, try again later'})
+                response.headers['Retry-After'] = '5'
+                return response, 503
             try:
                 source = request.args.get('source', '0')
-                model = request.args.get('model', 'yolov8m')
+                # Default to the configured model so streams check out the prewarmed pipelines
+                model = request.args.get('model') or self._default_model_name()
                 use_global_zones = request.args.get('use_global_zones', '0') == '1'
                 zones_param = request.args.get('zones')  # comma-separated zone ids when streaming
+                # mjpeg (default, for <img>), webp (smaller multipart parts) or mp4 (fragmented H.264)
+                stream_format = (request.args.get('format') or 'mjpeg').lower()
+                if stream_format not in ('mjpeg', 'webp', 'mp4'):
+                    self._stream_slots.release()
+                    return jsonify({'error': f'Unsupported stream format: {stream_format}'}), 400
                 
                 # Convert source (0 for webcam, or RTSP URL)
                 if source == '0':
@@ -571,6 +1387,7 @@ class WebServer:
                     # Validate file exists
                     if not source_path.exists():
                         Logger.error(f"Video file not found: {source_path}")
+                        self._stream_slots.release()
                         return jsonify({'error': f'Video file not found: {source_path}'}), 404
                     
                     source = str(source_path)
@@ -578,67 +1395,179 @@ class WebServer:
                 
                 def generate():
                     """Generate video frames"""
-                    # Initialize pipeline; when streaming we may optionally use global zones
-                    pipeline = LaneViolationPipeline(self.config_path)
-                    pipeline.vehicle_detector.model_name = model
-                    pipeline.vehicle_detector.load_model()
-
-                    # Enforce zones when required: either use global zones or provided zone ids
-                    if pipeline.require_zones:
-                        if use_global_zones:
-                            if not pipeline.zone_manager or len(pipeline.zone_manager.zones) == 0:
-                                Logger.error("Streaming rejected: global zones not configured")
-                                return
-                            # Use all global zones by default
-                            pipeline.selected_zone_ids = [z.zone_id for z in pipeline.zone_manager.zones]
-                        else:
-                            # zones_param must be provided
-                            if not zones_param:
-                                Logger.error("Streaming rejected: must provide 'zones' param or set use_global_zones=1")
-                                return
-                            requested = [z.strip() for z in zones_param.split(',') if z.strip()]
-                            if not pipeline.zone_manager or len(pipeline.zone_manager.zones) == 0:
-                                Logger.error("Streaming rejected: no global zones available to validate requested zones")
-                                return
-                            available = {z.zone_id for z in pipeline.zone_manager.zones}
-                            invalid = [z for z in requested if z not in available]
-                            if invalid:
-                                Logger.error(f"Streaming rejected: requested zones not found: {invalid}")
-                                return
-                            pipeline.selected_zone_ids = requested
+                    # Check out a warm pipeline; when streaming we may optionally use global zones
+                    with self._acquired_pipeline(model) as pipeline:
+                        # Enforce zones when required: either use global zones or provided zone ids
+                        if pipeline.require_zones:
+                            if use_global_zones:
+                                if not pipeline.zone_manager or pipeline.zone_manager.count == 0:
+                                    Logger.error("Streaming rejected: global zones not configured")
+                                    return
+                                # Use all global zones by default
+                                pipeline.selected_zone_ids = [z.zone_id for z in pipeline.zone_manager.zones]
+                            else:
+                                # zones_param must be provided
+                                if not zones_param:
+                                    Logger.error("Streaming rejected: must provide 'zones' param or set use_global_zones=1")
+                                    return
+                                requested = [z.strip() for z in zones_param.split(',') if z.strip()]
+                                if not pipeline.zone_manager or pipeline.zone_manager.count == 0:
+                                    Logger.error("Streaming rejected: no global zones available to validate requested zones")
+                                    return
+                                available = {z.zone_id for z in pipeline.zone_manager.zones}
+                                invalid = set(requested) - available
+                                if invalid:
+                                    Logger.error(f"Streaming rejected: requested zones not found: {sorted(invalid)}")
+                                    return
+                                pipeline.selected_zone_ids = requested
                     
-                    video = cv2.VideoCapture(source)
-                    if not video.isOpened():
-                        Logger.error(f"Cannot open video source: {source}")
-                        return
+                        video = open_capture(source)
+                        if not video.isOpened():
+                            Logger.error(f"Cannot open video source: {source}")
+                            return
+                        # Capture properties, queried once
+                        source_fps = video.get(cv2.CAP_PROP_FPS) or 0
                     
-                    frame_count = 0
-                    while True:
-                        ret, frame = video.read()
-                        if not ret:
-                            break
+                        # Skipped frames are only grabbed, never decoded
+                        frame_skip = max(1, int(pipeline.frame_skip))
+                        pipeline.vehicle_detector.frame_rate = (source_fps or 30) / frame_skip
                         
-                        # Process frame
-                        results = pipeline.process_frame(frame, frame_count)
-                        annotated = pipeline.draw_results(frame, results)
+                        # Fixed-quality stills; webcam frames are capped at 720p for the multipart stream.
+                        # MP4 gets interframe compression instead and encodes frames at full size.
+                        # A frame identical to the previous one (stalled camera/RTSP) reuses its bytes.
+                        max_height = 720 if isinstance(source, int) else None
+                        if stream_format == 'webp':
+                            encoder = WebpEncoder(quality=75, max_height=max_height, skip_duplicates=True)
+                        else:
+                            encoder = JpegEncoder(quality=70, max_height=max_height, skip_duplicates=True)
+                        # The MP4 encoder is started on the first decoded frame, sized from the frame
+                        # itself (capture properties can disagree with what is actually decoded)
+                        mp4 = None
+                        mp4_fps = (source_fps or 30) / frame_skip
+                        video_encoder = self._config().get('video.encoder', 'nvenc') if torch.cuda.is_available() else 'cpu'
+                        frame_count = 0
                         
-                        # Encode frame
-                        ret, buffer = cv2.imencode('.jpg', annotated)
-                        frame_bytes = buffer.tobytes()
+                        def read_selective(skip):
+                            for _ in range(skip - 1):
+                                video.grab()
+                            ret, frame = video.read()
+                            return frame if ret else None
                         
-                        yield (b'--frame\r\n'
-                               b'Content-Type: image/jpeg\r\n'
-                               b'Content-Length: ' + str(len(frame_bytes)).encode() + b'\r\n\r\n'
-                               + frame_bytes + b'\r\n')
+                        # Adaptive skipping for file/RTSP sources: when processing falls behind the
+                        # source frame rate, skip more frames (grabbed, not decoded) up to
+                        # processing.stream_max_frame_skip, and back off once there is headroom.
+                        # Not for webcams (reads already pace the loop) or MP4 output (fixed fps).
+                        max_skip = max(frame_skip, int(self._config().get('processing.stream_max_frame_skip', 4) or 1))
+                        adaptive = (source_fps > 0 and max_skip > frame_skip
+                                    and not isinstance(source, int) and stream_format != 'mp4')
+                        skip_state = [frame_skip]
                         
-                        frame_count += 1
-                    
-                    video.release()
+                        # Decode runs ahead on a reader thread; live sources keep a short queue
+                        # so the stream does not lag behind the camera
+                        prefetch = queue.Queue(maxsize=2 if isinstance(source, int) else 64)
+                        stop_event = threading.Event()
+                        reader = threading.Thread(
+                            target=self._frame_reader,
+                            args=(f"stream {source}", read_selective,
+                                  (lambda: skip_state[0]) if adaptive else frame_skip, 0, prefetch, stop_event),
+                            name='stream-reader',
+                            daemon=True
+                        )
+                        # Encode of frame N overlaps inference on frame N+1
+                        encode_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='stream-encode')
+                        
+                        # Bind hot-loop callables and multipart framing once, outside the per-frame loop
+                        get = prefetch.get
+                        detect_batch = pipeline.detect_batch
+                        process_frame = pipeline.process_frame
+                        draw_results = pipeline.draw_results
+                        submit_encode = functools.partial(encode_executor.submit, encoder.encode)
+                        # Part header is a single %-format; the image bytes are yielded as they are
+                        # (no concatenation copy of the frame into a combined part)
+                        part_header = (b'--frame\r\nContent-Type: image/%s\r\nContent-Length: %%d\r\n\r\n'
+                                       % (b'webp' if stream_format == 'webp' else b'jpeg'))
+                        tail = b'\r\n'
+                        pending = None
+                        frame_interval = None
+                        last_frame_time = time.perf_counter()
+                        reader.start()
+                        try:
+                            while True:
+                                item = get()
+                                if item is None:
+                                    break
+                                frame_count, frame = item
+                                
+                                if adaptive:
+                                    # Smoothed wall time per streamed frame vs. the time budget of the
+                                    # source frames it stands for
+                                    now = time.perf_counter()
+                                    elapsed, last_frame_time = now - last_frame_time, now
+                                    frame_interval = elapsed if frame_interval is None else 0.8 * frame_interval + 0.2 * elapsed
+                                    skip = skip_state[0]
+                                    if frame_interval > 1.1 * skip / source_fps and skip < max_skip:
+                                        skip_state[0] = skip + 1
+                                    elif skip > frame_skip and frame_interval < 0.8 * (skip - 1) / source_fps:
+                                        skip_state[0] = skip - 1
+                        
+                                # Process frame (batch of one: same persistent input buffers and tracker as tasks)
+                                detection_result = detect_batch([frame])[0]
+                                results = process_frame(frame, frame_count, detection_result=detection_result)
+                                annotated = draw_results(frame, results, out=frame)
+                                
+                                if stream_format == 'mp4' and mp4 is None:
+                                    try:
+                                        mp4 = FragmentedMp4Encoder(annotated.shape[1], annotated.shape[0],
+                                                                   fps=mp4_fps, encoder=video_encoder)
+                                    except Exception as e:
+                                        Logger.error(f"Cannot start MP4 stream encoder: {e}")
+                                        return
+                                    submit_encode = functools.partial(encode_executor.submit, mp4.write)
+                        
+                                # Encode this frame in the background; send the previous one meanwhile
+                                encoded = submit_encode(annotated)
+                                if pending is not None:
+                                    frame_bytes = pending.result()
+                                    if mp4 is not None:
+                                        yield from mp4.drain()
+                                    else:
+                                        yield part_header % len(frame_bytes)
+                                        yield frame_bytes
+                                        yield tail
+                                pending = encoded
+                            
+                            if pending is not None:
+                                frame_bytes = pending.result()
+                                pending = None
+                                if mp4 is None:
+                                    yield part_header % len(frame_bytes)
+                                    yield frame_bytes
+                                    yield tail
+                            if mp4 is not None:
+                                yield from mp4.finish()
+                        except GeneratorExit:
+                            # Client closed the connection; Flask closes the generator
+                            Logger.info(f"Stream client disconnected after {frame_count} frames: {source}")
+                            raise
+                        finally:
+                            # Stop decode/encode threads, then release capture now instead of at GC;
+                            # the pipeline goes back to the pool on exit
+                            stop_event.set()
+                            reader.join()
+                            encode_executor.shutdown(wait=True)
+                            if mp4 is not None:
+                                mp4.close()
+                            video.release()
                 
-                return Response(generate(),
-                               mimetype='multipart/x-mixed-replace; boundary=frame')
+                mimetype = 'video/mp4' if stream_format == 'mp4' else 'multipart/x-mixed-replace; boundary=frame'
+                response = Response(generate(), mimetype=mimetype)
+                # Free the slot when the WSGI server closes the response, even if the
+                # generator never started (a closed unstarted generator runs no finally)
+                response.call_on_close(self._stream_slots.release)
+                return response
             
             except Exception as e:
+                self._stream_slots.release()
                 Logger.error(f"Stream error: {str(e)}")
                 return jsonify({'error': str(e)}), 500
         
@@ -646,10 +1575,17 @@ class WebServer:
         def get_task(task_id):
             """Get task status"""
             try:
-                if task_id not in self.tasks:
+                task = self.tasks.get(task_id)
+                if task is None:
                     return jsonify({'error': 'Task not found'}), 404
                 
-                task = self.tasks[task_id]
+                # Long poll: ?wait=<seconds>&progress=<last seen> returns as soon as
+                # the task moves on instead of the client polling on a timer
+                wait = request.args.get('wait', type=float)
+                seen = request.args.get('progress', type=int)
+                if wait and seen is not None and seen == task.progress \
+                        and task.status in ('queued', 'processing'):
+                    task.wait_for_change(min(wait, 30.0))
                 
                 return jsonify({
                     'task_id': task.task_id,
@@ -666,20 +1602,39 @@ class WebServer:
                 Logger.error(f"Get task error: {str(e)}")
                 return jsonify({'error': str(e)}), 500
         
+        @self.app.route('/api/task/<task_id>/cancel', methods=['POST'])
+        def cancel_task(task_id):
+            """Cancel a queued or running task"""
+            try:
+                task = self.tasks.get(task_id)
+                if task is None:
+                    return jsonify({'error': 'Task not found'}), 404
+                
+                future = task.future
+                if future is None or future.done():
+                    return jsonify({'error': f'Task {task_id} is not queued or running'}), 409
+                
+                task.cancel_event.set()
+                if future.cancel():
+                    # Still waiting for a worker: dropped from the executor queue
+                    task.status = 'cancelled'
+                    task.end_time = datetime.now()
+                    self._update_aggregates(task)
+                # Otherwise the running task stops at its next batch boundary
+                Logger.info(f"Cancel requested: {task_id}")
+                
+                return jsonify({'success': True, 'task_id': task_id, 'status': task.status})
+            
+            except Exception as e:
+                Logger.error(f"Cancel task error: {str(e)}")
+                return jsonify({'error': str(e)}), 500
+        
         @self.app.route('/api/tasks', methods=['GET'])
         def get_tasks():
             """Get all tasks"""
             try:
-                tasks_list = []
-                for task in self.tasks.values():
-                    tasks_list.append({
-                        'task_id': task.task_id,
-                        'status': task.status,
-                        'progress': task.progress,
-                        'type': task.task_type
-                    })
-                
-                return jsonify({'tasks': tasks_list})
+                # Rows are kept up to date by the tasks themselves; nothing to build per request
+                return jsonify({'tasks': self.tasks.rows()})
             
             except Exception as e:
                 Logger.error(f"Get tasks error: {str(e)}")
@@ -690,8 +1645,11 @@ class WebServer:
             """Clear all tasks and reset statistics"""
             try:
                 # Clear tasks dictionary
-                self.tasks.clear()
-                self.task_counter = 0
+                def reset_aggregates():
+                    with self._agg_lock:
+                        self._agg = self._empty_aggregates()
+                        self._agg_contrib = {}
+                self.tasks.clear(on_clear=reset_aggregates)
                 
                 Logger.info("All tasks cleared and statistics reset")
                 
@@ -708,12 +1666,26 @@ class WebServer:
         def get_violation_snapshot(task_subdir, filename):
             """Serve saved violation snapshot images"""
             try:
-                snapshot_path = Path.cwd() / 'data' / 'outputs' / 'violations' / task_subdir / filename
-                Logger.info(f"Serving violation snapshot: {snapshot_path}")
-                if not snapshot_path.exists():
+                # safe_join refuses '..' and absolute parts, so only files under violations/ are served
+                joined = safe_join(str(self.violations_dir), task_subdir, filename)
+                try:
+                    st = os.stat(joined) if joined else None
+                except OSError:
+                    st = None
+                if st is None:
                     return jsonify({'error': 'Snapshot not found'}), 404
-
-                return send_file(str(snapshot_path), mimetype='image/jpeg', as_attachment=False)
+                
+                # The violation grid requests every snapshot again on each render: a browser with
+                # the current copy gets 304 from one stat. Task ids restart after /api/tasks/clear,
+                # so a name can be rewritten with new content; hence revalidation, not immutable
+                etag = f"{st.st_mtime_ns:x}-{st.st_size:x}"
+                if request.if_none_match.contains(etag):
+                    response = Response(status=304)
+                else:
+                    response = self._send_data_file(joined, mimetype='image/jpeg')
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = 'no-cache'
+                return response
             except Exception as e:
                 Logger.error(f"Snapshot serve error: {str(e)}")
                 return jsonify({'error': str(e)}), 500
@@ -722,22 +1694,19 @@ class WebServer:
         def download_result(task_id):
             """Download processed video"""
             try:
-                if task_id not in self.tasks:
+                task = self.tasks.get(task_id)
+                if task is None:
                     return jsonify({'error': 'Task not found'}), 404
-                
-                task = self.tasks[task_id]
                 if task.status != 'completed' or not task.result:
                     return jsonify({'error': 'Task not completed'}), 400
                 
+                if not task.result.get('output_path'):
+                    return jsonify({'error': 'Task was processed without an output video'}), 404
                 result_path = Path(task.result['output_path'])
                 if not result_path.exists():
                     return jsonify({'error': 'Result file not found'}), 404
                 
-                return send_file(
-                    str(result_path),
-                    as_attachment=True,
-                    download_name=result_path.name
-                )
+                return self._send_data_file(result_path, as_attachment=True)
             
             except Exception as e:
                 Logger.error(f"Download error: {str(e)}")
@@ -747,12 +1716,14 @@ class WebServer:
         def stream_result(task_id):
             """Stream processed video for inline playback"""
             try:
-                if task_id not in self.tasks:
+                task = self.tasks.get(task_id)
+                if task is None:
                     return jsonify({'error': 'Task not found'}), 404
-                task = self.tasks[task_id]
                 if task.status != 'completed' or not task.result:
                     return jsonify({'error': 'Task not completed'}), 400
 
+                if not task.result.get('output_path'):
+                    return jsonify({'error': 'Task was processed without an output video'}), 404
                 result_path = Path(task.result['output_path'])
                 if not result_path.exists():
                     return jsonify({'error': 'Result file not found'}), 404
@@ -762,12 +1733,7 @@ class WebServer:
                 ext = result_path.suffix.lower()
                 mime = 'video/mp4' if ext == '.mp4' else 'video/x-msvideo'
                 try:
-                    return send_file(
-                        str(result_path),
-                        mimetype=mime,
-                        as_attachment=False,
-                        conditional=True
-                    )
+                    return self._send_data_file(result_path, mimetype=mime)
                 except RequestedRangeNotSatisfiable as rr:
                     # Client requested an invalid range (416) - return proper status
                     Logger.warning(f"Stream result range not satisfiable for {task_id}: {rr}")
@@ -780,9 +1746,16 @@ class WebServer:
         def get_config():
             """Get current configuration"""
             try:
-                from src.utils.config_loader import ConfigLoader
-                config = ConfigLoader(self.config_path)
-                return jsonify(config.get_all())
+                # Weak ETag from the file revision: unchanged config -> 304 with no body
+                mtime_ns, size = config_revision(self.config_path)
+                etag = f"{mtime_ns:x}-{size:x}"
+                if request.if_none_match.contains_weak(etag):
+                    response = Response(status=304)
+                else:
+                    response = jsonify(self._config().get_all())
+                response.set_etag(etag, weak=True)
+                response.headers['Cache-Control'] = 'no-cache'
+                return response
             except Exception as e:
                 Logger.error(f"Config error: {str(e)}")
                 return jsonify({'error': str(e)}), 500
@@ -791,15 +1764,18 @@ class WebServer:
         def update_config():
             """Update configuration"""
             try:
-                from src.utils.config_loader import ConfigLoader
                 data = request.get_json()
-                config = ConfigLoader(self.config_path)
-                
-                # Update config values
-                for key, value in data.items():
-                    config.set(key, value)
-                
-                config.save(self.config_path)
+                # Serialize read-modify-write so concurrent updates don't drop each other's keys
+                with self._config_write_lock:
+                    # Fresh loader: the cached one is shared and must not be mutated
+                    config = ConfigLoader(self.config_path)
+                    
+                    # Update config values
+                    for key, value in data.items():
+                        config.set(key, value)
+                    
+                    config.save(self.config_path)
+                    clear_config_cache()
                 Logger.info("Configuration updated")
                 
                 return jsonify({'success': True})
@@ -811,20 +1787,11 @@ class WebServer:
         def get_zones_for_task(task_id):
             """Get zones for specific task/video"""
             try:
-                task_zones_path = Path('data/tasks') / task_id / 'zones.json'
-                
-                if not task_zones_path.exists():
-                    return jsonify({
-                        'success': True,
-                        'zones': []
-                    })
-                
-                with open(task_zones_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                zones = self.zone_store.get_zones(task_id)
                 
                 return jsonify({
                     'success': True,
-                    'zones': data.get('zones', [])
+                    'zones': zones or []
                 })
             except Exception as e:
                 Logger.error(f"Get zones error: {str(e)}")
@@ -836,17 +1803,6 @@ class WebServer:
             try:
                 data = request.get_json()
                 
-                # Create task zones directory
-                task_zones_dir = Path('data/tasks') / task_id
-                task_zones_dir.mkdir(parents=True, exist_ok=True)
-                task_zones_path = task_zones_dir / 'zones.json'
-                
-                # Load existing zones
-                zones_data = {'zones': []}
-                if task_zones_path.exists():
-                    with open(task_zones_path, 'r', encoding='utf-8') as f:
-                        zones_data = json.load(f)
-                
                 # Add new zone
                 zone = {
                     'zone_id': data['zone_id'],
@@ -858,13 +1814,8 @@ class WebServer:
                     'base_height': data.get('base_height')
                 }
                 
-                # Check if zone exists, replace if so
-                zones_data['zones'] = [z for z in zones_data.get('zones', []) if z['zone_id'] != zone['zone_id']]
-                zones_data['zones'].append(zone)
-                
-                # Save zones
-                with open(task_zones_path, 'w', encoding='utf-8') as f:
-                    json.dump(zones_data, f, indent=2, ensure_ascii=False)
+                # Replaces a zone with the same id; written to disk by the store's debounced flush
+                self.zone_store.put_zone(task_id, zone)
                 
                 Logger.info(f"Zone added to {task_id}: {zone['name']}")
                 
@@ -880,21 +1831,9 @@ class WebServer:
         def delete_zone_for_task(task_id, zone_id):
             """Delete zone from specific task"""
             try:
-                task_zones_path = Path('data/tasks') / task_id / 'zones.json'
-                
-                if not task_zones_path.exists():
+                if not self.zone_store.delete_zone(task_id, zone_id):
                     return jsonify({'error': 'No zones found'}), 404
                 
-                with open(task_zones_path, 'r', encoding='utf-8') as f:
-                    zones_data = json.load(f)
-                
-                # Remove zone
-                zones_data['zones'] = [z for z in zones_data.get('zones', []) if z['zone_id'] != zone_id]
-                
-                # Save updated zones
-                with open(task_zones_path, 'w', encoding='utf-8') as f:
-                    json.dump(zones_data, f, indent=2, ensure_ascii=False)
-                
                 Logger.info(f"Zone deleted from {task_id}: {zone_id}")
                 
                 return jsonify({'success': True})
@@ -910,107 +1849,27 @@ class WebServer:
                 start_date = request.args.get('start_date')
                 end_date = request.args.get('end_date')
 
-                base = Path.cwd() / 'data' / 'outputs' / 'violations'
-                if not base.exists():
-                    return jsonify({'violations': []})
-
-                violations = []
-                seen_violations = set()  # Track to avoid duplicates (crop + full)
-                
-                for task_dir in base.iterdir():
-                    if not task_dir.is_dir():
-                        continue
-                    task_id = task_dir.name
-                    if task_filter and task_filter != task_id:
-                        continue
-
-                    for file in task_dir.iterdir():
-                        if not file.is_file():
-                            continue
-                        name = file.name
-                        # Only process violation_crop to avoid duplicate entries (full images are for PDF)
-                        if not name.startswith('violation_crop'):
-                            continue
-
-                        # Parse track_id, vehicle_type, and frame number from filename
-                        # Format: violation_crop_track{track_id}_{vehicle_type}_frame{frame_num}.jpg
-                        track_id = None
-                        vehicle_type = 'Xe khác'
-                        frame = None
-                        try:
-                            import re
-                            track_m = re.search(r'track(\d+)', name)
-                            vtype_m = re.search(r'track\d+_(\w+)_frame', name)
-                            frame_m = re.search(r'frame(\d+)', name)
-                            
-                            if track_m:
-                                track_id = int(track_m.group(1))
-                            if frame_m:
-                                frame = int(frame_m.group(1))
-                            
-                            # Map vehicle type code to Vietnamese
-                            if vtype_m:
-                                vtype_code = vtype_m.group(1).lower()
-                                vtype_map = {
-                                    'otto': 'Ô tô',
-                                    'xemay': 'Xe máy',
-                                    'xebuyt': 'Xe buýt',
-                                    'xetai': 'Xe tải',
-                                    'khac': 'Xe khác'
-                                }
-                                vehicle_type = vtype_map.get(vtype_code, 'Xe khác')
-                        except Exception:
-                            pass
-
-                        # Create unique key to avoid duplicate entries
-                        violation_key = f"{task_id}_{track_id}_{frame}"
-                        if violation_key in seen_violations:
-                            continue
-                        seen_violations.add(violation_key)
-
-                        mtime = datetime.fromtimestamp(file.stat().st_mtime).isoformat()
-
-                        violations.append({
-                            'id': name,
-                            'task_id': task_id,
-                            'filename': name,
-                            'track_id': track_id,
-                            'frame': frame,
-                            'timestamp': mtime,
-                            'vehicle_type': vehicle_type,
-                            'zone_name': 'Zone 1',
-                            'violation_type': 'Vi phạm làn đường',
-                            'confidence': 0.92,
-                            'snapshot_url': f'/api/violation-snapshot/{task_id}/{name}'
-                        })
-
-                # Optional date filtering
-                if start_date or end_date:
-                    def in_range(v):
-                        ts = v.get('timestamp')
-                        if not ts:
-                            return False
-                        try:
-                            t = datetime.fromisoformat(ts)
-                        except Exception:
-                            return False
-                        if start_date:
-                            try:
-                                if t < datetime.fromisoformat(start_date):
-                                    return False
-                            except Exception:
-                                pass
-                        if end_date:
-                            try:
-                                if t > datetime.fromisoformat(end_date):
-                                    return False
-                            except Exception:
-                                pass
-                        return True
-
-                    violations = [v for v in violations if in_range(v)]
-
-                return jsonify({'violations': violations})
+                task_dirs = self._violation_task_dirs(task_filter)
+                
+                # Same query over unchanged violation files (per-file name, mtime and size, so
+                # overwritten images count as changes): reuse the serialized response
+                cache_key = (task_filter, start_date, end_date)
+                signature = tuple(sorted((e.name, self._violation_scan_keyed(e)[0]) for e in task_dirs))
+                with self._violations_response_lock:
+                    cached = self._violations_response_cache.get(cache_key)
+                if cached is not None and cached[0] == signature:
+                    return self.app.response_class(cached[1], mimetype='application/json')
+
+                violations = self._collect_violations(task_filter, start_date, end_date, task_dirs=task_dirs)
+                response = jsonify({'violations': violations})
+                with self._violations_response_lock:
+                    cache = self._violations_response_cache
+                    cache.pop(cache_key, None)
+                    cache[cache_key] = (signature, response.get_data())
+                    # Keys come from query strings; keep only the most recent ones
+                    while len(cache) > 32:
+                        cache.popitem(last=False)
+                return response
             except Exception as e:
                 Logger.error(f"List violations error: {e}")
                 return jsonify({'error': str(e)}), 500
@@ -1019,31 +1878,34 @@ class WebServer:
         def export_csv():
             """Export violations metadata as CSV"""
             try:
-                # Reuse list_violations logic by calling functionally
-                resp = list_violations()
-                if resp.status_code != 200:
-                    return resp
-                data = resp.get_json()
-                rows = data.get('violations', [])
-
-                output = io.StringIO()
-                writer = csv.writer(output)
-                writer.writerow(['id', 'task_id', 'filename', 'frame', 'timestamp', 'vehicle_type', 'zone_name', 'violation_type', 'confidence', 'snapshot_url'])
-                for r in rows:
-                    writer.writerow([
-                        r.get('id'), r.get('task_id'), r.get('filename'), r.get('frame'), r.get('timestamp'),
-                        r.get('vehicle_type'), r.get('zone_name'), r.get('violation_type'), r.get('confidence'), r.get('snapshot_url')
-                    ])
-
-                mem = io.BytesIO()
-                mem.write(output.getvalue().encode('utf-8'))
-                mem.seek(0)
-                return send_file(mem, as_attachment=True, download_name='violations.csv', mimetype='text/csv')
+                rows = self._collect_violations(request.args.get('task'), request.args.get('start_date'),
+                                                request.args.get('end_date'))
+
+                def generate():
+                    # Rows are written into one reused buffer and sent in blocks, so the CSV is
+                    # never held whole in memory (as text or bytes)
+                    output = io.StringIO()
+                    writer = csv.writer(output)
+                    writer.writerow(['id', 'task_id', 'filename', 'frame', 'timestamp', 'vehicle_type', 'zone_name', 'violation_type', 'confidence', 'snapshot_url'])
+                    for i, r in enumerate(rows, 1):
+                        writer.writerow([
+                            r.get('id'), r.get('task_id'), r.get('filename'), r.get('frame'), r.get('timestamp'),
+                            r.get('vehicle_type'), r.get('zone_name'), r.get('violation_type'), r.get('confidence'), r.get('snapshot_url')
+                        ])
+                        if i % 500 == 0:
+                            yield output.getvalue().encode('utf-8')
+                            output.seek(0)
+                            output.truncate()
+                    yield output.getvalue().encode('utf-8')
+
+                return Response(generate(), mimetype='text/csv',
+                                headers={'Content-Disposition': 'attachment; filename=violations.csv'})
             except Exception as e:
                 Logger.error(f"Export CSV error: {e}")
                 return jsonify({'error': str(e)}), 500
 
         @self.app.route('/api/export/pdf', methods=['GET'])
+        @self._export_slot
         def export_pdf():
             """Export violation full-size images into a single PDF"""
             try:
@@ -1051,6 +1913,10 @@ class WebServer:
                 if not pdf_data:
                     return jsonify({'error': 'No violations found'}), 404
                 
+                # Stored copy of the same build: the front server (or file_wrapper) sends it
+                if self.violations_pdf_path.exists():
+                    return self._send_data_file(self.violations_pdf_path, as_attachment=True,
+                                                mimetype='application/pdf')
                 mem = io.BytesIO(pdf_data)
                 mem.seek(0)
                 return send_file(mem, as_attachment=True, download_name='violations.pdf', mimetype='application/pdf')
@@ -1059,11 +1925,12 @@ class WebServer:
                 return jsonify({'error': str(e)}), 500
 
         @self.app.route('/api/export/clips', methods=['GET'])
+        @self._export_slot
         def export_clips():
             """Export all violation crop images as a ZIP"""
             try:
                 export_format = request.args.get('format', 'crop').lower().strip()
-                base = Path.cwd() / 'data' / 'outputs' / 'violations'
+                base = self.violations_dir
                 if not base.exists():
                     return jsonify({'error': 'No violations found'}), 404
 
@@ -1074,242 +1941,992 @@ class WebServer:
                 prefix = prefix_map.get(export_format, 'violation_crop')
                 download_name = 'violation_clips_crop.zip' if prefix == 'violation_crop' else 'violation_clips_full.zip'
 
-                mem = io.BytesIO()
-                with zipfile.ZipFile(mem, 'w', zipfile.ZIP_DEFLATED) as zf:
-                    for task_dir in base.iterdir():
-                        if not task_dir.is_dir():
-                            continue
-                        for file in task_dir.iterdir():
-                            if file.is_file() and file.name.startswith(prefix):
+                entries = []
+                with os.scandir(base) as it:
+                    task_dirs = [e for e in it if e.is_dir()]
+                for task_dir in task_dirs:
+                    with os.scandir(task_dir) as files:
+                        for file in files:
+                            if file.name.startswith(prefix) and file.is_file():
                                 arcname = f"{task_dir.name}/{file.name}"
-                                zf.write(str(file), arcname)
+                                entries.append((arcname, file.path))
 
-                mem.seek(0)
-                return send_file(mem, as_attachment=True, download_name=download_name, mimetype='application/zip')
+                return self._zip_response(entries, download_name)
             except Exception as e:
                 Logger.error(f"Export clips error: {e}")
                 return jsonify({'error': str(e)}), 500
 
         @self.app.route('/api/export/video-clips', methods=['GET'])
+        @self._export_slot
         def export_video_clips():
             """Export violation video clips (5s each) from source videos"""
             try:
                 clip_duration = 5  # 5 seconds per clip
-                base = Path.cwd() / 'data' / 'outputs' / 'violations'
+                base = self.violations_dir
                 videos_dir = Path.cwd() / 'data' / 'videos'
                 
                 if not base.exists():
                     return jsonify({'error': 'No violations found'}), 404
 
-                mem = io.BytesIO()
-                with zipfile.ZipFile(mem, 'w', zipfile.ZIP_DEFLATED) as zf:
-                    clip_count = 0
+                jobs = []  # (task_id, source video, violation image name, frame number)
+                video_meta = {}  # source video -> (fps, width, height), probed once per video
+                
+                # Scan all violations and extract their metadata
+                for task_dir in base.iterdir():
+                    if not task_dir.is_dir():
+                        continue
                     
-                    # Scan all violations and extract their metadata
-                    for task_dir in base.iterdir():
-                        if not task_dir.is_dir():
-                            continue
-                        
-                        task_id = task_dir.name
-                        
-                        # Find the source video for this task
-                        source_video = None
-                        for task_obj_id, task_obj in self.tasks.items():
-                            if task_obj_id == task_id:
-                                source_video = task_obj.input_path
+                    task_id = task_dir.name
+                    
+                    # Find the source video for this task
+                    task_obj = self.tasks.get(task_id)
+                    source_video = task_obj.input_path if task_obj is not None else None
+                    
+                    if not source_video or not Path(source_video).exists():
+                        # Try to find video by pattern
+                        for vid_file in videos_dir.glob('*.mp4'):
+                            if task_id in vid_file.name:
+                                source_video = str(vid_file)
                                 break
+                    
+                    if not source_video or not Path(source_video).exists():
+                        # Try to use any available video
+                        available_videos = list(videos_dir.glob('*.mp4'))
+                        if available_videos:
+                            source_video = str(available_videos[0])
+                            Logger.info(f"Source video not in task object, using available: {source_video}")
+                        else:
+                            Logger.warning(f"Source video not found for task {task_id}")
+                            continue
+                    
+                    source_video = str(source_video)
+                    if source_video not in video_meta:
+                        video_meta[source_video] = self._probe_clip_source(source_video)
+                    if video_meta[source_video] is None:
+                        Logger.warning(f"Cannot open video: {source_video}")
+                        continue
+                    
+                    # Process each violation image to extract frame info
+                    # Use violation_full for better quality
+                    for file in sorted(task_dir.iterdir()):
+                        # Name check first: a stat (is_file) only for candidate files
+                        if not file.name.startswith('violation_full') or not file.is_file():
+                            continue
                         
-                        if not source_video or not Path(source_video).exists():
-                            # Try to find video by pattern
-                            for vid_file in videos_dir.glob('*.mp4'):
-                                if task_id in vid_file.name:
-                                    source_video = str(vid_file)
-                                    break
-                        
-                        if not source_video or not Path(source_video).exists():
-                            # Try to use any available video
-                            available_videos = list(videos_dir.glob('*.mp4'))
-                            if available_videos:
-                                source_video = str(available_videos[0])
-                                Logger.info(f"Source video not in task object, using available: {source_video}")
-                            else:
-                                Logger.warning(f"Source video not found for task {task_id}")
-                                continue
+                        # Parse frame number from filename (e.g., violation_full_track3_otto_frame245.jpg);
+                        # one cached anchored match per name
+                        frame_num = parse_violation_filename(file.name)[2]
                         
-                        # Process each violation image to extract frame info
-                        # Use violation_full for better quality
-                        for file in sorted(task_dir.iterdir()):
-                            if not file.is_file() or not file.name.startswith('violation_full'):
-                                continue
-                            
-                            # Parse frame number from filename (e.g., violation_crop_frame245_...)
-                            frame_num = None
-                            import re
-                            m = re.search(r'frame(\d+)', file.name)
-                            if m:
-                                frame_num = int(m.group(1))
-                            
-                            if frame_num is None:
-                                Logger.warning(f"Could not extract frame number from {file.name}")
-                                continue
-                            
+                        if frame_num is None:
+                            Logger.warning(f"Could not extract frame number from {file.name}")
+                            continue
+                        jobs.append((task_id, source_video, file.name, frame_num))
+                
+                # Each clip is an independent seek + decode + encode (OpenCV releases the GIL in
+                # all three), so clips are cut in parallel; the ZIP is then streamed from the finished clips.
+                # The clips of one video are split into contiguous runs in frame order, and
+                # each run reuses one capture with forward seeks
+                workers = max(1, min(8, os.cpu_count() or 1, len(jobs)))
+                by_video = {}
+                for index, job in enumerate(jobs):
+                    by_video.setdefault(job[1], []).append(index)
+                results = {}
+                handed_off = False
+                try:
+                    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='clip-export') as pool:
+                        futures = []
+                        for source_video, indices in by_video.items():
+                            indices.sort(key=lambda i: jobs[i][3])
+                            run = -(-len(indices) // workers)  # ceil: at most `workers` runs per video
+                            for k in range(0, len(indices), run):
+                                chunk = [(i, jobs[i]) for i in indices[k:k + run]]
+                                futures.append(pool.submit(self._extract_clip_run, source_video,
+                                                           video_meta[source_video], chunk))
+                        # Collect every run, even after one fails, so all finished clips are known
+                        run_error = None
+                        for future in futures:
                             try:
-                                # Open source video and extract clip around this frame
-                                cap = cv2.VideoCapture(str(source_video))
-                                if not cap.isOpened():
-                                    Logger.warning(f"Cannot open video: {source_video}")
-                                    continue
-                                
-                                fps = cap.get(cv2.CAP_PROP_FPS) or 30
-                                frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                                frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-                                
-                                # Calculate start/end frames (2.5s before and after violation)
-                                frames_before = int(2.5 * fps)
-                                frames_after = int(2.5 * fps)
-                                start_frame = max(0, frame_num - frames_before)
-                                end_frame = frame_num + frames_after
-                                
-                                # Temp output file for this clip
-                                clip_name = f"clip_{task_id}_{file.name.replace('.jpg', '.mp4')}"
-                                temp_clip_path = Path.cwd() / 'data' / 'outputs' / clip_name
-                                
-                                writer = cv2.VideoWriter(str(temp_clip_path), fourcc, fps, (frame_width, frame_height))
-                                
-                                # Extract frames
-                                cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
-                                current_frame = start_frame
-                                frames_written = 0
-                                
-                                while current_frame <= end_frame:
-                                    ret, frame = cap.read()
-                                    if not ret:
-                                        break
-                                    writer.write(frame)
-                                    current_frame += 1
-                                    frames_written += 1
-                                
-                                cap.release()
-                                writer.release()
-                                
-                                # Add to ZIP
-                                if temp_clip_path.exists() and frames_written > 0:
-                                    arcname = f"violations/{task_id}/{clip_name}"
-                                    zf.write(str(temp_clip_path), arcname)
-                                    temp_clip_path.unlink()  # Delete temp file
-                                    clip_count += 1
-                                    Logger.info(f"Added video clip: {arcname} ({frames_written} frames)")
-                                else:
-                                    if temp_clip_path.exists():
-                                        temp_clip_path.unlink()
-                                    Logger.warning(f"Failed to create clip for frame {frame_num}")
-                            
+                                results.update(future.result())
                             except Exception as e:
-                                Logger.warning(f"Error creating clip for {file.name}: {e}")
-                                continue
-                
-                if clip_count == 0:
-                    return jsonify({'error': 'No video clips could be generated'}), 404
-                
-                mem.seek(0)
-                return send_file(mem, as_attachment=True, download_name='violation_video_clips.zip', mimetype='application/zip')
+                                run_error = run_error or e
+                        if run_error is not None:
+                            raise run_error
+                        
+                    entries = []
+                    for index, (task_id, _, file_name, frame_num) in enumerate(jobs):
+                        clip_name = f"clip_{task_id}_{file_name.replace('.jpg', '.mp4')}"
+                        result = results.get(index)
+                        if result is None:
+                            Logger.warning(f"Failed to create clip for frame {frame_num}")
+                            continue
+                        temp_clip_path, detail = result
+                        arcname = f"violations/{task_id}/{clip_name}"
+                        entries.append((arcname, temp_clip_path))
+                        Logger.info(f"Added video clip: {arcname} ({detail})")
+                    temp_paths = [path for _, path in entries]
+                    
+                    if not entries:
+                        return jsonify({'error': 'No video clips could be generated'}), 404
+                    
+                    # Temp clips are removed once the archive has been sent (or the client went away)
+                    response = self._zip_response(entries, 'violation_video_clips.zip',
+                                                  on_close=lambda: self._remove_temp_clips(temp_paths))
+                    handed_off = True
+                    return response
+                finally:
+                    if not handed_off:
+                        # Error or nothing to send: the ZIP response will not clean these up
+                        self._remove_temp_clips(r[0] for r in results.values() if r is not None)
             except Exception as e:
                 Logger.error(f"Export video clips error: {e}")
                 return jsonify({'error': str(e)}), 500
 
         @self.app.route('/api/export/full', methods=['GET'])
+        @self._export_slot
         def export_full():
             """Export full-size violation images and result videos as ZIP"""
             try:
-                base = Path.cwd() / 'data' / 'outputs'
+                base = self.output_dir
                 if not base.exists():
                     return jsonify({'error': 'No outputs found'}), 404
 
-                mem = io.BytesIO()
-                with zipfile.ZipFile(mem, 'w', zipfile.ZIP_DEFLATED) as zf:
-                    # --- CSV report ---
-                    try:
-                        # Reuse list_violations logic to get rows
-                        resp = list_violations()
-                        if hasattr(resp, 'status_code') and resp.status_code != 200:
-                            return resp
-                        data = resp.get_json()
-                        rows = data.get('violations', []) if isinstance(data, dict) else []
-
-                        output = io.StringIO()
-                        writer = csv.writer(output)
-                        writer.writerow(['id', 'task_id', 'filename', 'track_id', 'frame', 'timestamp', 'vehicle_type', 'zone_name', 'violation_type', 'confidence', 'snapshot_url'])
-                        for r in rows:
-                            writer.writerow([
-                                r.get('id'), r.get('task_id'), r.get('filename'), r.get('track_id'), r.get('frame'), r.get('timestamp'),
-                                r.get('vehicle_type'), r.get('zone_name'), r.get('violation_type'), r.get('confidence'), r.get('snapshot_url')
-                            ])
-                        zf.writestr('reports/violations.csv', output.getvalue())
-                    except Exception as csv_err:
-                        Logger.warning(f"Full export: failed to generate CSV: {csv_err}")
-
-                    # --- PDF report (reuse export_pdf logic) ---
-                    try:
-                        pdf_data = self._generate_violations_pdf()
-                        if pdf_data:
-                            zf.writestr('reports/violations.pdf', pdf_data)
-                    except Exception as pdf_err:
-                        Logger.warning(f"Full export: failed to generate PDF: {pdf_err}")
-
-                    # Add full violation images
-                    vdir = base / 'violations'
-                    if vdir.exists():
-                        for task_dir in vdir.iterdir():
-                            if not task_dir.is_dir():
-                                continue
-                            for file in task_dir.iterdir():
-                                if file.is_file() and file.name.startswith('violation_full'):
+                entries = []
+                # --- CSV report ---
+                try:
+                    rows = self._collect_violations(request.args.get('task'), request.args.get('start_date'),
+                                                    request.args.get('end_date'))
+
+                    output = io.StringIO()
+                    writer = csv.writer(output)
+                    writer.writerow(['id', 'task_id', 'filename', 'track_id', 'frame', 'timestamp', 'vehicle_type', 'zone_name', 'violation_type', 'confidence', 'snapshot_url'])
+                    for r in rows:
+                        writer.writerow([
+                            r.get('id'), r.get('task_id'), r.get('filename'), r.get('track_id'), r.get('frame'), r.get('timestamp'),
+                            r.get('vehicle_type'), r.get('zone_name'), r.get('violation_type'), r.get('confidence'), r.get('snapshot_url')
+                        ])
+                    entries.append(('reports/violations.csv', output.getvalue().encode('utf-8')))
+                except Exception as csv_err:
+                    Logger.warning(f"Full export: failed to generate CSV: {csv_err}")
+
+                # --- PDF report (reuse export_pdf logic) ---
+                try:
+                    pdf_data = self._generate_violations_pdf()
+                    if pdf_data:
+                        entries.append(('reports/violations.pdf', pdf_data))
+                except Exception as pdf_err:
+                    Logger.warning(f"Full export: failed to generate PDF: {pdf_err}")
+
+                # Add full violation images
+                vdir = base / 'violations'
+                if vdir.exists():
+                    with os.scandir(vdir) as it:
+                        task_dirs = [e for e in it if e.is_dir()]
+                    for task_dir in task_dirs:
+                        with os.scandir(task_dir) as files:
+                            for file in files:
+                                if file.name.startswith('violation_full') and file.is_file():
                                     arcname = f"violations/{task_dir.name}/{file.name}"
-                                    zf.write(str(file), arcname)
+                                    entries.append((arcname, file.path))
 
-                    # Add result videos
-                    for file in base.iterdir():
-                        if file.is_file() and (file.name.endswith('_result.mp4') or file.name.endswith('_result.avi')):
-                            zf.write(str(file), f"videos/{file.name}")
+                # Add result videos
+                for file in base.iterdir():
+                    if file.is_file() and (file.name.endswith('_result.mp4') or file.name.endswith('_result.avi')):
+                        entries.append((f"videos/{file.name}", str(file)))
 
-                mem.seek(0)
-                return send_file(mem, as_attachment=True, download_name='full_report.zip', mimetype='application/zip')
+                # Files are read into the archive as it is sent; nothing is buffered whole
+                return self._zip_response(entries, 'full_report.zip')
             except Exception as e:
                 Logger.error(f"Export full error: {e}")
                 return jsonify({'error': str(e)}), 500
     
+    @staticmethod
+    def _probe_clip_source(source_video):
+        """(fps, width, height) of a clip source video, or None if it cannot be opened"""
+        cap = cv2.VideoCapture(source_video)
+        try:
+            if not cap.isOpened():
+                return None
+            return (cap.get(cv2.CAP_PROP_FPS) or 30,
+                    int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                    int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        finally:
+            cap.release()
+
+    def _extract_clip_run(self, source_video, meta, chunk):
+        """
+        Cut the clips of a run of violations of one video (runs on the export pool)
+        
+        Each clip is stream-copied by ffmpeg when available; clips ffmpeg cannot cut fall
+        back to OpenCV, sharing one capture for the whole run.
+        
+        Args:
+            source_video: Source video path
+            meta: (fps, width, height) from _probe_clip_source
+            chunk: List of (job index, (task_id, source video, image name, frame number)),
+                sorted by frame number
+            
+        Returns:
+            {job index: (temp clip path, description) or None}
+        """
+        results = {}
+        ffmpeg = find_ffmpeg()
+        cap = None
+        try:
+            for index, (task_id, _, file_name, frame_num) in chunk:
+                result = None
+                if ffmpeg:
+                    result = self._extract_clip_ffmpeg(ffmpeg, source_video, meta, task_id, file_name, frame_num)
+                if result is None:
+                    # No ffmpeg, or it could not cut this clip: decode and re-encode with OpenCV
+                    if cap is None:
+                        cap = cv2.VideoCapture(source_video)
+                    if not cap.isOpened():
+                        Logger.warning(f"Cannot open video: {source_video}")
+                    else:
+                        result = self._extract_clip(cap, meta, task_id, file_name, frame_num)
+                results[index] = result
+            return results
+        except BaseException:
+            # The caller never sees these results, so delete the clips cut so far
+            self._remove_temp_clips(r[0] for r in results.values() if r is not None)
+            raise
+        finally:
+            if cap is not None:
+                cap.release()
+    
+    @staticmethod
+    def _remove_temp_clips(paths):
+        """Delete temporary clip files, ignoring ones already gone"""
+        for path in paths:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def _extract_clip_ffmpeg(self, ffmpeg, source_video, meta, task_id, file_name, frame_num,
+                             seconds_around=2.5):
+        """
+        Cut the clip around one violation frame with ffmpeg, copying the compressed packets
+        
+        Stream copy needs no decode or encode and keeps the source quality; the clip
+        then starts at the key frame at or before the requested start. If copying fails
+        (e.g. a codec the MP4 muxer rejects) the clip is re-encoded with libx264 ultrafast.
+        
+        Args:
+            ffmpeg: ffmpeg executable
+            source_video: Source video path
+            meta: (fps, width, height) of the source video
+            task_id: Task ID (for log messages)
+            file_name: Violation image name (for log messages)
+            frame_num: Violation frame number
+            seconds_around: Seconds kept before and after the frame
+            
+        Returns:
+            (temp clip path, description), or None if ffmpeg could not cut it; the caller
+            deletes the file
+        """
+        fps = meta[0]
+        start_sec = max(0.0, (frame_num - seconds_around * fps) / fps)
+        duration = seconds_around * 2 + 1.0 / fps
+        fd, temp_clip_path = tempfile.mkstemp(suffix='.mp4', prefix='clip_', dir=str(self.output_dir))
+        os.close(fd)
+        base_cmd = [ffmpeg, '-v', 'error', '-y', '-ss', f'{start_sec:.3f}', '-i', source_video,
+                    '-t', f'{duration:.3f}', '-map', '0:v:0', '-an']
+        for codec_args, label in ((['-c', 'copy', '-avoid_negative_ts', 'make_zero'], 'stream copy'),
+                                  (['-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p'], 'libx264')):
+            try:
+                subprocess.run(base_cmd + codec_args + ['-movflags', '+faststart', temp_clip_path],
+                               check=True, capture_output=True, timeout=120)
+                if os.path.getsize(temp_clip_path) > 0:
+                    return temp_clip_path, label
+            except Exception as e:
+                stderr = getattr(e, 'stderr', None)
+                detail = stderr.decode('utf-8', 'replace').strip()[-200:] if stderr else e
+                Logger.warning(f"[{task_id}] ffmpeg {label} failed for {file_name}: {detail}")
+        if os.path.exists(temp_clip_path):
+            os.unlink(temp_clip_path)
+        return None
+
+    def _extract_clip(self, cap, meta, task_id, file_name, frame_num, seconds_around=2.5):
+        """
+        Cut the clip around one violation frame into a temporary MP4
+        
+        Args:
+            cap: Open capture of the source video (repositioned here)
+            meta: (fps, width, height) of the source video
+            task_id: Task ID (for log messages)
+            file_name: Violation image name (for log messages)
+            frame_num: Violation frame number
+            seconds_around: Seconds kept before and after the frame
+            
+        Returns:
+            (temp clip path, description), or None if no clip could be written; the
+            caller deletes the file
+        """
+        writer = None
+        temp_clip_path = None
+        try:
+            fps, frame_width, frame_height = meta
+            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+            
+            # Calculate start/end frames (2.5s before and after violation)
+            frames_around = int(seconds_around * fps)
+            start_frame = max(0, frame_num - frames_around)
+            end_frame = frame_num + frames_around
+            
+            # Unique temp file: concurrent exports may cut the same violation
+            fd, temp_clip_path = tempfile.mkstemp(suffix='.mp4', prefix='clip_', dir=str(self.output_dir))
+            os.close(fd)
+            writer = cv2.VideoWriter(temp_clip_path, fourcc, fps, (frame_width, frame_height))
+            
+            # Extract frames
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+            frames_written = 0
+            for _ in range(start_frame, end_frame + 1):
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                writer.write(frame)
+                frames_written += 1
+            writer.release()
+            writer = None
+            
+            if frames_written > 0 and os.path.getsize(temp_clip_path) > 0:
+                return temp_clip_path, f"{frames_written} frames"
+        except Exception as e:
+            Logger.warning(f"[{task_id}] Error creating clip for {file_name}: {e}")
+        finally:
+            if writer is not None:
+                writer.release()
+        if temp_clip_path is not None and os.path.exists(temp_clip_path):
+            os.unlink(temp_clip_path)
+        return None
+
+    def _export_slot(self, view):
+        """
+        Decorator for export views: run holding one of server.max_exports slots, else 503
+        
+        The slot is released when the response is closed, so a streamed ZIP keeps it
+        until the last chunk has been sent.
+        """
+        @functools.wraps(view)
+        def limited(*args, **kwargs):
+            if not self._export_slots.acquire(blocking=False):
+                Logger.warning(f"Export rejected: {self._max_exports} exports already running")
+                response = jsonify({'error': 'Too many exports running, try again later'})
+                response.headers['Retry-After'] = '10'
+                return response, 503
+            try:
+                response = self.app.make_response(view(*args, **kwargs))
+            except BaseException:
+                self._export_slots.release()
+                raise
+            response.call_on_close(self._export_slots.release)
+            return response
+        return limited
+
+    def _zip_response(self, entries, download_name, on_close=None):
+        """
+        Streamed ZIP download: entries are compressed and sent one chunk at a time
+        
+        Args:
+            entries: (arcname, file path or bytes) pairs, listed before the response starts
+            download_name: Attachment file name
+            on_close: Called when the response is closed: after the last chunk, when the client
+                disconnects (even before the first chunk) or for a HEAD request
+            
+        Returns:
+            Flask response (chunked, no Content-Length)
+        """
+        response = Response(iter_zip(entries), mimetype='application/zip',
+                            headers={'Content-Disposition': f'attachment; filename="{download_name}"'})
+        if on_close is not None:
+            # The WSGI server closes the response on every path; a generator's finally
+            # would not run if it was closed before it started
+            response.call_on_close(on_close)
+        return response
+
+    def _send_data_file(self, path, as_attachment=False, mimetype=None):
+        """
+        Serve a file from the data directory without copying it through Python where possible
+        
+        With server.x_accel_redirect set (e.g. "/internal-data/", an nginx internal
+        location aliased to data/), only an X-Accel-Redirect header is returned and
+        nginx streams the file itself, Range requests included. Otherwise
+        send_from_directory with conditional=True handles Range/ETag requests, and
+        either server.x_sendfile (X-Sendfile for Apache/lighttpd) or the WSGI
+        server's file_wrapper avoids reading the file in Python.
+        
+        Args:
+            path: File path inside data/ (outputs, reports, uploaded videos, previews)
+            as_attachment: Send as download (Content-Disposition: attachment)
+            mimetype: Response mimetype (guessed from the filename if None)
+            
+        Returns:
+            Flask response
+        """
+        path = Path(path).resolve()
+        accel_prefix = self._config().get('server.x_accel_redirect')
+        if accel_prefix:
+            try:
+                rel = path.relative_to((Path.cwd() / 'data').resolve())
+                response = Response(status=200, mimetype=mimetype or 'application/octet-stream')
+                response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{rel.as_posix()}"
+                if as_attachment:
+                    response.headers['Content-Disposition'] = f'attachment; filename="{path.name}"'
+                return response
+            except ValueError:
+                Logger.warning(f"{path} is outside data/; serving it directly")
+        return send_from_directory(
+            str(path.parent),
+            path.name,
+            as_attachment=as_attachment,
+            mimetype=mimetype,
+            conditional=True
+        )
+
+    def _load_upload_index(self):
+        """Load the sha256 -> stored filename index of uploaded files"""
+        try:
+            if self._upload_index_path.exists():
+                with open(self._upload_index_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            Logger.warning(f"Failed to load upload index, starting empty: {e}")
+        return {}
+
+    @staticmethod
+    def _empty_aggregates():
+        return {'active': 0, 'completed': 0, 'detected': 0, 'violations': 0,
+                'durations_sum': 0.0, 'durations_n': 0}
+
+    def _update_aggregates(self, task):
+        """
+        Bring the /api/status totals up to date with one task's current status and analytics
+        
+        The task's previous contribution is subtracted and its current one added, so
+        calling this after every state change (including re-processing) keeps the totals
+        equal to a full re-sum over all tasks, without /api/status looping over tasks.
+        
+        Args:
+            task: ProcessingTask whose status or analytics changed
+        """
+        stats = task.analytics if isinstance(task.analytics, dict) else {}
+        try:
+            dur = float(stats.get('duration_seconds', 0))
+            new = (int(task.status == 'processing'), int(task.status == 'completed'),
+                   int(stats.get('total_detected_vehicles', 0)), int(stats.get('total_violations', 0)),
+                   dur if dur > 0 else 0.0, int(dur > 0))
+        except Exception:
+            new = (int(task.status == 'processing'), int(task.status == 'completed'), 0, 0, 0.0, 0)
+        with self._agg_lock:
+            old = self._agg_contrib.pop(task.task_id, None)
+            # Tasks dropped by /api/tasks/clear no longer count
+            if self.tasks.get(task.task_id) is not task:
+                return
+            agg = self._agg
+            for key, delta in zip(('active', 'completed', 'detected', 'violations', 'durations_sum', 'durations_n'),
+                                  (n - o for n, o in zip(new, old or (0, 0, 0, 0, 0.0, 0)))):
+                agg[key] += delta
+            self._agg_contrib[task.task_id] = new
+
+    def _create_task(self, input_path, task_type):
+        """
+        Register a new task under the next task id
+        
+        Args:
+            input_path: Uploaded file path
+            task_type: 'video' or 'image'
+            
+        Returns:
+            New ProcessingTask
+        """
+        task = self.tasks.create(input_path, task_type)
+        task_id = task.task_id
+        
+        # Create task-specific directory for zones once; zone writes then skip the mkdir
+        self.zone_store.ensure_dir(task_id)
+        
+        if task_type == 'video':
+            self.media_executor.submit(self._build_sprite, task)
+        return task
+
+    @staticmethod
+    def _sprite_paths(input_path):
+        """(sprite JPEG path, sprite layout JSON path) stored next to an uploaded video"""
+        input_path = Path(input_path)
+        return (input_path.with_name(f"{input_path.name}_sprite.jpg"),
+                input_path.with_name(f"{input_path.name}_sprite.json"))
+
+    def _build_sprite(self, task):
+        """Build (or reuse) the scrub-preview sprite of a task's video and set task.sprite_meta"""
+        sprite_path, meta_path = self._sprite_paths(task.input_path)
+        try:
+            if sprite_path.exists() and meta_path.exists():
+                # Same upload content seen before; its sprite is still valid
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+            else:
+                meta = self._render_sprite(task.input_path, sprite_path)
+                with open(meta_path, 'w', encoding='utf-8') as f:
+                    json.dump(meta, f)
+                Logger.info(f"Sprite saved: {sprite_path}")
+            task.sprite_meta = meta
+        except Exception as e:
+            Logger.warning(f"[{task.task_id}] Failed to build preview sprite: {e}")
+
+    def _render_sprite(self, input_path, sprite_path):
+        """
+        Render evenly spaced thumbnails of a video into one tiled JPEG
+        
+        Uses a single ffmpeg pass (fps + scale + tile filters); without ffmpeg the
+        thumbnails are seeked and decoded one by one with OpenCV.
+        
+        Args:
+            input_path: Video file
+            sprite_path: Output JPEG path
+            
+        Returns:
+            Sprite layout: grid size, thumbnail size, interval and per-thumbnail
+            time offset and pixel position
+        """
+        cols, rows = self.SPRITE_COLUMNS, self.SPRITE_ROWS
+        thumb_w, thumb_h = self.SPRITE_THUMB_SIZE
+        
+        cap = cv2.VideoCapture(str(input_path))
+        try:
+            fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+            frame_total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+            duration = frame_total / fps if frame_total > 0 else 0.0
+            if duration <= 0:
+                raise ValueError("video duration unknown")
+            # One thumbnail per interval, at most cols * rows, never closer than one frame
+            interval = max(duration / (cols * rows), 1.0 / fps)
+            count = min(cols * rows, int(duration / interval) + 1)
+            
+            ffmpeg = find_ffmpeg()
+            if ffmpeg:
+                cmd = [ffmpeg, '-v', 'error', '-y', '-i', str(input_path),
+                       '-vf', f"fps=1/{interval:.6f},scale={thumb_w}:{thumb_h},tile={cols}x{rows}",
+                       '-frames:v', '1', '-q:v', '5', str(sprite_path)]
+                subprocess.run(cmd, check=True, capture_output=True, timeout=600)
+            else:
+                sheet = np.zeros((rows * thumb_h, cols * thumb_w, 3), dtype=np.uint8)
+                for i in range(count):
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, int(i * interval * fps))
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    y, x = (i // cols) * thumb_h, (i % cols) * thumb_w
+                    cv2.resize(frame, (thumb_w, thumb_h), dst=sheet[y:y + thumb_h, x:x + thumb_w],
+                               interpolation=cv2.INTER_AREA)
+                if not cv2.imwrite(str(sprite_path), sheet, [cv2.IMWRITE_JPEG_QUALITY, 80]):
+                    raise RuntimeError("failed to write sprite")
+        finally:
+            cap.release()
+        
+        return {
+            'columns': cols,
+            'rows': rows,
+            'thumb_width': thumb_w,
+            'thumb_height': thumb_h,
+            'interval': round(interval, 3),
+            'duration': round(duration, 3),
+            'thumbnails': [
+                {'time': round(i * interval, 3), 'x': (i % cols) * thumb_w, 'y': (i // cols) * thumb_h}
+                for i in range(count)
+            ]
+        }
+
+    def _queue_preview(self, filepath, preview_path, is_image):
+        """Schedule the upload preview of filepath on the preview worker (once per preview file)"""
+        name = preview_path.name
+        with self._preview_jobs_lock:
+            if name in self._preview_jobs:
+                return
+            future = self.preview_executor.submit(self._extract_preview, filepath, preview_path, is_image)
+            self._preview_jobs[name] = future
+        
+        def forget(_):
+            with self._preview_jobs_lock:
+                self._preview_jobs.pop(name, None)
+        future.add_done_callback(forget)
+
+    def _preview_pending(self, name):
+        """Whether the preview file name is queued or being extracted"""
+        with self._preview_jobs_lock:
+            return name in self._preview_jobs
+
+    def _extract_preview(self, filepath, preview_path, is_image):
+        """
+        Write the 1280x720 preview of an upload (runs on the preview worker)
+        
+        Args:
+            filepath: Uploaded image or video
+            preview_path: Output .jpg path
+            is_image: Resize the image itself instead of decoding a video frame
+        """
+        try:
+            # For images, just resize and use as preview; for videos, extract first frame
+            frame = cv2.imread(str(filepath)) if is_image else self._read_first_frame(filepath)
+            if frame is None:
+                Logger.warning(f"No frame decoded for preview: {filepath}")
+                return
+            self._write_preview(frame, str(preview_path))
+            Logger.info(f"{'Image' if is_image else 'Frame'} preview saved: {preview_path}")
+        except Exception as e:
+            Logger.warning(f"Error extracting frame preview: {str(e)}")
+
+    def _write_preview(self, frame, path):
+        """
+        Resize a frame to the 1280x720 preview size and save it as JPEG
+        
+        Args:
+            frame: BGR frame
+            path: Output .jpg path
+        """
+        # Resize to fit browser
+        frame_resized = cv2.resize(frame, (1280, 720), interpolation=cv2.INTER_AREA)
+        with self._preview_encoder_lock:
+            jpeg_bytes = self._preview_encoder.encode(frame_resized)
+        Path(path).write_bytes(jpeg_bytes)
+
+    @staticmethod
+    def _read_first_frame(filepath):
+        """
+        Decode the first frame of a video for the upload preview
+        
+        With PyAV, only key frames are decoded (skip_frame='NONKEY'), so the first
+        decoded frame costs a single packet instead of a full OpenCV/FFmpeg capture
+        spin-up. Falls back to cv2.VideoCapture (FFmpeg backend, then autodetect) when
+        PyAV is missing or fails.
+        
+        Args:
+            filepath: Video file path
+            
+        Returns:
+            BGR frame, or None if no frame could be decoded
+        """
+        if av is not None:
+            container = None
+            try:
+                container = av.open(str(filepath))
+                stream = container.streams.video[0]
+                stream.codec_context.skip_frame = 'NONKEY'
+                frame = next(container.decode(stream), None)
+                if frame is not None:
+                    return frame.to_ndarray(format='bgr24')
+            except Exception as e:
+                Logger.warning(f"PyAV preview decode failed, using OpenCV: {e}")
+            finally:
+                if container is not None:
+                    container.close()
+        
+        # Name the FFmpeg backend so OpenCV does not probe every registered backend first;
+        # a fresh capture already sits at frame 0, so no seek is needed
+        video = cv2.VideoCapture(str(filepath), cv2.CAP_FFMPEG)
+        if not video.isOpened():
+            video.release()
+            video = cv2.VideoCapture(str(filepath))
+        try:
+            if video.isOpened():
+                ret, frame = video.read()
+                if ret:
+                    return frame
+            return None
+        finally:
+            video.release()
+
+    def _receive_multipart_upload(self, upload_dir):
+        """
+        Stream the multipart request body through streaming-form-data into a temp file
+        
+        Werkzeug's form parser spools the whole body to a temporary file before the
+        route runs; here the 'file' part is hashed and written to the upload dir as
+        the body is read, in 1 MB blocks, so the upload is copied to disk only once.
+        
+        Args:
+            upload_dir: Upload directory (the temp file is created there)
+            
+        Returns:
+            HashingFileTarget with the temp path, SHA-256 and client filename
+        """
+        max_length = self.app.config.get('MAX_CONTENT_LENGTH')
+        fd, tmp_path = tempfile.mkstemp(dir=str(upload_dir), suffix='.part')
+        os.close(fd)
+        target = HashingFileTarget(tmp_path)
+        try:
+            parser = StreamingFormDataParser(headers={'Content-Type': request.headers.get('Content-Type', '')})
+            parser.register('file', target)
+            received = 0
+            while True:
+                chunk = request.stream.read(1024 * 1024)
+                if not chunk:
+                    break
+                received += len(chunk)
+                if max_length and received > max_length:
+                    raise RequestEntityTooLarge()
+                parser.data_received(chunk)
+            target.close()
+            if not target.multipart_filename:
+                os.remove(tmp_path)
+            return target
+        except Exception:
+            target.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _store_upload(self, stream, upload_dir, file_ext):
+        """
+        Save an upload stream under its content hash, reusing an identical earlier upload
+        
+        The stream is hashed (SHA-256) in 1 MB blocks while it is written to a temp file;
+        reads stop with 413 once MAX_CONTENT_LENGTH bytes have been exceeded.
+        
+        Args:
+            stream: Readable file stream of the upload
+            upload_dir: Upload directory
+            file_ext: Lower-case file extension including the dot
+            
+        Returns:
+            (stored filename, sha256 hex digest, True if an existing file was reused)
+        """
+        h = hashlib.sha256()
+        max_length = self.app.config.get('MAX_CONTENT_LENGTH')
+        received = 0
+        fd, tmp_path = tempfile.mkstemp(dir=str(upload_dir), suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb', buffering=1024 * 1024) as out:
+                while True:
+                    chunk = stream.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    received += len(chunk)
+                    if max_length and received > max_length:
+                        raise RequestEntityTooLarge()
+                    h.update(chunk)
+                    out.write(chunk)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return self._commit_upload(tmp_path, h.hexdigest(), upload_dir, file_ext)
+
+    def _commit_upload(self, tmp_path, sha256, upload_dir, file_ext):
+        """
+        Move a fully written temp upload to its content-hash name, or drop it if already stored
+        
+        Args:
+            tmp_path: Temp file holding the uploaded bytes
+            sha256: SHA-256 hex digest of the file
+            upload_dir: Upload directory
+            file_ext: Lower-case file extension including the dot
+            
+        Returns:
+            (stored filename, sha256 hex digest, True if an existing file was reused)
+        """
+        try:
+            with self._upload_index_lock:
+                existing = self._upload_index.get(sha256)
+                if existing and (upload_dir / existing).exists():
+                    os.remove(tmp_path)
+                    return existing, sha256, True
+                
+                filename = f"{sha256[:16]}{file_ext}"
+                os.replace(tmp_path, str(upload_dir / filename))
+                self._upload_index[sha256] = filename
+                try:
+                    with open(self._upload_index_path, 'w', encoding='utf-8') as f:
+                        json.dump(self._upload_index, f, indent=2)
+                except Exception as e:
+                    Logger.warning(f"Failed to save upload index: {e}")
+                return filename, sha256, False
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
     def _allowed_file(self, filename):
         """Check if file type is allowed"""
-        return '.' in filename and filename.rsplit('.', 1)[1].lower() in self.ALLOWED_EXTENSIONS
+        return filename.lower().endswith(self._ALLOWED_SUFFIXES)
     
+    def _submit_task(self, task):
+        """
+        Queue a task for the task executor, images ahead of videos (videos stay FIFO)
+        
+        Args:
+            task: ProcessingTask to run
+            
+        Returns:
+            Future of the task run; cancel() works while it is still queued
+        """
+        future = Future()
+        rank = 0 if task.task_type == 'image' else 1
+        with self._task_queue_lock:
+            heapq.heappush(self._task_queue, (rank, next(self._task_seq), task.task_id, future))
+        # One executor job per queued task; each job runs whichever task ranks first when it starts
+        self.executor.submit(self._run_next_task)
+        return future
+
+    def _queued_task_count(self):
+        """Number of tasks waiting for a worker (cancelled ones excluded)"""
+        with self._task_queue_lock:
+            return sum(1 for *_, future in self._task_queue if not future.cancelled())
+
+    def _run_next_task(self):
+        """Pop the best-ranked queued task that was not cancelled and run it on this worker"""
+        while True:
+            with self._task_queue_lock:
+                if not self._task_queue:
+                    return
+                _, _, task_id, future = heapq.heappop(self._task_queue)
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self._process_task(task_id))
+            except BaseException as e:
+                future.set_exception(e)
+            return
+
+    @staticmethod
+    def _put_unless_stopped(q, item, stop_event):
+        """Put item on a bounded queue, giving up once stop_event is set (consumer gone)"""
+        while not stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _frame_reader(self, task_id, read, frame_skip, start_frame, out_queue, stop_event, errors=None):
+        """
+        Decode frames on a worker thread, pushing (frame_num, frame) and then None at end of video
+        
+        Args:
+            task_id: Label used in log messages
+            read: read(frame_skip) -> next frame to process, or None at end of video
+            frame_skip: Source frames advanced per returned frame, or a callable returning the
+                current value (adaptive skipping)
+            start_frame: Frame number of the first frame read
+            out_queue: Bounded queue receiving (frame_num, frame) items
+            stop_event: Set by the consumer to stop reading early
+            errors: Optional list receiving the decode error, so the consumer can tell a failed
+                read from the end of the video (both end with None)
+        """
+        frame_num = start_frame
+        put = self._put_unless_stopped
+        get_skip = frame_skip if callable(frame_skip) else None
+        try:
+            while not stop_event.is_set():
+                skip = get_skip() if get_skip is not None else frame_skip
+                frame = read(skip)
+                if frame is None:
+                    break
+                if not put(out_queue, (frame_num, frame), stop_event):
+                    break
+                frame_num += skip
+        except Exception as e:
+            Logger.error(f"[Task {task_id}] Frame reader failed at frame {frame_num}: {str(e)}")
+            if errors is not None:
+                errors.append(f"Error decoding frame {frame_num}: {e}")
+        finally:
+            self._put_unless_stopped(out_queue, None, stop_event)
+
+    def _frame_writer(self, task_id, video_processor, in_queue, errors):
+        """Encode/write annotated frames on a worker thread, in queue order, until None arrives.
+        The first write error is appended to errors and later frames are drained unwritten,
+        so the producer never blocks on a full queue; the task checks errors and fails."""
+        get = in_queue.get
+        write_frame = video_processor.write_frame
+        while True:
+            item = get()
+            if item is None:
+                break
+            if errors:
+                continue
+            frame_num, annotated = item
+            try:
+                write_frame(annotated)
+            except Exception as write_error:
+                Logger.error(f"[Task {task_id}] Error writing frame {frame_num}: {str(write_error)}")
+                errors.append(f"Error writing frame {frame_num}: {write_error}")
+
+    def _process_video_batch(self, task_id, pipeline, analytics, batch, write_queue):
+        """Detect vehicles for a batch of (frame_num, frame) pairs in one YOLO call,
+        then post-process, draw and record analytics for each frame in order; annotated
+        frames go to write_queue for the writer thread (no drawing when write_queue is None).
+        Raises RuntimeError when detection fails for the batch, so the task is marked failed
+        instead of completing with frames missing from the output and the analytics."""
+        try:
+            detection_results = pipeline.detect_batch([frame for _, frame in batch])
+        except Exception as batch_error:
+            raise RuntimeError(f"Error detecting batch of frames {batch[0][0]}-{batch[-1][0]}: {batch_error}") from batch_error
+
+        # Bind per-frame callables once per batch
+        process_frame = pipeline.process_frame
+        draw_results = pipeline.draw_results
+        put = write_queue.put if write_queue is not None else None
+        record_detections = analytics.record_detections
+        record_violations = analytics.record_violations
+        record_frame_data = analytics.record_frame_data
+        for (frame_num, frame), detection_result in zip(batch, detection_results):
+            queued = False
+            try:
+                results = process_frame(frame, frame_num, detection_result=detection_result)
+                if put is not None:
+                    # Annotate the decoded frame in place: it is not used again after this
+                    put((frame_num, draw_results(frame, results, out=frame)))
+                    queued = True
+
+                # Record unique detected vehicles and per-frame counts for analytics
+                detections = results.get('detections', ())
+                record_detections(detections)
+                
+                # One pass over violations: confirmed count and the track ids to credit
+                violations_count = 0
+                violating_ids = []
+                for v in results.get('violations', ()):
+                    if v.get('is_confirmed'):
+                        violations_count += 1
+                        track_id = v.get('track_id')
+                        if track_id is not None:
+                            violating_ids.append(track_id)
+                record_frame_data(frame_num, len(detections), violations_count)
+                record_violations(violating_ids)
+            except Exception as frame_error:
+                Logger.warning(f"[Task {task_id}] Error processing frame {frame_num}: {str(frame_error)}")
+                # Continue to next frame even if one fails; if it was not queued yet, write it
+                # unannotated so the output keeps every frame
+                if put is not None and not queued:
+                    put((frame_num, frame))
+
     def _process_task(self, task_id):
         """Process a task in background"""
-        task = self.tasks[task_id]
+        task = self.tasks.get(task_id)
+        if task is None:
+            # Cleared by /api/tasks/clear while queued
+            return
+        pipeline = None
         
         try:
             task.status = 'processing'
             task.start_time = datetime.now()
             task.progress = 0
+            self._update_aggregates(task)
             
-            # Initialize pipeline with task_id for task-specific zone loading
+            # Check out a warm pipeline for the requested model, loading task-specific zones
             Logger.info(f"[Task {task_id}] Initializing pipeline with config: {self.config_path}")
-            # Do not open video during pipeline init; set later after validating path
-            pipeline = LaneViolationPipeline(self.config_path, input_source=None, output_path=None, task_id=task_id)
-            # Apply per-task options if present (e.g., model, confidence, frame_skip, draw flags)
+            task_options = task.options or {}
+            model_name = task_options.get('model') or self._default_model_name()
+            # Video is not opened here; set later after validating path
+            pipeline = self._acquire_pipeline(model_name, task_id=task_id)
+            Logger.info(f"[Task {task_id}] Vehicle detector model: {pipeline.vehicle_detector.model_name}")
+            # Apply per-task options if present (e.g., confidence, frame_skip, draw flags)
             try:
-                task_options = getattr(task, 'options', {}) or {}
                 if task_options:
                     Logger.info(f"[Task {task_id}] Applying task options: {task_options}")
-                    # Model selection
-                    model_name = task_options.get('model')
-                    if model_name:
-                        pipeline.vehicle_detector.model_name = model_name
-                        try:
-                            pipeline.vehicle_detector.load_model()
-                            Logger.info(f"[Task {task_id}] Vehicle detector loaded model: {model_name}")
-                        except Exception as e:
-                            Logger.warning(f"[Task {task_id}] Failed to load specified model '{model_name}': {e}")
                     # Confidence threshold
                     if 'confidence' in task_options:
                         try:
@@ -1334,11 +2951,8 @@ class WebServer:
             Logger.info(f"[Task {task_id}] Pipeline initialized with task-specific zones")
 
             # Double-check zones loaded in pipeline; fail early if none present
-            try:
-                if not pipeline.zone_manager or len(pipeline.zone_manager.zones) == 0:
-                    raise RuntimeError('No zones configured for this task. Create at least one zone before processing.')
-            except Exception as e:
-                raise RuntimeError(f"Zone validation failed: {e}")
+            if not pipeline.zone_manager or pipeline.zone_manager.count == 0:
+                raise RuntimeError('Zone validation failed: No zones configured for this task. Create at least one zone before processing.')
             
             # Set input/output - resolve to absolute paths
             input_path = task.input_path
@@ -1356,24 +2970,24 @@ class WebServer:
             Logger.info(f"[Task {task_id}] Input file validated: {input_path}")
             
             # Create output directory if needed
-            output_dir = Path.cwd() / "data/outputs"
-            output_dir.mkdir(parents=True, exist_ok=True)
-            output_path = str(output_dir / f"{task.task_id}_result.mp4")
-            
-            Logger.info(f"[Task {task_id}] Setting video source to: {input_path}")
-            # Set input source - this will trigger the property setter to open the video
-            pipeline.video_processor.input_source = input_path
-            Logger.info(f"[Task {task_id}] Video source set successfully")
-            
-            pipeline.video_processor.output_path = output_path
+            output_dir = self.output_dir
+            output_path = os.path.join(output_dir, f"{task.task_id}_result.mp4")
             
-            # Rescale zones to match the actual video resolution so coordinates align
-            try:
-                vw, vh = pipeline.video_processor.width, pipeline.video_processor.height
-                pipeline.zone_manager.rescale_to(vw, vh)
-                Logger.info(f"[Task {task_id}] Zones rescaled to video size: {vw}x{vh}")
-            except Exception as e:
-                Logger.warning(f"[Task {task_id}] Failed to rescale zones: {e}")
+            if task.task_type == 'video':
+                Logger.info(f"[Task {task_id}] Setting video source to: {input_path}")
+                # Open the source once; its size is needed for zone rescaling below. The output
+                # writer is only opened in the video branch, once the output fps is known.
+                # (Images are decoded once in the image branch instead.)
+                pipeline.video_processor.open(input_path)
+                Logger.info(f"[Task {task_id}] Video source set successfully")
+                
+                # Rescale zones to match the actual video resolution so coordinates align
+                try:
+                    vw, vh = pipeline.video_processor.width, pipeline.video_processor.height
+                    pipeline.zone_manager.rescale_to(vw, vh)
+                    Logger.info(f"[Task {task_id}] Zones rescaled to video size: {vw}x{vh}")
+                except Exception as e:
+                    Logger.warning(f"[Task {task_id}] Failed to rescale zones: {e}")
             
             # Store selected zone IDs in pipeline for zone-filtered processing
             if hasattr(task, 'selected_zone_ids') and task.selected_zone_ids:
@@ -1384,113 +2998,141 @@ class WebServer:
             task.progress = 10
             
             if task.task_type == 'video':
-                # Process video
-                pipeline.video_processor.input_source = input_path
-                pipeline.video_processor.output_path = output_path
+                # Process video (source already opened above)
+                frame_skip = max(1, int(pipeline.frame_skip))
+                # The tracker sees every frame_skip-th source frame
+                pipeline.vehicle_detector.frame_rate = (pipeline.video_processor.fps or 30) / frame_skip
+                # Analytics-only tasks (options.output_video = false) skip drawing, encoding and writing
+                emit_video = bool(task_options.get('output_video', True))
+                if emit_video:
+                    if frame_skip > 1:
+                        # Only every frame_skip-th frame is written; keep the output duration unchanged
+                        pipeline.video_processor.fps = max(1, int(round(pipeline.video_processor.fps / frame_skip)))
+                    pipeline.video_processor.output_path = output_path
+                else:
+                    output_path = None
+                    pipeline.video_processor.output_path = None
+                    Logger.info(f"[Task {task_id}] Output video disabled; collecting analytics only")
                 
-                # Get total frames for progress calculation
-                total_frames = pipeline.video_processor.cap.get(cv2.CAP_PROP_FRAME_COUNT) if pipeline.video_processor.cap else 1
+                # Get total frames for progress calculation (read once when the video was opened)
+                total_frames = pipeline.video_processor.total_frames
                 Logger.info(f"[Task {task_id}] Total frames to process: {total_frames}")
 
-                # Read and validate first frame to avoid producing empty videos
-                first_frame = pipeline.video_processor.read_frame()
-                if first_frame is None:
-                    raise RuntimeError(f"[Task {task_id}] Could not read first frame from: {input_path}")
+                # Decode on NVDEC when the model runs on CUDA and PyNvVideoCodec can read the file;
+                # the OpenCV capture stays open either way for the video properties above
+                read = pipeline.video_processor.read_frame_selective
+                nvdec = None
+                device = str(pipeline.vehicle_detector.device)
+                if (str(pipeline.config.get('video.decoder', 'auto')).lower() in ('auto', 'nvdec')
+                        and device.startswith('cuda')):
+                    nvdec = open_nvdec_reader(input_path, gpu_id=torch.device(device).index or 0)
+                    if nvdec is not None:
+                        read = nvdec.read
+                        Logger.info(f"[Task {task_id}] Decoding with NVDEC")
                 
                 # Initialize analytics
                 
                 analytics = AnalyticsCollector()
                 analytics.start_timing()
                 
+                # Frames are buffered and sent through YOLO as one batch
+                batch_size = max(1, int(pipeline.config.get('processing.batch_size', 8)))
+                if self.engine_max_batch and str(pipeline.vehicle_detector.model_name) == self.engine_path:
+                    # The engine was built for at most engine_max_batch frames (batch_size at startup)
+                    batch_size = min(batch_size, self.engine_max_batch)
+                batch = []
                 frame_count = 0
-                
-                # Process the first frame already read
-                try:
-                    results = pipeline.process_frame(first_frame, frame_count)
-                    annotated = pipeline.draw_results(first_frame, results)
-                    pipeline.video_processor.write_frame(annotated)
-                    detections_count = len(results.get('detections', []))
-                    # Record unique detected vehicles for analytics
-                    try:
-                        for det in results.get('detections', []):
-                            tid = det.get('track_id')
-                            conf = det.get('confidence', 0)
-                            if tid is not None:
-                                try:
-                                    analytics.record_detection(int(tid), conf)
-                                except Exception:
-                                    analytics.record_detection(tid, conf)
-                    except Exception:
-                        pass
-
-                    violations_count = len([v for v in results.get('violations', []) if v.get('is_confirmed')])
-                    analytics.record_frame_data(frame_count, detections_count, violations_count)
-                    for v in results.get('violations', []):
-                        if v.get('is_confirmed') and v.get('track_id') is not None:
-                            try:
-                                analytics.record_violation(int(v['track_id']))
-                            except Exception:
-                                analytics.record_violation(v['track_id'])
-                except Exception as frame_error:
-                    Logger.warning(f"[Task {task_id}] Error processing frame {frame_count}: {str(frame_error)}")
-                frame_count += 1
-
-                while True:
-                    frame = pipeline.video_processor.read_frame()
-                    if frame is None:
-                        break
-                    
-                    try:
-                        results = pipeline.process_frame(frame, frame_count)
-                        annotated = pipeline.draw_results(frame, results)
-                        pipeline.video_processor.write_frame(annotated)
-
-                        # Record unique detected vehicles for analytics
-                        try:
-                            for det in results.get('detections', []):
-                                tid = det.get('track_id')
-                                conf = det.get('confidence', 0)
-                                if tid is not None:
-                                    try:
-                                        analytics.record_detection(int(tid), conf)
-                                    except Exception:
-                                        analytics.record_detection(tid, conf)
-                        except Exception:
-                            pass
+                next_log = 100
+                # Progress runs 10 -> 90 over the video; scale computed once, not per batch
+                progress_scale = 80.0 / total_frames if total_frames > 0 else 0.0
+
+                # Decode and encode/write run on worker threads, overlapping with inference on
+                # this thread. Bounded queues cap the number of frames held in memory.
+                read_queue = queue.Queue(maxsize=batch_size * 2)
+                write_queue = queue.Queue(maxsize=batch_size * 2) if emit_video else None
+                stop_event = threading.Event()
+                write_errors = []
+                read_errors = []
+                reader = threading.Thread(
+                    target=self._frame_reader,
+                    args=(task_id, read, frame_skip, 0, read_queue, stop_event, read_errors),
+                    name=f"{task_id}-reader",
+                    daemon=True
+                )
+                writer = threading.Thread(
+                    target=self._frame_writer,
+                    args=(task_id, pipeline.video_processor, write_queue, write_errors),
+                    name=f"{task_id}-writer",
+                    daemon=True
+                )
+                reader.start()
+                if emit_video:
+                    writer.start()
 
-                        # Record analytics per frame
-                        detections_count = len(results.get('detections', []))
-                        violations_count = len([v for v in results.get('violations', []) if v.get('is_confirmed')])
-                        analytics.record_frame_data(frame_count, detections_count, violations_count)
-                        for v in results.get('violations', []):
-                            if v.get('is_confirmed') and v.get('track_id') is not None:
-                                try:
-                                    analytics.record_violation(int(v['track_id']))
-                                except Exception:
-                                    analytics.record_violation(v['track_id'])
-                    except Exception as frame_error:
-                        Logger.warning(f"[Task {task_id}] Error processing frame {frame_count}: {str(frame_error)}")
-                        # Continue to next frame even if one fails
-                        pass
-                    
-                    # Update progress - calculate based on actual total frames
-                    frame_count += 1
-                    if total_frames > 0:
-                        progress = int((frame_count / total_frames) * 90) + 10
-                        task.progress = min(90, progress)
-                    
-                    if frame_count % 100 == 0:
-                        Logger.info(f"[Task {task_id}] Processed {frame_count}/{int(total_frames)} frames, progress: {task.progress}%")
+                try:
+                    while True:
+                        item = read_queue.get()
+                        if item is None and frame_count == 0:
+                            # Validate the first frame to avoid producing empty videos
+                            raise RuntimeError(read_errors[0] if read_errors else
+                                               f"[Task {task_id}] Could not read first frame from: {input_path}")
+                        if item is not None:
+                            batch.append(item)
+                            frame_count = item[0] + frame_skip
+                            if len(batch) < batch_size:
+                                continue
+                        
+                        # Full batch, or tail-drain at end of video
+                        if batch:
+                            self._process_video_batch(task_id, pipeline, analytics, batch, write_queue)
+                            batch = []
+                            
+                            # Update progress at batch boundaries - frame_count tracks source frames, including skipped ones
+                            # The setter only stores (and wakes /api/task long polls) when the value changes
+                            if progress_scale:
+                                progress = int(frame_count * progress_scale) + 10
+                                if progress > 90:
+                                    progress = 90
+                                task.progress = progress
+                            
+                            if frame_count >= next_log:
+                                Logger.info(f"[Task {task_id}] Processed {frame_count}/{total_frames} frames, progress: {task.progress}%")
+                                next_log = (frame_count // 100 + 1) * 100
+                            
+                            if task.cancel_event.is_set():
+                                raise TaskCancelled(f"cancelled after {frame_count} frames")
+                            if write_errors:
+                                # The output video is incomplete; stop instead of processing the rest
+                                raise RuntimeError(write_errors[0])
+                        
+                        if item is None:
+                            break
+                finally:
+                    # Stop the reader (if still running) and let the writer flush queued frames
+                    stop_event.set()
+                    reader.join()
+                    if emit_video:
+                        write_queue.put(None)
+                        writer.join()
+                    if nvdec is not None:
+                        nvdec.release()
+                if read_errors:
+                    # The reader stopped early: the video was only partly processed
+                    raise RuntimeError(read_errors[0])
+                if write_errors:
+                    # Failed on one of the last queued frames, after the final batch check
+                    raise RuntimeError(write_errors[0])
                 
                 Logger.info(f"[Task {task_id}] Frame processing complete. Total frames: {frame_count}")
                 
                 # Release resources and ensure file is written
                 try:
+                    # release() finalizes the container synchronously; no need to wait afterwards
                     pipeline.video_processor.release()
                     Logger.info(f"[Task {task_id}] Video processor released successfully")
-                    # Give the system a moment to ensure all writes are flushed
-                    import time
-                    time.sleep(1)
+                    written = emit_video and (pipeline.video_processor.output_path or output_path)
+                    if written and (not os.path.exists(written) or os.path.getsize(written) == 0):
+                        raise RuntimeError(f"Output video was not written: {written}")
                 except Exception as release_error:
                     Logger.error(f"[Task {task_id}] Error releasing video processor: {str(release_error)}")
                     raise
@@ -1503,7 +3145,7 @@ class WebServer:
                 
             elif task.task_type == 'image':
                 # Process image: rescale zones to image size and save annotated image
-                img = cv2.imread(input_path)
+                img = read_image(input_path)
                 if img is None:
                     raise RuntimeError(f"[Task {task_id}] Failed to read image: {input_path}")
                 ih, iw = img.shape[0], img.shape[1]
@@ -1516,7 +3158,7 @@ class WebServer:
                 # Build image output path with proper extension
                 img_ext = Path(input_path).suffix.lower() or '.jpg'
                 img_out = Path(output_dir) / f"{task.task_id}_result{img_ext}"
-                pipeline.process_image(input_path, str(img_out))
+                pipeline.process_image(input_path, str(img_out), frame=img)
                 task.analytics = {'frames_processed': 1}
             
             task.progress = 100
@@ -1524,7 +3166,7 @@ class WebServer:
             if task.task_type == 'image':
                 actual_output = str(img_out)
             else:
-                actual_output = pipeline.video_processor.output_path or output_path
+                actual_output = (pipeline.video_processor.output_path or output_path) if emit_video else None
 
             # Collect saved violation snapshots from pipeline (if any)
             snapshots_list = []
@@ -1563,7 +3205,7 @@ class WebServer:
             task.result = {
                 'output_path': actual_output,
                 'timestamp': datetime.now().isoformat(),
-                'stream_url': f"/api/result/{task_id}/stream",
+                'stream_url': f"/api/result/{task_id}/stream" if actual_output else None,
                 'snapshots': snapshots_list
             }
 
@@ -1577,18 +3219,52 @@ class WebServer:
             
             Logger.info(f"Task completed: {task_id}")
         
+        except TaskCancelled as e:
+            task.status = 'cancelled'
+            Logger.info(f"Task cancelled: {task_id} - {str(e)}")
+            try:
+                # Close the capture/writer now; the partial output is left as is
+                pipeline.video_processor.release()
+            except Exception as release_error:
+                Logger.warning(f"[Task {task_id}] Error releasing video processor: {release_error}")
+        
         except Exception as e:
             task.status = 'failed'
             task.error_message = str(e)
             Logger.error(f"Task failed: {task_id} - {str(e)}")
+            if pipeline is not None:
+                try:
+                    # Close the capture/writer (reaps a dead ffmpeg writer) before the pipeline is reused
+                    pipeline.video_processor.release()
+                except Exception as release_error:
+                    Logger.warning(f"[Task {task_id}] Error releasing video processor: {release_error}")
         
         finally:
             task.end_time = datetime.now()
+            self._update_aggregates(task)
+            if pipeline is not None:
+                self._release_pipeline(pipeline)
     
-    def run(self, debug=False):
-        """Run the web server"""
+    def run(self, debug=False, host='0.0.0.0'):
+        """
+        Run the web server
+        
+        Uses waitress (multi-threaded production WSGI server) unless debug is set
+        or waitress is not installed, in which case the Flask dev server is used.
+        
+        Args:
+            debug: Run the Flask dev server in debug mode
+            host: Host to bind to
+        """
         Logger.info(f"Starting web server on http://localhost:{self.port}")
-        self.app.run(host='0.0.0.0', port=self.port, debug=debug, threaded=True)
+        if not debug and waitress_serve is not None:
+            threads = int(self._config().get('server.threads', 16) or 16)
+            Logger.info(f"Serving with waitress ({threads} threads)")
+            waitress_serve(self.app, host=host, port=self.port, threads=threads)
+            return
+        if not debug:
+            Logger.warning("waitress not installed; using Flask development server")
+        self.app.run(host=host, port=self.port, debug=debug, threaded=True)
 
 
 def create_app(config_path='configs/config.yaml', port=5000):
@@ -1596,6 +3272,12 @@ def create_app(config_path='configs/config.yaml', port=5000):
     server = WebServer(config_path, port)
     return server.app, server
 
+
+def create_wsgi_app(config_path='configs/config.yaml'):
+    """WSGI app factory for external servers, e.g. gunicorn "app.server:create_wsgi_app()" """
+    app, _ = create_app(config_path)
+    return app
+
 if __name__ == '__main__':
     server = WebServer()
     server.run(debug=False)
\ No newline at end of file
@@ -54,13 +54,15 @@ class APIClient {
     }
 
     async uploadFile(endpoint, file) {
-        const formData = new FormData();
-        formData.append('file', file);
-
+        // Send the raw file as the request body so the server writes it straight to disk
         const url = this.baseURL + endpoint;
         const options = {
             method: 'POST',
-            body: formData
+            headers: {
+                'Content-Type': 'application/octet-stream',
+                'X-Filename': encodeURIComponent(file.name)
+            },
+            body: file
         };
 
         try {
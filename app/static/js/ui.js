@@ -76,14 +76,16 @@ class UI {
             'queued': 'processing',
             'processing': 'processing',
             'completed': 'completed',
-            'failed': 'failed'
+            'failed': 'failed',
+            'cancelled': 'failed'
         };
 
         const statusText = {
             'queued': 'CHỜ',
             'processing': 'ĐANG XỬ LÝ',
             'completed': 'HOÀN THÀNH',
-            'failed': 'THẤT BẠI'
+            'failed': 'THẤT BẠI',
+            'cancelled': 'ĐÃ HỦY'
         };
 
         const progressPercent = task.progress || 0;
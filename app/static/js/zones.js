@@ -54,7 +54,7 @@ class ZoneEditor {
         }
     }
 
-    loadPreviewImage(previewUrl) {
+    async loadPreviewImage(previewUrl) {
         console.log('Loading preview from:', previewUrl);
         
         if (!previewUrl) {
@@ -62,6 +62,22 @@ class ZoneEditor {
             return;
         }
         
+        // The preview is extracted in the background after upload: poll its status
+        // (202 while pending) instead of holding a server request open until it is ready
+        const statusUrl = previewUrl.replace('/api/preview/', '/api/preview-status/');
+        for (let attempt = 0; attempt < 120; attempt++) {
+            try {
+                const resp = await fetch(statusUrl);
+                if (resp.status !== 202) {
+                    break;
+                }
+            } catch (e) {
+                console.warn('Preview status check failed:', e);
+                break;
+            }
+            await new Promise(resolve => setTimeout(resolve, 500));
+        }
+        
         const img = new Image();
         
         img.onload = () => {
@@ -33,8 +33,8 @@ def main():
         Logger.info("Press Ctrl+C to stop the server")
         Logger.info("=" * 60)
         
-        # Run Flask app
-        app.run(host=args.host, port=args.port, debug=args.debug, threaded=True)
+        # Run server (waitress in production, Flask dev server with --debug)
+        server.run(debug=args.debug, host=args.host)
         
         return 0
     
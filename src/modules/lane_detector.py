@@ -27,17 +27,27 @@ class LaneDetector:
         self.hough_min_length = hough_min_length
         self.hough_max_gap = hough_max_gap
         
-        Logger.info("Lane detector initialized")
+        # Run the Gaussian -> Canny -> Hough chain through the OpenCL T-API (cv2.UMat) when available
+        self.use_opencl = bool(cv2.ocl.haveOpenCL())
+        if self.use_opencl:
+            cv2.ocl.setUseOpenCL(True)
+        
+        # Reused across frames instead of being rebuilt every call
+        self.clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        self._roi_mask = None
+        self._roi_mask_shape = None
+        
+        Logger.info(f"Lane detector initialized (OpenCL: {self.use_opencl})")
     
     def preprocess_image(self, image: np.ndarray) -> np.ndarray:
         """
         Preprocess image for lane detection
         
         Args:
-            image: Input BGR image
+            image: Input BGR image (ndarray or cv2.UMat)
             
         Returns:
-            Processed image
+            Processed image (same type as input)
         """
         # Convert to grayscale
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
@@ -46,8 +56,7 @@ class LaneDetector:
         blurred = cv2.GaussianBlur(gray, (5, 5), 0)
         
         # Apply CLAHE (Contrast Limited Adaptive Histogram Equalization)
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        enhanced = clahe.apply(blurred)
+        enhanced = self.clahe.apply(blurred)
         
         return enhanced
     
@@ -56,10 +65,10 @@ class LaneDetector:
         Detect edges using Canny edge detection
         
         Args:
-            image: Preprocessed image
+            image: Preprocessed image (ndarray or cv2.UMat)
             
         Returns:
-            Edge map
+            Edge map (same type as input)
         """
         edges = cv2.Canny(image, self.canny_low, self.canny_high)
         return edges
@@ -95,6 +104,21 @@ class LaneDetector:
         masked = cv2.bitwise_and(image, mask)
         return masked
     
+    def _get_roi_mask(self, height: int, width: int):
+        """Default ROI mask for a frame size, built once and kept (as UMat on the OpenCL path)"""
+        if self._roi_mask is None or self._roi_mask_shape != (height, width):
+            mask = np.zeros((height, width), dtype=np.uint8)
+            vertices = np.array([[
+                (0, height),
+                (width / 4, height / 2),
+                (3 * width / 4, height / 2),
+                (width, height)
+            ]], dtype=np.int32)
+            cv2.fillPoly(mask, vertices, 255)
+            self._roi_mask = cv2.UMat(mask) if self.use_opencl else mask
+            self._roi_mask_shape = (height, width)
+        return self._roi_mask
+    
     def detect_lanes(self, image: np.ndarray) -> Dict:
         """
         Detect lanes in image
@@ -103,27 +127,36 @@ class LaneDetector:
             image: Input BGR image
             
         Returns:
-            Dictionary with lane information
+            Dictionary with lane information ('edges' and 'roi_mask' are
+            cv2.UMat when the OpenCL path is used)
         """
+        h, w = image.shape[:2]
+        
+        # Upload once; every step below stays on the OpenCL device
+        src = cv2.UMat(image) if self.use_opencl else image
+        
         # Preprocess
-        preprocessed = self.preprocess_image(image)
+        preprocessed = self.preprocess_image(src)
         
         # Detect edges
         edges = self.detect_edges(preprocessed)
         
         # Apply ROI
-        roi = self.region_of_interest(edges)
+        roi = cv2.bitwise_and(edges, self._get_roi_mask(h, w))
         
         # Detect lines using Hough transform
         lines = cv2.HoughLinesP(roi, rho=1, theta=np.pi/180,
                                threshold=self.hough_threshold,
                                minLineLength=self.hough_min_length,
                                maxLineGap=self.hough_max_gap)
+        # Only the small line array is downloaded back to host memory
+        if isinstance(lines, cv2.UMat):
+            lines = lines.get()
         
         lane_lines = []
         if lines is not None:
-            for line in lines:
-                x1, y1, x2, y2 = line[0]
+            # (N, 1, 4) on OpenCV 4.x; reshape also accepts the flat (N, 4) layout
+            for x1, y1, x2, y2 in lines.reshape(-1, 4):
                 
                 # Filter nearly horizontal or vertical lines
                 angle = np.arctan2(y2 - y1, x2 - x1) * 180 / np.pi
@@ -99,7 +99,8 @@ class SimpleTracker:
         
         # Match detections to existing tracks
         matched = self.match_detections(detections)
-        matched_detection_indices = set()
+        # match_detections returns the detection dicts themselves, so compare by identity
+        matched_detection_ids = {id(d) for d in matched.values()}
         
         # Update matched tracks
         for track_id, detection in matched.items():
@@ -120,7 +121,7 @@ class SimpleTracker:
         
         # Create new tracks for unmatched detections
         for i, detection in enumerate(detections):
-            if i not in matched_detection_indices:
+            if id(detection) not in matched_detection_ids:
                 track = TrackedObject(
                     track_id=self.next_track_id,
                     detections=[detection],
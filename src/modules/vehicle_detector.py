@@ -49,6 +49,20 @@ class VehicleDetector:
         Logger.info(f"Loading YOLOv8 model: {model_name} on device={self.device}")
         # Load model (deferred to load_model method for flexibility)
         self.model = None
+        # Tracker for batched inference, created on first detect_batch call
+        self._batch_tracker = None
+        # Rate of the frames passed to detect_batch (source fps / frame skip); scales how
+        # long the tracker keeps lost tracks. Set per video before the first batch.
+        self.frame_rate = 30.0
+        # TensorRT engines only accept their exported (square input_size) shape
+        self.fixed_input_shape = False
+        # Persistent letterbox input buffers for detect_batch (allocated per frame size); on CUDA
+        # the host buffer is pinned and uploaded, on CPU the model reads it directly
+        self.use_tensor_input = True
+        self._input_key = None
+        self._in_cpu = None
+        self._in_np = None
+        self._in_gpu = None
         try:
             self.load_model()
         except Exception as e:
@@ -66,9 +80,10 @@ class VehicleDetector:
         """
         # Run inference
         results = self.model(image, conf=self.confidence_threshold, verbose=False)
-        result = results[0]
-        
-        # Process detections
+        return self._parse_result(results[0], image)
+
+    def _parse_result(self, result, image: np.ndarray) -> Dict:
+        """Convert one Ultralytics result into the detection dict used by the pipeline"""
         detections = []
         
         if result.boxes is not None:
@@ -103,7 +118,12 @@ class VehicleDetector:
         Logger.info(f"Loading YOLOv8 model: {self.model_name}")
         # Some ultralytics wrappers accept device in the constructor; try to pass it
         try:
-            self.model = YOLO(f"{self.model_name}.pt")
+            # Accept bare model names (yolov8m) as well as explicit weight files (.pt/.onnx/.engine)
+            weights = str(self.model_name)
+            if not weights.endswith(('.pt', '.onnx', '.engine')):
+                weights = f"{weights}.pt"
+            self.model = YOLO(weights)
+            self.fixed_input_shape = weights.endswith('.engine')
             # Move model to device if supported
             try:
                 self.model.to(self.device)
@@ -118,6 +138,23 @@ class VehicleDetector:
             Logger.info("FP16 half precision enabled for CUDA device")
         Logger.info(f"Model loaded successfully on {self.device} (input_size={self.input_size})")
     
+    def warmup(self):
+        """Run one dummy forward pass so CUDA context/kernels are initialized before real frames"""
+        dummy = np.zeros((self.input_size, self.input_size, 3), dtype=np.uint8)
+        self.model(dummy, conf=self.confidence_threshold, verbose=False,
+                   imgsz=self.input_size, half=self.half_precision)
+        Logger.info(f"Model warmed up: {self.model_name}")
+
+    def reset_tracking(self):
+        """Reset tracker state so a reused model starts the next video with fresh track IDs"""
+        self._batch_tracker = None
+        predictor = getattr(self.model, 'predictor', None)
+        for tracker in getattr(predictor, 'trackers', None) or []:
+            try:
+                tracker.reset()
+            except Exception as e:
+                Logger.debug(f"Tracker reset failed: {e}")
+    
     def detect_with_tracking(self, image: np.ndarray) -> Dict:
         """
         Detect vehicles with tracking
@@ -137,35 +174,138 @@ class VehicleDetector:
             imgsz=self.input_size,
             half=self.half_precision
         )
-        result = results[0]
+        return self._parse_result(results[0], image)
+
+    def _get_batch_tracker(self):
+        """Lazily create the tracker used by detect_batch (same config as model.track's default)
         
-        detections = []
+        Built the way ultralytics.trackers.track.on_predict_start does; these are not public
+        API, which is why requirements.txt pins the ultralytics version.
+        """
+        if self._batch_tracker is None:
+            from ultralytics.trackers.track import TRACKER_MAP
+            from ultralytics.utils import IterableSimpleNamespace, yaml_load
+            from ultralytics.utils.checks import check_yaml
+            cfg = IterableSimpleNamespace(**yaml_load(check_yaml('botsort.yaml')))
+            frame_rate = max(1, int(round(self.frame_rate or 30)))
+            self._batch_tracker = TRACKER_MAP[cfg.tracker_type](args=cfg, frame_rate=frame_rate)
+        return self._batch_tracker
+
+    def _letterbox_batch(self, images: List[np.ndarray]):
+        """
+        Letterbox frames into a persistent buffer and upload it to the device
         
-        if result.boxes is not None:
-            for box in result.boxes:
-                cls_id = int(box.cls)
-                
-                if cls_id in self.VEHICLE_CLASSES:
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    confidence = float(box.conf)
-                    class_name = self.model.names[cls_id]
-                    track_id = int(box.id) if box.id is not None else -1
-                    
-                    detection = {
-                        'box': (x1, y1, x2, y2),
-                        'confidence': confidence,
-                        'class_id': cls_id,
-                        'class_name': class_name,
-                        'track_id': track_id,
-                        'center': ((x1 + x2) / 2, (y1 + y2) / 2)
-                    }
-                    detections.append(detection)
+        Buffers are allocated once per frame size, so a fixed-resolution video reuses
+        the same host/device memory every batch instead of Ultralytics letterboxing,
+        stacking and transposing each frame into new arrays per call. On CUDA the host
+        buffer is pinned and copied asynchronously; on CPU it is used as is. The input is
+        the minimal stride-32 rectangle, or the square input_size for TensorRT engines
+        (fixed spatial shape).
         
-        return {
-            'detections': detections,
-            'image_shape': image.shape,
-            'num_detections': len(detections)
-        }
+        Args:
+            images: Frames of one video (all the same size)
+            
+        Returns:
+            (BCHW RGB tensor in [0, 1] on device, scale ratio, (pad_x, pad_y))
+        """
+        h, w = images[0].shape[:2]
+        n = len(images)
+        r = min(self.input_size / h, self.input_size / w)
+        new_w, new_h = int(round(w * r)), int(round(h * r))
+        if self.fixed_input_shape:
+            in_w = in_h = self.input_size
+        else:
+            # Minimal rectangle padded to the model stride (as Ultralytics' own letterbox)
+            in_w, in_h = int(np.ceil(new_w / 32) * 32), int(np.ceil(new_h / 32) * 32)
+        pad_x, pad_y = (in_w - new_w) // 2, (in_h - new_h) // 2
+
+        on_cuda = self.device.startswith('cuda')
+        if self._input_key != (h, w) or self._in_cpu.shape[0] < n:
+            self._in_cpu = torch.full((n, in_h, in_w, 3), 114, dtype=torch.uint8)
+            if on_cuda:
+                self._in_cpu = self._in_cpu.pin_memory()
+            self._in_np = self._in_cpu.numpy()
+            self._in_gpu = torch.empty_like(self._in_cpu, device=self.device) if on_cuda else self._in_cpu
+            self._input_key = (h, w)
+            Logger.info(f"Allocated YOLO input buffers: {n}x{in_h}x{in_w} for {w}x{h} frames")
+
+        for i, image in enumerate(images):
+            if image.shape[:2] != (h, w):
+                raise ValueError("All frames in a batch must have the same size")
+            # Resize straight into the buffer; the padding border is never written
+            cv2.resize(image, (new_w, new_h), dst=self._in_np[i, pad_y:pad_y + new_h, pad_x:pad_x + new_w],
+                       interpolation=cv2.INTER_LINEAR)
+
+        gpu = self._in_gpu[:n]
+        if on_cuda:
+            gpu.copy_(self._in_cpu[:n], non_blocking=True)
+        # BGR HWC uint8 -> RGB CHW float
+        x = gpu.flip(-1).permute(0, 3, 1, 2)
+        x = (x.half() if self.half_precision else x.float()) / 255.0
+        return x.contiguous(), r, (pad_x, pad_y)
+
+    def _predict_batch(self, images: List[np.ndarray]) -> list:
+        """Run YOLO on a batch, via the persistent tensor buffers when possible; boxes are in frame coordinates"""
+        if self.use_tensor_input:
+            try:
+                x, r, (pad_x, pad_y) = self._letterbox_batch(images)
+                results = self.model.predict(
+                    x,
+                    conf=self.confidence_threshold,
+                    verbose=False,
+                    imgsz=self.input_size,
+                    half=self.half_precision
+                )
+                for image, result in zip(images, results):
+                    # Map boxes from the letterboxed input back onto the original frame
+                    h, w = image.shape[:2]
+                    result.orig_img = image
+                    result.orig_shape = (h, w)
+                    if result.boxes is not None and len(result.boxes):
+                        data = result.boxes.data.clone()
+                        data[:, [0, 2]] = (data[:, [0, 2]] - pad_x) / r
+                        data[:, [1, 3]] = (data[:, [1, 3]] - pad_y) / r
+                        result.update(boxes=data)
+                return results
+            except Exception as e:
+                Logger.warning(f"Tensor input path failed, using standard YOLO preprocessing: {e}")
+                self.use_tensor_input = False
+
+        return self.model.predict(
+            images,
+            conf=self.confidence_threshold,
+            verbose=False,
+            imgsz=self.input_size,
+            half=self.half_precision
+        )
+
+    def detect_batch(self, images: List[np.ndarray]) -> List[Dict]:
+        """
+        Detect vehicles with tracking in a batch of consecutive frames
+        
+        YOLO runs once for the whole batch; tracking then runs frame by frame,
+        in order, on a single tracker so IDs stay consistent across batches.
+        (model.track on a list would give every batch slot its own tracker.)
+        
+        Args:
+            images: Consecutive frames of one video, in order
+            
+        Returns:
+            Detection results per frame, same format as detect_with_tracking
+        """
+        if not images:
+            return []
+        
+        results = self._predict_batch(images)
+        outputs = []
+        for image, result in zip(images, results):
+            if result.boxes is not None and len(result.boxes):
+                tracks = self._get_batch_tracker().update(result.boxes.cpu().numpy(), image)
+                if len(tracks):
+                    result = result[tracks[:, -1].astype(int)]
+                    result.update(boxes=torch.as_tensor(tracks[:, :-1]))
+            outputs.append(self._parse_result(result, image))
+        return outputs
     
     def get_model_info(self) -> Dict:
         """Get model information"""
@@ -49,14 +49,15 @@ class ViolationDetector:
             return True  # No lanes detected, assume valid
         
         # Check if vehicle center is within any lane
-        for boundary in boundaries:
-            left = boundary.get('left', 0)
-            right = boundary.get('right', float('inf'))
-            
-            if left <= x_center <= right:
-                return True
-        
-        return False
+        lefts, rights = self._boundary_arrays(boundaries)
+        return bool(np.any((lefts <= x_center) & (x_center <= rights)))
+    
+    @staticmethod
+    def _boundary_arrays(boundaries: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+        """Left/right edges of all lane boundaries as arrays, for vectorized interval tests"""
+        lefts = np.array([b.get('left', 0) for b in boundaries], dtype=np.float64)
+        rights = np.array([b.get('right', float('inf')) for b in boundaries], dtype=np.float64)
+        return lefts, rights
     
     def calculate_violation_score(self, vehicle_box: Tuple, 
                                  lane_boundaries: Dict) -> float:
@@ -77,21 +78,12 @@ class ViolationDetector:
             return 0
         
         # Calculate how much of vehicle width is outside lanes
+        # (sample columns x lanes interval test in one broadcast)
         vehicle_width = x2 - x1
-        outside_pixels = 0
-        
-        for x in np.linspace(x1, x2, int(vehicle_width)):
-            in_lane = False
-            for boundary in boundaries:
-                left = boundary.get('left', 0)
-                right = boundary.get('right', float('inf'))
-                
-                if left <= x <= right:
-                    in_lane = True
-                    break
-            
-            if not in_lane:
-                outside_pixels += 1
+        xs = np.linspace(x1, x2, int(vehicle_width))[:, None]
+        lefts, rights = self._boundary_arrays(boundaries)
+        in_lane = np.any((lefts <= xs) & (xs <= rights), axis=1)
+        outside_pixels = int(np.count_nonzero(~in_lane))
         
         violation_score = outside_pixels / int(vehicle_width) if vehicle_width > 0 else 0
         return min(violation_score, 1.0)
@@ -100,7 +92,8 @@ class ViolationDetector:
                         lane_boundaries: Dict, zone_manager=None, 
                         vehicle_class: str = None,
                         selected_zone_ids: List[str] = None,
-                        frame_num: int = None) -> Dict:
+                        frame_num: int = None,
+                        zone_violation_info: Dict = None) -> Dict:
         """
         Detect if vehicle is violating lane rules or zone restrictions
         
@@ -111,6 +104,7 @@ class ViolationDetector:
             zone_manager: ZoneManager instance for zone-based detection
             vehicle_class: Vehicle class name for zone checking
             selected_zone_ids: Only check these zones for violations
+            zone_violation_info: Precomputed zone check result (from ZoneManager.check_violations)
             
         Returns:
             Dictionary with violation information
@@ -126,14 +120,16 @@ class ViolationDetector:
         
         # Check zone-based violation (only in selected zones)
         is_zone_violating = False
-        zone_violation_info = None
         
         if zone_manager and vehicle_class and selected_zone_ids:
-            vehicle_center = self.get_vehicle_bottom_center(vehicle_box)
-            zone_violation_info = zone_manager.check_violation(
-                vehicle_center, vehicle_class, selected_zone_ids
-            )
+            if zone_violation_info is None:
+                vehicle_center = self.get_vehicle_bottom_center(vehicle_box)
+                zone_violation_info = zone_manager.check_violation(
+                    vehicle_center, vehicle_class, selected_zone_ids
+                )
             is_zone_violating = zone_violation_info['is_violating']
+        else:
+            zone_violation_info = None
         
         # Combined violation status
         is_violating = is_lane_violating or is_zone_violating
@@ -184,7 +180,15 @@ class ViolationDetector:
         """
         violations = []
         
-        for detection in detections:
+        # Zone checks for all vehicles at once: one (vehicles x zones) membership matrix
+        zone_infos = [None] * len(detections)
+        if zone_manager and selected_zone_ids and detections:
+            bottom_centers = np.array([self.get_vehicle_bottom_center(d['box']) for d in detections],
+                                      dtype=np.float64)
+            vehicle_classes = [d.get('class_name', 'unknown') for d in detections]
+            zone_infos = zone_manager.check_violations(bottom_centers, vehicle_classes, selected_zone_ids)
+        
+        for detection, zone_info in zip(detections, zone_infos):
             vehicle_box = detection['box']
             track_id = detection.get('track_id', -1)
             vehicle_class = detection.get('class_name', 'unknown')
@@ -192,7 +196,8 @@ class ViolationDetector:
             violation_info = self.detect_violation(
                 vehicle_box, track_id, lane_boundaries, 
                 zone_manager, vehicle_class, selected_zone_ids,
-                frame_num=frame_num
+                frame_num=frame_num,
+                zone_violation_info=zone_info
             )
             violation_info['detection'] = detection
             violations.append(violation_info)
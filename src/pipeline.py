@@ -5,11 +5,12 @@ from typing import Dict, List
 from pathlib import Path
 from collections import OrderedDict
 
-from src.utils.config_loader import ConfigLoader
+from src.utils.config_loader import load_config
 from src.utils.logger import Logger
 from src.utils.drawing import DrawingUtils
 from src.utils.video_processor import VideoProcessor
 from src.utils.zone_manager import ZoneManager
+from src.utils.image_codec import read_image
 from src.modules.vehicle_detector import VehicleDetector
 from src.modules.lane_detector import LaneDetector
 from src.modules.violation_detector import ViolationDetector
@@ -18,7 +19,8 @@ from src.modules.violation_detector import ViolationDetector
 class LaneViolationPipeline:
     """Main detection pipeline combining all modules"""
     
-    def __init__(self, config_path: str = "configs/config.yaml", input_source=None, output_path=None, task_id=None):
+    def __init__(self, config_path: str = "configs/config.yaml", input_source=None, output_path=None, task_id=None,
+                 model_name: str = None):
         """
         Initialize pipeline
         
@@ -27,8 +29,11 @@ class LaneViolationPipeline:
             input_source: Optional override for video input; if None, do not open here
             output_path: Optional override for output path
             task_id: Task ID for loading task-specific zones
+            model_name: Optional override for yolo.model_name (model name or weights file),
+                so the detector loads only the model that will be used
         """
-        self.config = ConfigLoader(config_path)
+        # Own copy of the cached parsed config: no YAML re-parse, and set() stays local
+        self.config = load_config(config_path).copy()
         self.task_id = task_id
         self.selected_zone_ids = []  # Zones to focus processing on (can be multiple)
         Logger.setup("logs")
@@ -37,7 +42,7 @@ class LaneViolationPipeline:
         
         # Initialize modules with performance settings
         self.vehicle_detector = VehicleDetector(
-            model_name=self.config.get('yolo.model_name', 'yolov8m'),
+            model_name=model_name or self.config.get('yolo.model_name', 'yolov8m'),
             confidence_threshold=self.config.get('yolo.confidence_threshold', 0.5),
             device=self.config.get('yolo.device', 'cuda'),
             half_precision=self.config.get('yolo.half_precision', True),
@@ -57,9 +62,7 @@ class LaneViolationPipeline:
         )
         
         # Initialize zone manager with task-specific zones
-        task_zones_path = f"data/tasks/{task_id}/zones.json" if task_id else 'configs/zones.json'
-        self.zone_manager = ZoneManager(task_zones_path)
-        Logger.info(f"Loaded {len(self.zone_manager.zones)} detection zones from {task_zones_path}")
+        self._load_zones(task_id)
         
         # If no override provided, default to None here to avoid opening sample video prematurely
         resolved_input = input_source if input_source is not None else None
@@ -67,7 +70,8 @@ class LaneViolationPipeline:
         
         self.video_processor = VideoProcessor(
             input_source=resolved_input,
-            output_path=resolved_output
+            output_path=resolved_output,
+            encoder=self.config.get('video.encoder', 'cpu')
         )
         
         self.frame_skip = self.config.get('processing.frame_skip', 1)
@@ -82,6 +86,12 @@ class LaneViolationPipeline:
         # Temporal smoothing for lane boundaries to reduce jitter
         self.prev_boundaries = None
         self.boundary_alpha = float(self.config.get('processing.boundary_alpha', 0.6))
+        # Lane geometry changes slowly: rerun lane detection only every N frames
+        self.lane_refresh_interval = max(1, int(self.config.get('processing.lane_refresh_interval', 5)))
+        self._lane_cache = {'frame_num': float('-inf'), 'lanes': None}
+        # Frame-level CV (lane detection) runs on a copy downscaled to this width; 0 = full resolution
+        self.input_resolution = int(self.config.get('processing.input_resolution', 960) or 0)
+        self._proc_buffer = None
 
         # Store saved violation snapshots: track_id -> relative URL
         self.saved_violation_snapshots = {}
@@ -100,14 +110,107 @@ class LaneViolationPipeline:
         self.zone_grace_frames = int(self.config.get('tracking.zone_grace_frames', 3))
         
         Logger.info("Pipeline initialized successfully")
+
+    def _load_zones(self, task_id=None):
+        """Load task-specific zones, or the global zones when no task_id is given"""
+        task_zones_path = f"data/tasks/{task_id}/zones.json" if task_id else 'configs/zones.json'
+        self.zone_manager = ZoneManager(task_zones_path)
+        Logger.info(f"Loaded {len(self.zone_manager.zones)} detection zones from {task_zones_path}")
+
+    def reset(self, task_id=None):
+        """
+        Reset per-run state so an already loaded (warm) pipeline can be reused
+        
+        Args:
+            task_id: Task ID for loading task-specific zones (None = global zones)
+        """
+        self.task_id = task_id
+        self.selected_zone_ids = []
+        self._load_zones(task_id)
+
+        # Drop any capture/writer left open by a previous run
+        vp = self.video_processor
+        if vp.cap is not None or vp.writer is not None or vp.imageio_writer is not None:
+            vp.release()
+        self.video_processor = VideoProcessor(
+            input_source=None,
+            output_path=self.config.get('processing.output_path'),
+            encoder=self.config.get('video.encoder', 'cpu')
+        )
+
+        # Restore per-task overridable options to their configured values
+        self.frame_skip = self.config.get('processing.frame_skip', 1)
+        self.draw_trajectories = self.config.get('processing.draw_trajectories', True)
+        self.draw_confidence = self.config.get('processing.draw_confidence', True)
+        self.vehicle_detector.confidence_threshold = self.config.get('yolo.confidence_threshold', 0.5)
+
+        # Fresh tracking and violation state
+        self.vehicle_detector.reset_tracking()
+        self.violation_detector.violation_history = {}
+        self.violation_count = 0
+        self.violation_history = {}
+        self.prev_boundaries = None
+        self._lane_cache = {'frame_num': float('-inf'), 'lanes': None}
+        self.saved_violation_snapshots = {}
+        self.frame_buffer = OrderedDict()
+        self.zone_presence = {}
     
-    def process_frame(self, frame: np.ndarray, frame_num: int) -> Dict:
+    def _processing_view(self, frame: np.ndarray):
+        """
+        Downscale frame once for frame-level CV passes
+        
+        Args:
+            frame: Full resolution frame
+            
+        Returns:
+            (processing frame, scale factor from processing back to full resolution);
+            the processing frame is a buffer reused on the next call
+        """
+        h, w = frame.shape[:2]
+        if not self.input_resolution or w <= self.input_resolution:
+            return frame, 1.0
+        
+        pw = self.input_resolution
+        ph = int(round(h * pw / float(w)))
+        shape = (ph, pw) + frame.shape[2:]
+        if self._proc_buffer is None or self._proc_buffer.shape != shape:
+            self._proc_buffer = np.empty(shape, dtype=frame.dtype)
+        cv2.resize(frame, (pw, ph), dst=self._proc_buffer, interpolation=cv2.INTER_AREA)
+        return self._proc_buffer, w / float(pw)
+
+    def _detect_lane_boundaries(self, frame: np.ndarray) -> Dict:
+        """Lane boundaries detected on the downscaled view, mapped back to full frame coordinates"""
+        view, scale = self._processing_view(frame)
+        lane_boundaries = self.lane_detector.get_lane_boundaries(view)
+        if scale != 1.0:
+            for boundary in lane_boundaries.get('boundaries', []):
+                for key in ('left', 'right', 'center', 'width'):
+                    if key in boundary:
+                        boundary[key] = float(boundary[key]) * scale
+            lane_boundaries['image_width'] = frame.shape[1]
+            lane_boundaries['image_height'] = frame.shape[0]
+        return lane_boundaries
+
+    def detect_batch(self, frames: List[np.ndarray]) -> List[Dict]:
+        """
+        Run vehicle detection with tracking for consecutive frames in one batched YOLO call
+        
+        Args:
+            frames: Consecutive frames of one video, in order
+            
+        Returns:
+            Detection results per frame, to pass to process_frame(detection_result=...)
+        """
+        return self.vehicle_detector.detect_batch(frames)
+
+    def process_frame(self, frame: np.ndarray, frame_num: int, detection_result: Dict = None) -> Dict:
         """
         Process single frame
         
         Args:
             frame: Input frame
             frame_num: Frame number
+            detection_result: Precomputed detections from detect_batch (runs detection if None)
             
         Returns:
             Processing results
@@ -135,7 +238,7 @@ class LaneViolationPipeline:
         # Enforce zone-first workflow
         # If zones are required, skip automatic lane detection and require zones to be present
         if self.require_zones:
-            if not self.zone_manager or len(self.zone_manager.zones) == 0:
+            if not self.zone_manager or self.zone_manager.count == 0:
                 Logger.warning("No zones configured. Create zones before running pipeline. Skipping frame processing.")
                 return results
 
@@ -154,61 +257,69 @@ class LaneViolationPipeline:
             results['lane_boundaries'] = lane_boundaries
         else:
             # Fallback to original lane detection flow when zones are not enforced
-            lane_result = self.lane_detector.detect_lanes(frame)
-            lane_boundaries = self.lane_detector.get_lane_boundaries(frame)
-
-            # Temporal smoothing of lane boundaries to reduce jitter (simple EMA)
-            current_bounds = lane_boundaries.get('boundaries', [])
-            if self.prev_boundaries is None or len(self.prev_boundaries) != len(current_bounds):
-                # Initialize previous boundaries
-                # Make a deep copy of current bounds
-                self.prev_boundaries = [dict(b) for b in current_bounds]
+            # Reuse the cached lanes between refreshes (lanes move slowly between frames)
+            cache = self._lane_cache
+            if cache['lanes'] is not None and 0 <= frame_num - cache['frame_num'] < self.lane_refresh_interval:
+                lane_boundaries = dict(cache['lanes'])
             else:
-                # Smooth each boundary element
-                alpha = self.boundary_alpha
-                for i in range(len(current_bounds)):
-                    curr = current_bounds[i]
-                    prev = self.prev_boundaries[i]
-                    # Smooth numeric fields if present
-                    try:
-                        prev_left = float(prev.get('left', 0))
-                        prev_right = float(prev.get('right', 0))
-                        curr_left = float(curr.get('left', prev_left))
-                        curr_right = float(curr.get('right', prev_right))
-                        prev['left'] = int(round(alpha * curr_left + (1 - alpha) * prev_left))
-                        prev['right'] = int(round(alpha * curr_right + (1 - alpha) * prev_right))
-                        # Update center and width
-                        prev['center'] = (prev['left'] + prev['right']) / 2
-                        prev['width'] = prev['right'] - prev['left']
-                    except Exception:
-                        # If smoothing fails, fallback to current
-                        self.prev_boundaries[i] = dict(curr)
-
-            lane_boundaries['boundaries'] = self.prev_boundaries
+                lane_boundaries = self._detect_lane_boundaries(frame)
+
+                # Temporal smoothing of lane boundaries to reduce jitter (simple EMA)
+                current_bounds = lane_boundaries.get('boundaries', [])
+                if self.prev_boundaries is None or len(self.prev_boundaries) != len(current_bounds):
+                    # Initialize previous boundaries
+                    # Make a deep copy of current bounds
+                    self.prev_boundaries = [dict(b) for b in current_bounds]
+                else:
+                    # Smooth each boundary element
+                    alpha = self.boundary_alpha
+                    for i in range(len(current_bounds)):
+                        curr = current_bounds[i]
+                        prev = self.prev_boundaries[i]
+                        # Smooth numeric fields if present
+                        try:
+                            prev_left = float(prev.get('left', 0))
+                            prev_right = float(prev.get('right', 0))
+                            curr_left = float(curr.get('left', prev_left))
+                            curr_right = float(curr.get('right', prev_right))
+                            prev['left'] = int(round(alpha * curr_left + (1 - alpha) * prev_left))
+                            prev['right'] = int(round(alpha * curr_right + (1 - alpha) * prev_right))
+                            # Update center and width
+                            prev['center'] = (prev['left'] + prev['right']) / 2
+                            prev['width'] = prev['right'] - prev['left']
+                        except Exception:
+                            # If smoothing fails, fallback to current
+                            self.prev_boundaries[i] = dict(curr)
+
+                lane_boundaries['boundaries'] = self.prev_boundaries
+                self._lane_cache = {'frame_num': frame_num, 'lanes': dict(lane_boundaries)}
             results['lane_boundaries'] = lane_boundaries
         
-        # Detect vehicles with tracking
-        detection_result = self.vehicle_detector.detect_with_tracking(frame)
+        # Detect vehicles with tracking (unless already done in a batch)
+        if detection_result is None:
+            detection_result = self.vehicle_detector.detect_with_tracking(frame)
         detections = detection_result['detections']
         
         # Filter detections by selected zones if specified
         if self.selected_zone_ids and len(self.selected_zone_ids) > 0:
             filtered_detections = []
-            for detection in detections:
-                # Get vehicle center point
-                cx, cy = detection['center']
+            # Look all vehicle centers up in the rasterized union of the selected zones
+            # (built once per zone set and frame size)
+            h, w = frame.shape[:2]
+            mask = self.zone_manager.build_selected_mask(w, h, self.selected_zone_ids)
+            centers = np.array([d['center'] for d in detections], dtype=np.float64).reshape(-1, 2)
+            xs = centers[:, 0].astype(np.intp)
+            ys = centers[:, 1].astype(np.intp)
+            in_frame = (xs >= 0) & (xs < w) & (ys >= 0) & (ys < h)
+            in_selected = np.zeros(len(detections), dtype=bool)
+            in_selected[in_frame] = mask[ys[in_frame], xs[in_frame]] != 0
+
+            for detection, in_any_zone in zip(detections, in_selected.tolist()):
                 track_id = int(detection.get('track_id', -1)) if detection.get('track_id') is not None else -1
 
-                # Check if center is inside ANY of the selected zones
-                in_any_zone = False
-                for zone_id in self.selected_zone_ids:
-                    zone = self.zone_manager.get_zone(zone_id)
-                    if zone and zone.contains_point((cx, cy)):
-                        in_any_zone = True
-                        # update presence
-                        if track_id >= 0:
-                            self.zone_presence[track_id] = frame_num
-                        break
+                # Center inside ANY of the selected zones: update presence
+                if in_any_zone and track_id >= 0:
+                    self.zone_presence[track_id] = frame_num
 
                 # Allow brief exits: if we recently saw this track in the zone, keep it for a grace period
                 if not in_any_zone and track_id >= 0:
@@ -367,18 +478,25 @@ class LaneViolationPipeline:
 
         return results
     
-    def draw_results(self, frame: np.ndarray, results: Dict) -> np.ndarray:
+    def draw_results(self, frame: np.ndarray, results: Dict, out: np.ndarray = None) -> np.ndarray:
         """
         Draw detection and violation results on frame
         
         Args:
             frame: Input frame
             results: Processing results
+            out: Buffer to draw into (same shape as frame); pass frame itself to annotate in
+                place when the caller no longer needs the clean frame. None = new copy.
             
         Returns:
             Annotated frame
         """
-        frame_copy = frame.copy()
+        if out is None:
+            frame_copy = frame.copy()
+        else:
+            if out is not frame:
+                np.copyto(out, frame)
+            frame_copy = out
         
         # Draw zones: only selected zones if specified, otherwise all zones
         if self.selected_zone_ids and len(self.selected_zone_ids) > 0:
@@ -387,12 +505,18 @@ class LaneViolationPipeline:
                 zone = self.zone_manager.get_zone(zone_id)
                 if zone:
                     # Draw selected zone with highlight using alpha blending
-                    polygon = np.array(zone.polygon, dtype=np.int32)
+                    polygon = zone.polygon_array
                     
-                    # Create overlay for transparent fill
-                    overlay = frame_copy.copy()
-                    cv2.fillPoly(overlay, [polygon], (0, 255, 255))  # Yellow fill
-                    cv2.addWeighted(overlay, 0.2, frame_copy, 0.8, 0, frame_copy)  # 20% opacity
+                    # Transparent fill, blended only over the zone's bounding box (outside the
+                    # polygon the overlay equals the frame, so the rest would blend to itself)
+                    bx, by, bw, bh = cv2.boundingRect(polygon) if len(polygon) else (0, 0, 0, 0)
+                    x0, y0 = max(bx, 0), max(by, 0)
+                    x1, y1 = min(bx + bw, frame_copy.shape[1]), min(by + bh, frame_copy.shape[0])
+                    if x1 > x0 and y1 > y0:
+                        roi = frame_copy[y0:y1, x0:x1]
+                        overlay = roi.copy()
+                        cv2.fillPoly(overlay, [polygon], (0, 255, 255), offset=(-x0, -y0))  # Yellow fill
+                        cv2.addWeighted(overlay, 0.2, roi, 0.8, 0, roi)  # 20% opacity
                     
                     # Draw border
                     cv2.polylines(frame_copy, [polygon], True, (0, 255, 255), 3)  # Yellow border
@@ -523,18 +647,20 @@ class LaneViolationPipeline:
             self.video_processor.release()
             Logger.info(f"Pipeline completed. Total violations: {self.violation_count}")
     
-    def process_image(self, image_path: str, output_path: str = None) -> np.ndarray:
+    def process_image(self, image_path: str, output_path: str = None, frame: np.ndarray = None) -> np.ndarray:
         """
         Process single image
         
         Args:
             image_path: Input image path
             output_path: Output image path (optional)
+            frame: Already decoded image (skips reading image_path again)
             
         Returns:
             Annotated image
         """
-        frame = cv2.imread(image_path)
+        if frame is None:
+            frame = read_image(image_path)
         if frame is None:
             raise FileNotFoundError(f"Image not found: {image_path}")
         
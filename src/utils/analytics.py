@@ -3,7 +3,7 @@ import json
 from pathlib import Path
 from typing import Dict, List
 from datetime import datetime
-from collections import defaultdict
+from collections import Counter
 
 
 class AnalyticsCollector:
@@ -11,7 +11,7 @@ class AnalyticsCollector:
     
     def __init__(self):
         """Initialize analytics"""
-        self.violations_per_vehicle = defaultdict(int)
+        self.violations_per_vehicle = Counter()
         self.violations_per_frame = []
         self.detections_per_frame = []
         self.frames_processed = 0
@@ -46,6 +46,30 @@ class AnalyticsCollector:
         """Record a violation for a vehicle"""
         self.violations_per_vehicle[track_id] += 1
 
+    def record_violations(self, track_ids: List[int]):
+        """Record one violation for each vehicle in track_ids (one Counter update per frame)"""
+        self.violations_per_vehicle.update(track_ids)
+
+    def record_detections(self, detections: List[Dict]):
+        """
+        Record the track ids and confidences of one frame's detections in a single pass
+        
+        Args:
+            detections: Detection dicts with 'track_id' and 'confidence'
+        """
+        track_ids = []
+        confidences = []
+        for det in detections:
+            track_id = det.get('track_id')
+            if track_id is None:
+                continue
+            track_ids.append(track_id)
+            confidence = det.get('confidence')
+            if confidence is not None and 0 <= confidence <= 1:
+                confidences.append(float(confidence))
+        self.seen_vehicles.update(track_ids)
+        self.confidence_scores.extend(confidences)
+
     def record_detection(self, track_id: int, confidence: float = None):
         """Record that a vehicle (by track id) was detected at least once"""
         try:
@@ -1,7 +1,10 @@
 """Configuration loader module"""
+import os
+import copy
 import yaml
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
 
 
 class ConfigLoader:
@@ -56,9 +59,61 @@ class ConfigLoader:
         
         config[keys[-1]] = value
     
+    def copy(self) -> 'ConfigLoader':
+        """Independent (deep) copy that can be modified with set() without re-reading the file"""
+        clone = ConfigLoader.__new__(ConfigLoader)
+        clone.config_path = self.config_path
+        clone.config = copy.deepcopy(self.config)
+        return clone
+    
     def save(self, output_path: str = None):
         """Save configuration to YAML file"""
         save_path = Path(output_path or self.config_path)
         
         with open(save_path, 'w', encoding='utf-8') as f:
             yaml.dump(self.config, f, default_flow_style=False)
+
+
+@lru_cache(maxsize=4)
+def _load_config(config_path: str, mtime_ns: int, size: int) -> ConfigLoader:
+    """Parse config_path once per (mtime, size) revision"""
+    return ConfigLoader(config_path)
+
+
+def load_config(config_path: str = "configs/config.yaml") -> ConfigLoader:
+    """
+    Get a shared ConfigLoader for config_path, re-parsed only when the file changes
+    
+    The returned loader is shared between callers: treat it as read-only and use
+    ConfigLoader(...) directly when the config is going to be modified.
+    
+    Args:
+        config_path: Path to YAML config file
+        
+    Returns:
+        Cached ConfigLoader for the current file revision
+    """
+    path = str(config_path)
+    return _load_config(path, *config_revision(path))
+
+
+def config_revision(config_path: str = "configs/config.yaml") -> Tuple[int, int]:
+    """
+    Cheap revision id of a config file, changes whenever the file is rewritten
+    
+    Args:
+        config_path: Path to YAML config file
+        
+    Returns:
+        (mtime in ns, size in bytes)
+    """
+    try:
+        stat = os.stat(str(config_path))
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Config file not found: {config_path}")
+    return stat.st_mtime_ns, stat.st_size
+
+
+def clear_config_cache():
+    """Drop cached configs (call after writing a config file)"""
+    _load_config.cache_clear()
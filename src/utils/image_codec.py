@@ -0,0 +1,195 @@
+"""JPEG/WebP encoding for streamed frames"""
+import os
+import mmap
+import cv2
+import numpy as np
+from functools import lru_cache
+try:
+    from nvjpeg import NvJpeg
+except Exception:
+    NvJpeg = None
+try:
+    from turbojpeg import TurboJPEG
+except Exception:
+    TurboJPEG = None
+from src.utils.logger import Logger
+
+
+@lru_cache(maxsize=1)
+def has_libjpeg_turbo() -> bool:
+    """Whether this OpenCV build encodes JPEG with libjpeg-turbo (SIMD DCT/Huffman)"""
+    for line in cv2.getBuildInformation().splitlines():
+        if line.strip().startswith('JPEG:'):
+            return 'turbo' in line.lower()
+    return False
+
+
+def read_image(path, flags: int = cv2.IMREAD_COLOR):
+    """
+    Decode an image file straight from a read-only memory map (no intermediate read buffer)
+    
+    Args:
+        path: Image file path
+        flags: cv2.imdecode flags
+        
+    Returns:
+        Decoded image, or None if the file is missing, empty or not decodable (as cv2.imread)
+    """
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                buf = np.frombuffer(m, dtype=np.uint8)
+                try:
+                    return cv2.imdecode(buf, flags)
+                finally:
+                    # Release the export before the map closes
+                    del buf
+    except (OSError, ValueError):
+        return None
+
+
+class JpegEncoder:
+    """Encode frames to JPEG bytes with nvJPEG (GPU), else PyTurboJPEG, else cv2.imencode"""
+
+    def __init__(self, quality: int = 70, max_height: int = None, skip_duplicates: bool = False):
+        """
+        Initialize JPEG encoder
+
+        Args:
+            quality: JPEG quality (0-100)
+            max_height: Downscale frames taller than this before encoding (None = keep size)
+            skip_duplicates: Return the previous bytes for a frame identical to the previous one
+        """
+        self.quality = int(quality)
+        self.max_height = max_height
+        # Single Huffman pass: optimized tables cost a second pass for a few % size
+        self._params = [cv2.IMWRITE_JPEG_QUALITY, self.quality, cv2.IMWRITE_JPEG_OPTIMIZE, 0]
+        # Reused across frames to avoid a new allocation per resize
+        self._resize_buffer = None
+        self._init_dedup(skip_duplicates)
+
+        self._nvjpeg = None
+        self._turbo = None
+        if NvJpeg is not None:
+            try:
+                self._nvjpeg = NvJpeg()
+                Logger.info("nvJPEG hardware JPEG encoder enabled")
+            except Exception as e:
+                Logger.warning(f"nvJPEG unavailable, using OpenCV JPEG encoder: {e}")
+        if self._nvjpeg is None and TurboJPEG is not None:
+            try:
+                # Calls libjpeg-turbo's SIMD encoder directly, skipping cv2.imencode's overhead
+                self._turbo = TurboJPEG()
+                Logger.info("libjpeg-turbo (PyTurboJPEG) JPEG encoder enabled")
+            except Exception as e:
+                Logger.warning(f"PyTurboJPEG unavailable (libturbojpeg not found), using OpenCV: {e}")
+        if self._nvjpeg is None and self._turbo is None and not has_libjpeg_turbo():
+            Logger.warning("OpenCV is not built with libjpeg-turbo; JPEG encoding will be slower")
+
+    def _init_dedup(self, skip_duplicates: bool):
+        """State for skip_duplicates: copy of the last encoded frame and its bytes"""
+        self.skip_duplicates = bool(skip_duplicates)
+        self._last_frame = None
+        self._last_bytes = None
+
+    def _is_duplicate(self, image: np.ndarray) -> bool:
+        """Whether image equals the last encoded frame (a sparse sample first, rejecting most frames cheaply)"""
+        last = self._last_frame
+        if last is None or last.shape != image.shape or last.dtype != image.dtype:
+            return False
+        return np.array_equal(last[::16, ::16], image[::16, ::16]) and np.array_equal(last, image)
+
+    def encode(self, image: np.ndarray) -> bytes:
+        """
+        Encode BGR image
+
+        Args:
+            image: BGR image
+
+        Returns:
+            Encoded bytes (the previous frame's bytes again for a duplicate when skip_duplicates)
+        """
+        if not self.skip_duplicates:
+            return self._encode(image)
+        if self._is_duplicate(image):
+            return self._last_bytes
+        data = self._encode(image)
+        if self._last_frame is None or self._last_frame.shape != image.shape or self._last_frame.dtype != image.dtype:
+            self._last_frame = np.empty_like(image)
+        np.copyto(self._last_frame, image)
+        self._last_bytes = data
+        return data
+
+    def _downscale(self, image: np.ndarray) -> np.ndarray:
+        """Resize image to max_height (keeping aspect ratio) into the reusable buffer"""
+        h, w = image.shape[:2]
+        if not self.max_height or h <= self.max_height:
+            return image
+
+        new_w = int(round(w * self.max_height / float(h)))
+        shape = (self.max_height, new_w) + image.shape[2:]
+        if self._resize_buffer is None or self._resize_buffer.shape != shape:
+            self._resize_buffer = np.empty(shape, dtype=image.dtype)
+        cv2.resize(image, (new_w, self.max_height), dst=self._resize_buffer,
+                   interpolation=cv2.INTER_AREA)
+        return self._resize_buffer
+
+    def _encode(self, image: np.ndarray) -> bytes:
+        """
+        Encode BGR image to JPEG
+
+        Args:
+            image: BGR image
+
+        Returns:
+            JPEG bytes
+        """
+        image = self._downscale(image)
+
+        if self._nvjpeg is not None:
+            return self._nvjpeg.encode(image, self.quality)
+        if self._turbo is not None:
+            return self._turbo.encode(image, quality=self.quality)
+
+        ok, buffer = cv2.imencode('.jpg', image, self._params)
+        if not ok:
+            raise RuntimeError("JPEG encoding failed")
+        return buffer.tobytes()
+
+
+class WebpEncoder(JpegEncoder):
+    """Encode frames to WebP with cv2.imencode (smaller parts than JPEG at similar quality)"""
+
+    def __init__(self, quality: int = 75, max_height: int = None, skip_duplicates: bool = False):
+        """
+        Initialize WebP encoder
+
+        Args:
+            quality: WebP quality (1-100)
+            max_height: Downscale frames taller than this before encoding (None = keep size)
+            skip_duplicates: Return the previous bytes for a frame identical to the previous one
+        """
+        self.quality = int(quality)
+        self.max_height = max_height
+        self._params = [cv2.IMWRITE_WEBP_QUALITY, self.quality]
+        self._resize_buffer = None
+        self._nvjpeg = None
+        self._turbo = None
+        self._init_dedup(skip_duplicates)
+
+    def _encode(self, image: np.ndarray) -> bytes:
+        """
+        Encode BGR image to WebP
+
+        Args:
+            image: BGR image
+
+        Returns:
+            WebP bytes
+        """
+        ok, buffer = cv2.imencode('.webp', self._downscale(image), self._params)
+        if not ok:
+            raise RuntimeError("WebP encoding failed")
+        return buffer.tobytes()
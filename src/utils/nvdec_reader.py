@@ -0,0 +1,100 @@
+"""NVDEC (GPU) video decoding via PyNvVideoCodec"""
+import numpy as np
+from typing import Optional
+try:
+    import torch
+except Exception:
+    torch = None
+try:
+    import PyNvVideoCodec as nvc
+except Exception:
+    nvc = None
+from src.utils.logger import Logger
+
+
+class NvDecReader:
+    """Decode a video file on the GPU and return BGR frames, as VideoProcessor.read_frame_selective does
+
+    Bitstream parsing and decoding run on NVDEC and the NV12 -> BGR conversion runs as
+    torch ops on the GPU, so the CPU only receives finished frames.
+    """
+
+    def __init__(self, path: str, gpu_id: int = 0):
+        """
+        Open the file and decode the first frame (so unsupported inputs fail here)
+
+        Args:
+            path: Video file path
+            gpu_id: CUDA device index
+        """
+        if nvc is None or torch is None or not torch.cuda.is_available():
+            raise RuntimeError("PyNvVideoCodec with CUDA is required for NVDEC decoding")
+        self.path = str(path)
+        self.device = torch.device(f'cuda:{gpu_id}')
+        self._demuxer = nvc.CreateDemuxer(self.path)
+        self._decoder = nvc.CreateDecoder(gpuid=gpu_id, codec=self._demuxer.GetNvCodecId(),
+                                          cudacontext=0, cudastream=0, usedevicememory=True)
+        self._frames = self._decode_frames()
+        self._next = next(self._frames, None)
+        if self._next is None:
+            raise RuntimeError(f"NVDEC decoded no frames from {self.path}")
+        Logger.info(f"NVDEC decoder opened: {self.path}")
+
+    def _decode_frames(self):
+        """Yield decoded NV12 frames (GPU memory) in display order"""
+        for packet in self._demuxer:
+            for frame in self._decoder.Decode(packet):
+                yield frame
+        # Empty packet flushes frames still held by the decoder
+        for frame in self._decoder.Decode(nvc.PacketData()):
+            yield frame
+
+    def _to_bgr(self, frame) -> np.ndarray:
+        """NV12 (BT.601 limited range) -> BGR uint8 on the GPU, then one download"""
+        nv12 = torch.from_dlpack(frame)
+        h = nv12.shape[0] * 2 // 3
+        y = nv12[:h].float() - 16.0
+        uv = nv12[h:].view(h // 2, -1, 2).float() - 128.0
+        uv = uv.repeat_interleave(2, dim=0).repeat_interleave(2, dim=1)
+        u, v = uv[..., 0], uv[..., 1]
+        y = y * 1.164
+        bgr = torch.stack((y + 2.017 * u, y - 0.392 * u - 0.813 * v, y + 1.596 * v), dim=-1)
+        return bgr.clamp_(0, 255).to(torch.uint8).cpu().numpy()
+
+    def read(self, skip: int = 1) -> Optional[np.ndarray]:
+        """
+        Advance skip frames and return the last one as BGR
+
+        Args:
+            skip: Frames to advance (skipped frames are decoded but never converted)
+
+        Returns:
+            BGR frame, or None at end of video
+        """
+        frame = None
+        for _ in range(max(1, skip)):
+            if self._next is not None:
+                frame, self._next = self._next, None
+            else:
+                frame = next(self._frames, None)
+            if frame is None:
+                return None
+        return self._to_bgr(frame)
+
+    def release(self):
+        """Drop the decoder and demuxer"""
+        self._frames = iter(())
+        self._next = None
+        self._decoder = None
+        self._demuxer = None
+
+
+def open_nvdec_reader(path: str, gpu_id: int = 0) -> Optional[NvDecReader]:
+    """NvDecReader for path, or None (logged) when NVDEC cannot decode it"""
+    if nvc is None:
+        return None
+    try:
+        return NvDecReader(path, gpu_id=gpu_id)
+    except Exception as e:
+        Logger.warning(f"NVDEC decode unavailable for {path}, using OpenCV: {e}")
+        return None
@@ -0,0 +1,78 @@
+"""Streaming PDF writer for pages that are JPEG images"""
+from typing import BinaryIO
+
+
+class JpegPdfWriter:
+    """Write a PDF whose pages are JPEG images, one page at a time
+
+    Each page's JPEG bytes are embedded as they are (DCTDecode), so the caller
+    only needs to hold the page being written; the writer itself keeps just the
+    byte offsets for the cross-reference table.
+    """
+
+    def __init__(self, fp: BinaryIO, dpi: float = 150):
+        """
+        Start the PDF
+
+        Args:
+            fp: Binary output stream (tell() must give the write position)
+            dpi: Resolution of the page images; sets the page size in points
+        """
+        self._fp = fp
+        self._scale = 72.0 / float(dpi)
+        self._offsets = {}  # object id -> byte offset
+        self._pages = []  # object ids of the page objects
+        # 1 = catalog and 2 = page tree, both written by close() once all pages are known
+        self._next_id = 3
+        self._fp.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def _write_obj(self, obj_id: int, body: bytes, stream: bytes = None):
+        """Write one indirect object (with an optional stream) and record its offset"""
+        self._offsets[obj_id] = self._fp.tell()
+        self._fp.write(b'%d 0 obj\n' % obj_id)
+        self._fp.write(body)
+        if stream is not None:
+            self._fp.write(b'\nstream\n')
+            self._fp.write(stream)
+            self._fp.write(b'\nendstream')
+        self._fp.write(b'\nendobj\n')
+
+    def add_page(self, jpeg: bytes, width: int, height: int):
+        """
+        Append a page showing one RGB JPEG image over the whole page
+
+        Args:
+            jpeg: JPEG file bytes
+            width: Image width in pixels
+            height: Image height in pixels
+        """
+        image_id, contents_id, page_id = self._next_id, self._next_id + 1, self._next_id + 2
+        self._next_id += 3
+        w, h = width * self._scale, height * self._scale
+
+        self._write_obj(image_id, b'<< /Type /XObject /Subtype /Image /Width %d /Height %d '
+                                  b'/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode '
+                                  b'/Length %d >>' % (width, height, len(jpeg)), jpeg)
+        contents = b'q %f 0 0 %f 0 0 cm /image Do Q' % (w, h)
+        self._write_obj(contents_id, b'<< /Length %d >>' % len(contents), contents)
+        self._write_obj(page_id, b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %f %f] '
+                                 b'/Resources << /ProcSet [/PDF /ImageC] /XObject << /image %d 0 R >> >> '
+                                 b'/Contents %d 0 R >>' % (w, h, image_id, contents_id))
+        self._pages.append(page_id)
+
+    @property
+    def page_count(self) -> int:
+        return len(self._pages)
+
+    def close(self):
+        """Write the page tree, catalog, cross-reference table and trailer"""
+        kids = b' '.join(b'%d 0 R' % p for p in self._pages)
+        self._write_obj(2, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(self._pages)))
+        self._write_obj(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+
+        xref_offset = self._fp.tell()
+        size = self._next_id
+        self._fp.write(b'xref\n0 %d\n0000000000 65535 f \n' % size)
+        for obj_id in range(1, size):
+            self._fp.write(b'%010d 00000 n \n' % self._offsets[obj_id])
+        self._fp.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (size, xref_offset))
@@ -5,24 +5,115 @@ try:
     import imageio
 except Exception:
     imageio = None
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional, Dict
 from src.utils.logger import Logger
 
 
+@lru_cache(maxsize=1)
+def find_ffmpeg() -> Optional[str]:
+    """Path of an ffmpeg executable: PATH first, then the binary bundled with imageio-ffmpeg"""
+    exe = shutil.which('ffmpeg')
+    if exe:
+        return exe
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return None
+
+
+@lru_cache(maxsize=1)
+def ffmpeg_encoders() -> frozenset:
+    """Names of the video encoders compiled into the ffmpeg found by find_ffmpeg()"""
+    exe = find_ffmpeg()
+    if not exe:
+        return frozenset()
+    try:
+        out = subprocess.run([exe, '-hide_banner', '-encoders'], capture_output=True,
+                             text=True, timeout=10).stdout
+    except Exception as e:
+        Logger.debug(f"Listing ffmpeg encoders failed: {e}")
+        return frozenset()
+    # Lines look like " V....D libx264   libx264 H.264 ..."
+    return frozenset(parts[1] for parts in (line.split() for line in out.splitlines())
+                     if len(parts) > 1 and parts[0].startswith('V'))
+
+
+@lru_cache(maxsize=1)
+def nvenc_usable() -> bool:
+    """Whether ffmpeg can actually open h264_nvenc here (listed encoder and a working GPU/driver)"""
+    exe = find_ffmpeg()
+    if not exe or 'h264_nvenc' not in ffmpeg_encoders():
+        return False
+    try:
+        # Encoding one tiny frame fails fast when no NVENC-capable GPU or driver is present
+        probe = subprocess.run([exe, '-hide_banner', '-loglevel', 'error', '-f', 'lavfi',
+                                '-i', 'color=black:s=256x256', '-frames:v', '1',
+                                '-c:v', 'h264_nvenc', '-f', 'null', '-'],
+                               capture_output=True, timeout=20)
+        return probe.returncode == 0
+    except Exception as e:
+        Logger.debug(f"NVENC probe failed: {e}")
+        return False
+
+
+def open_capture(source, hw_accel: bool = True) -> cv2.VideoCapture:
+    """
+    Open a cv2.VideoCapture with a 1-frame buffer, asking FFmpeg for hardware decode
+    
+    Args:
+        source: Camera index, file path, or RTSP/HTTP URL
+        hw_accel: Request any available hardware decoder (VAAPI/D3D11/NVDEC builds)
+        
+    Returns:
+        Capture (check isOpened())
+    """
+    cap = None
+    if hw_accel and isinstance(source, str) and hasattr(cv2, 'VIDEO_ACCELERATION_ANY'):
+        try:
+            cap = cv2.VideoCapture(source, cv2.CAP_FFMPEG,
+                                   [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
+            if not cap.isOpened():
+                cap.release()
+                cap = None
+        except Exception as e:
+            Logger.debug(f"Hardware-accelerated capture failed for {source}: {e}")
+            cap = None
+    if cap is None:
+        cap = cv2.VideoCapture(source)
+    if cap.isOpened():
+        # Live sources otherwise queue several stale frames; backends without the property ignore it
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        try:
+            accel = int(cap.get(cv2.CAP_PROP_HW_ACCELERATION)) if hasattr(cv2, 'CAP_PROP_HW_ACCELERATION') else 0
+            Logger.info(f"Capture backend: {cap.getBackendName()} (hw acceleration: {accel})")
+        except Exception:
+            pass
+    return cap
+
+
 class VideoProcessor:
     """Handle video input/output processing"""
     
-    def __init__(self, input_source: str = None, output_path: str = None):
+    def __init__(self, input_source: str = None, output_path: str = None, encoder: str = 'cpu'):
         """
         Initialize video processor
         
         Args:
             input_source: Video file path, JPG/PNG file path, camera index (0), or RTSP stream (optional)
             output_path: Output video file path
+            encoder: 'nvenc' to try GPU H.264 encoding (ffmpeg h264_nvenc, then GStreamer nvh264enc) first, 'cpu' for OpenCV codecs only
         """
         self._input_source = input_source
         self._output_path = output_path
+        self.encoder = str(encoder or 'cpu').lower()
         self.cap = None
         self.writer = None
         self.imageio_writer = None
@@ -32,6 +123,11 @@ class VideoProcessor:
         self.fps = 30
         self.width = 1280
         self.height = 720
+        self.total_frames = 0  # Source frame count reported by the container (0 if unknown)
+        self.position = 0  # Source frames read/grabbed since the capture was opened
+        # Reused between frames for resize / BGR->RGB conversion in write_frame
+        self._resize_buffer = None
+        self._rgb_buffer = None
         
         # Only setup input if source is provided
         if self._input_source is not None:
@@ -69,13 +165,28 @@ class VideoProcessor:
     
     @input_source.setter
     def input_source(self, value):
-        """Set input source and re-initialize video capture"""
-        self._input_source = value
+        """Set input source and (re)open the video capture; see open()"""
+        self.open(value)
+    
+    def open(self, source):
+        """
+        Open the video capture for a source
+        
+        Opening a capture can take from ~100 ms up to seconds (container probing,
+        camera start-up), so this is a no-op when the same source is already open
+        and still at its first frame.
+        
+        Args:
+            source: Video file path, JPG/PNG file path, camera index, or RTSP stream
+        """
+        if (self.cap is not None and source == self._input_source and self.position == 0
+                and self.cap.isOpened()):
+            return
+        self._input_source = source
         # Close existing capture if any
         if self.cap is not None:
             self.cap.release()
             self.cap = None
-        # Re-setup with new source
         self._setup_input()
     
     def _setup_input(self):
@@ -84,7 +195,7 @@ class VideoProcessor:
         if isinstance(self._input_source, str) and (self._input_source.startswith('http') or 
                                                    self._input_source.startswith('rtsp')):
             # RTSP stream
-            self.cap = cv2.VideoCapture(self._input_source)
+            self.cap = open_capture(self._input_source)
         else:
             # Video file or camera
             try:
@@ -92,19 +203,20 @@ class VideoProcessor:
             except (ValueError, TypeError):
                 source = str(self._input_source)  # Use as file path
             
-            self.cap = cv2.VideoCapture(source)
+            self.cap = open_capture(source)
         
         if not self.cap.isOpened():
             raise RuntimeError(f"Failed to open video source: {self._input_source}")
         
-        # Get video properties
+        # Get video properties once; the rest of the code reads these attributes, not cap.get()
+        self.position = 0
         self.fps = int(self.cap.get(cv2.CAP_PROP_FPS)) or 30
         self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or 1280
         self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or 720
-        total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT)) or 0
+        self.total_frames = max(0, int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT)) or 0)
         
         Logger.info(f"Video input: {self._input_source}")
-        Logger.info(f"Resolution: {self.width}x{self.height}, FPS: {self.fps}, Frames: {total_frames}")
+        Logger.info(f"Resolution: {self.width}x{self.height}, FPS: {self.fps}, Frames: {self.total_frames}")
     
     def _setup_output(self):
         """Setup video output"""
@@ -120,9 +232,19 @@ class VideoProcessor:
             writer = cv2.VideoWriter(path, fourcc, self.fps, (self.width, self.height))
             return writer if writer.isOpened() else None
 
-        # Attempt avc1
-        writer = try_writer(self._output_path, 'avc1')
-        codec_used = 'avc1'
+        writer = None
+        if self.encoder == 'nvenc':
+            # GPU H.264 via NVENC: an ffmpeg pipe first, then OpenCV's GStreamer backend (nvcodec plugin)
+            writer = self._try_ffmpeg_nvenc_writer(self._output_path)
+            codec_used = 'h264_nvenc (ffmpeg)'
+            if writer is None:
+                writer = self._try_nvenc_writer(self._output_path)
+                codec_used = 'h264_nvenc (GStreamer)'
+
+        if writer is None:
+            # Attempt avc1
+            writer = try_writer(self._output_path, 'avc1')
+            codec_used = 'avc1'
         
         if writer is None:
             # Fallback to mp4v
@@ -169,6 +291,35 @@ class VideoProcessor:
         else:
             Logger.info(f"Output video initialized ({codec_used}): {self._output_path}")
     
+    def _try_ffmpeg_nvenc_writer(self, path: str):
+        """Open an ffmpeg h264_nvenc pipe writer, or return None if ffmpeg/NVENC is unavailable"""
+        if not nvenc_usable():
+            Logger.info("ffmpeg h264_nvenc unavailable, trying GStreamer NVENC")
+            return None
+        try:
+            return FfmpegPipeWriter(path, self.width, self.height, self.fps,
+                                    codec=['-c:v', 'h264_nvenc', '-preset', 'p1'])
+        except Exception as e:
+            Logger.warning(f"ffmpeg NVENC writer failed to start: {e}")
+            return None
+
+    def _try_nvenc_writer(self, path: str):
+        """Open a GStreamer NVENC H.264 writer, or return None if unavailable"""
+        pipeline = (
+            "appsrc ! videoconvert ! nvh264enc bitrate=4000 ! h264parse ! "
+            f"mp4mux ! filesink location=\"{Path(path).as_posix()}\""
+        )
+        try:
+            writer = cv2.VideoWriter(pipeline, cv2.CAP_GSTREAMER, 0, float(self.fps),
+                                     (self.width, self.height), True)
+            if writer.isOpened():
+                return writer
+            writer.release()
+        except Exception as e:
+            Logger.debug(f"GStreamer NVENC writer error: {e}")
+        Logger.info("NVENC writer unavailable (needs OpenCV with GStreamer + nvh264enc), using CPU encoder")
+        return None
+
     def read_frame(self) -> Optional[np.ndarray]:
         """
         Read next frame from video
@@ -182,9 +333,41 @@ class VideoProcessor:
         ret, frame = self.cap.read()
         if ret:
             self.frame_count += 1
+            self.position += 1
             return frame
         return None
-    
+
+    def read_frame_selective(self, skip: int = 1) -> Optional[np.ndarray]:
+        """
+        Read the next frame to process, advancing over skipped frames with grab()
+
+        Skipped frames are only grabbed (demuxed) and never retrieved, so they
+        bypass the BGR conversion/copy done by retrieve().
+
+        Args:
+            skip: Source frames to advance per returned frame (1 = every frame)
+
+        Returns:
+            Frame array or None if video ended
+        """
+        if self.cap is None:
+            return None
+
+        for _ in range(max(1, int(skip)) - 1):
+            if not self.cap.grab():
+                return None
+            self.frame_count += 1
+            self.position += 1
+
+        if not self.cap.grab():
+            return None
+        self.position += 1
+        ret, frame = self.cap.retrieve()
+        if ret:
+            self.frame_count += 1
+            return frame
+        return None
+
     def write_frame(self, frame: np.ndarray):
         """
         Write frame to output video
@@ -210,10 +393,17 @@ class VideoProcessor:
             return
         
         if frame.shape[1] != self.width or frame.shape[0] != self.height:
-            frame = cv2.resize(frame, (self.width, self.height))
+            if self._resize_buffer is None or self._resize_buffer.shape[:2] != (self.height, self.width) \
+                    or self._resize_buffer.shape[2:] != frame.shape[2:] or self._resize_buffer.dtype != frame.dtype:
+                self._resize_buffer = np.empty((self.height, self.width) + frame.shape[2:], dtype=frame.dtype)
+            frame = cv2.resize(frame, (self.width, self.height), dst=self._resize_buffer)
+        
+        if self.writer is not None and not self.writer.isOpened():
+            # Closed under us (e.g. the ffmpeg process exited): frames would be silently dropped
+            raise RuntimeError(f"Video writer is no longer open: {self._output_path}")
         
         # OpenCV path
-        if self.writer is not None and self.writer.isOpened():
+        if self.writer is not None:
             success = self.writer.write(frame)
             if not success:
                 self.write_failures += 1
@@ -245,7 +435,7 @@ class VideoProcessor:
                             # Write this frame via imageio
                             if frame.dtype != np.uint8:
                                 frame = np.clip(frame, 0, 255).astype(np.uint8)
-                            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                            rgb = self._to_rgb(frame)
                             self.imageio_writer.append_data(rgb)
                             self.frame_count += 1
                             return
@@ -269,7 +459,7 @@ class VideoProcessor:
                 if frame.dtype != np.uint8:
                     frame = np.clip(frame, 0, 255).astype(np.uint8)
                 
-                rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                rgb = self._to_rgb(frame)
                 self.imageio_writer.append_data(rgb)
                 self.frame_count += 1  # Track written frames AFTER successful write
                 
@@ -282,6 +472,12 @@ class VideoProcessor:
                 Logger.error(f"Traceback: {traceback.format_exc()}")
                 raise
     
+    def _to_rgb(self, frame: np.ndarray) -> np.ndarray:
+        """BGR -> RGB into a buffer reused across frames (imageio writes synchronously)"""
+        if self._rgb_buffer is None or self._rgb_buffer.shape != frame.shape:
+            self._rgb_buffer = np.empty_like(frame)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb_buffer)
+    
     def release(self):
         """Release video resources and ensure file is completely written"""
         try:
@@ -307,9 +503,8 @@ class VideoProcessor:
                 self.cap.release()
                 self.cap = None
             
-            # Wait a moment to ensure disk writes complete
-            import time
-            time.sleep(0.5)
+            # Writers above finish the file before returning (cv2 release / ffmpeg close
+            # wait for the muxer), so the size check below sees the final file
             
             # Verify output file exists and has size
             if self._output_path:
@@ -333,5 +528,195 @@ class VideoProcessor:
             'fps': self.fps,
             'width': self.width,
             'height': self.height,
-            'frame_count': self.frame_count
+            'frame_count': self.frame_count,
+            'total_frames': self.total_frames
         }
+
+
+class FfmpegPipeWriter:
+    """Write BGR frames to a video file through an ffmpeg subprocess
+    
+    Frames are piped raw to ffmpeg's stdin, so encoding (e.g. h264_nvenc) runs in
+    its own process instead of a per-frame software encode in OpenCV. Exposes the
+    isOpened()/write()/release() subset of cv2.VideoWriter used by VideoProcessor.
+    """
+    
+    def __init__(self, path: str, width: int, height: int, fps: float, codec: list):
+        """
+        Start ffmpeg
+        
+        Args:
+            path: Output file path (.mp4)
+            width: Frame width
+            height: Frame height
+            fps: Output frame rate
+            codec: ffmpeg codec arguments, e.g. ['-c:v', 'h264_nvenc', '-preset', 'p1']
+        """
+        exe = find_ffmpeg()
+        if not exe:
+            raise RuntimeError("ffmpeg not found")
+        fps = float(fps) if fps and fps > 0 else 30.0
+        self.path = str(path)
+        self._frame_size = width * height * 3
+        cmd = [
+            exe, '-hide_banner', '-loglevel', 'error', '-y',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', f'{fps:g}', '-i', '-',
+            # yuv420p needs even dimensions
+            '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p',
+            *codec,
+            # moov atom up front so browsers can start playback before the download completes
+            '-movflags', '+faststart', self.path
+        ]
+        # stderr goes to an unbounded temp file, not a pipe: a full pipe nobody reads until
+        # release() would block ffmpeg, and with it every write()
+        self._stderr = tempfile.TemporaryFile()
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=self._stderr)
+    
+    def isOpened(self) -> bool:
+        """Whether ffmpeg is still running and accepting frames"""
+        return self._proc is not None and self._proc.poll() is None
+    
+    def write(self, frame: np.ndarray) -> bool:
+        """
+        Send one BGR frame (width x height) to ffmpeg
+        
+        Returns:
+            False if the frame size does not match
+            
+        Raises:
+            RuntimeError: if ffmpeg has exited, so the rest of the video cannot be written
+        """
+        if frame.size != self._frame_size:
+            return False
+        try:
+            # Buffer view of the frame, no bytes copy
+            self._proc.stdin.write(memoryview(np.ascontiguousarray(frame)).cast('B'))
+            return True
+        except (BrokenPipeError, OSError, ValueError) as e:
+            code = self._proc.poll() if self._proc is not None else None
+            raise RuntimeError(f"ffmpeg writer stopped accepting frames (exit code {code}): {e}") from e
+    
+    def release(self):
+        """Close stdin and wait for ffmpeg to finalize the file"""
+        if self._proc is None:
+            return
+        try:
+            self._proc.communicate(timeout=120)
+        except Exception as e:
+            self._proc.kill()
+            self._proc.communicate()
+            Logger.error(f"ffmpeg writer did not finish, killed: {e}")
+        if self._proc.returncode != 0:
+            Logger.error(f"ffmpeg writer exited with code {self._proc.returncode}: {self._stderr_tail()}")
+        self._stderr.close()
+        self._proc = None
+    
+    def _stderr_tail(self, limit: int = 500) -> str:
+        """Last `limit` characters ffmpeg wrote to stderr"""
+        try:
+            size = self._stderr.seek(0, 2)
+            self._stderr.seek(max(0, size - limit * 4))
+            return self._stderr.read().decode(errors='replace').strip()[-limit:]
+        except Exception:
+            return ''
+
+
+class FragmentedMp4Encoder:
+    """Live H.264 encode of BGR frames to fragmented MP4 bytes via an ffmpeg subprocess
+    
+    The output (frag_keyframe+empty_moov) can be played while it is still being
+    written, so it can be streamed to a <video> element or Media Source Extensions.
+    Frames go to ffmpeg's stdin; a reader thread collects encoded chunks from stdout.
+    """
+    
+    def __init__(self, width: int, height: int, fps: float = 30, encoder: str = 'cpu'):
+        """
+        Start ffmpeg
+        
+        Args:
+            width: Frame width
+            height: Frame height
+            fps: Output frame rate
+            encoder: 'nvenc' to use h264_nvenc when ffmpeg can open it here, otherwise libx264
+        """
+        exe = find_ffmpeg()
+        if not exe:
+            raise RuntimeError("ffmpeg not found; install ffmpeg or imageio-ffmpeg for MP4 streaming")
+        
+        fps = float(fps) if fps and fps > 0 else 30.0
+        # Listed is not enough: without a usable GPU/driver ffmpeg exits on the first frame
+        if str(encoder).lower() == 'nvenc' and nvenc_usable():
+            codec = ['-c:v', 'h264_nvenc', '-preset', 'p1', '-tune', 'll']
+        else:
+            codec = ['-c:v', 'libx264', '-preset', 'ultrafast', '-tune', 'zerolatency']
+        self.codec = codec[1]
+        self._frame_size = width * height * 3
+        cmd = [
+            exe, '-hide_banner', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', f'{fps:g}', '-i', '-',
+            # yuv420p needs even dimensions
+            '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p',
+            *codec,
+            # One keyframe (and so one fragment) per second keeps latency bounded
+            '-g', str(max(1, int(round(fps)))),
+            '-f', 'mp4', '-movflags', 'frag_keyframe+empty_moov+default_base_moof', '-'
+        ]
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0)
+        self._chunks = queue.Queue()
+        self._reader = threading.Thread(target=self._read_output, daemon=True)
+        self._reader.start()
+        Logger.info(f"MP4 stream encoder started ({self.codec}, {width}x{height} @ {fps:g} fps)")
+    
+    def _read_output(self):
+        """Forward stdout chunks to the queue; None marks end of output"""
+        try:
+            while True:
+                chunk = self._proc.stdout.read(65536)
+                if not chunk:
+                    break
+                self._chunks.put(chunk)
+        finally:
+            self._chunks.put(None)
+    
+    def write(self, frame: np.ndarray):
+        """Send one BGR frame (width x height) to the encoder"""
+        if frame.size != self._frame_size:
+            raise ValueError("Frame size does not match the encoder size")
+        self._proc.stdin.write(memoryview(np.ascontiguousarray(frame)).cast('B'))
+    
+    def drain(self):
+        """Yield the encoded chunks available right now, without waiting"""
+        while True:
+            try:
+                chunk = self._chunks.get_nowait()
+            except queue.Empty:
+                return
+            if chunk is None:
+                # Keep the end marker for finish()
+                self._chunks.put(None)
+                return
+            yield chunk
+    
+    def finish(self):
+        """Close the input and yield the remaining output until ffmpeg exits"""
+        try:
+            self._proc.stdin.close()
+        except Exception:
+            pass
+        while True:
+            chunk = self._chunks.get()
+            if chunk is None:
+                break
+            yield chunk
+        self._proc.wait()
+    
+    def close(self):
+        """Stop ffmpeg (used when the client goes away before finish())"""
+        if self._proc.poll() is None:
+            try:
+                self._proc.stdin.close()
+            except Exception:
+                pass
+            self._proc.kill()
+        self._proc.wait()
+        self._reader.join(timeout=1)
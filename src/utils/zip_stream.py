@@ -0,0 +1,82 @@
+"""Build ZIP archives as a stream of byte chunks (no whole-archive buffer)"""
+import os
+import zipfile
+from typing import Iterable, Iterator, Tuple, Union
+from src.utils.logger import Logger
+
+# Bytes read from a source file per chunk written into the archive
+CHUNK_SIZE = 1 << 20
+# Already-compressed media: deflate costs CPU here for almost no size gain, so they are stored
+STORED_SUFFIXES = frozenset({'.jpg', '.jpeg', '.png', '.webp', '.mp4', '.avi', '.mkv', '.zip'})
+
+
+def entry_compression(arcname: str, compression: int) -> int:
+    """Compression method for one entry: ZIP_STORED for STORED_SUFFIXES, else compression"""
+    return zipfile.ZIP_STORED if os.path.splitext(arcname)[1].lower() in STORED_SUFFIXES else compression
+
+
+class _ChunkSink:
+    """Write-only file object collecting what zipfile writes until it is taken
+
+    It has no tell()/seek(), so zipfile writes in streaming mode (sizes and CRC in a
+    data descriptor after each entry) and never goes back to patch a header.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        """Everything written since the last call"""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_zip(entries: Iterable[Tuple[str, Union[str, os.PathLike, bytes]]],
+             compression: int = zipfile.ZIP_DEFLATED) -> Iterator[bytes]:
+    """
+    Generate a ZIP archive chunk by chunk, e.g. as a streamed Flask Response body
+
+    Args:
+        entries: (arcname, source) pairs; source is a file path or the entry's bytes
+        compression: zipfile compression method for entries that are not already-compressed media
+
+    Yields:
+        Archive bytes; at most about CHUNK_SIZE of compressed data is held at a time
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as zf:
+        for arcname, source in entries:
+            compress_type = entry_compression(arcname, compression)
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                zf.writestr(arcname, bytes(source), compress_type=compress_type)
+            else:
+                try:
+                    info = zipfile.ZipInfo.from_file(source, arcname)
+                    src = open(source, 'rb')
+                except OSError as e:
+                    # Removed between the listing and now: leave it out
+                    Logger.warning(f"ZIP export: skipping {source}: {e}")
+                    continue
+                info.compress_type = compress_type
+                with src, zf.open(info, 'w') as dest:
+                    while True:
+                        chunk = src.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        dest.write(chunk)
+                        data = sink.take()
+                        if data:
+                            yield data
+            data = sink.take()
+            if data:
+                yield data
+    # Central directory, written when the archive closes
+    yield sink.take()
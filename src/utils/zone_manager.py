@@ -1,12 +1,61 @@
 """Zone management for lane violation detection"""
+import os
 import json
+import atexit
+import tempfile
+import threading
 import cv2
 import numpy as np
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional
+try:
+    import orjson
+except Exception:
+    orjson = None
 from src.utils.logger import Logger
 
 
+def write_json_atomic(path, data: Dict, make_dirs: bool = True):
+    """
+    Write JSON via a temp file in the same directory + os.replace
+    
+    Readers see either the old or the new file, never a truncated one; no fsync,
+    since losing the last edit on power failure is acceptable for zone files.
+    
+    Args:
+        path: Destination file path
+        data: JSON-serializable data
+        make_dirs: Create the parent directory first (skip when the caller knows it exists)
+    """
+    path = Path(path)
+    if make_dirs:
+        path.parent.mkdir(parents=True, exist_ok=True)
+    if orjson is not None:
+        payload = orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    else:
+        payload = json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+    fd, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=path.name, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+@lru_cache(maxsize=256)
+def _scaled_polygon(polygon: Tuple[Tuple[int, int], ...], base_width: int, base_height: int,
+                    target_width: int, target_height: int) -> Tuple[Tuple[int, int], ...]:
+    """Zone polygon scaled from its base canvas to a target frame size (memoized across tasks,
+    since every task loads fresh Zone objects but most tasks share a few source resolutions)"""
+    sx = float(target_width) / float(base_width)
+    sy = float(target_height) / float(base_height)
+    return tuple((int(round(x * sx)), int(round(y * sy))) for x, y in polygon)
+
+
 class Zone:
     """Represents a detection zone with vehicle class restrictions"""
     
@@ -28,6 +77,8 @@ class Zone:
         self.zone_id = zone_id
         self.name = name
         self.polygon = polygon
+        # Polygon in base_width x base_height coordinates; rescale_to always scales from it
+        self._source_polygon = tuple((int(p[0]), int(p[1])) for p in polygon)
         self.allowed_classes = allowed_classes
         self.color = color
         self.base_width = base_width
@@ -45,6 +96,12 @@ class Zone:
             self._bbox_min = np.array([0, 0])
             self._bbox_max = np.array([0, 0])
     
+    @property
+    def polygon_array(self) -> np.ndarray:
+        """Cached (N, 2) int32 polygon array; shared with the zone, so do not modify it.
+        A new array is built whenever the polygon changes (update_cache, rescale_to)."""
+        return self._polygon_array
+    
     def contains_point(self, point: Tuple[float, float]) -> bool:
         """Check if point is inside zone polygon with fast rejection"""
         x, y = point
@@ -57,6 +114,49 @@ class Zone:
         # Use cached numpy array for polygon test
         return cv2.pointPolygonTest(self._polygon_array, (float(x), float(y)), False) >= 0
     
+    def contains_points(self, points: np.ndarray) -> np.ndarray:
+        """
+        Vectorized contains_point for many points at once
+        
+        Uses the even-odd ray casting rule over all polygon edges in one NumPy
+        broadcast; points on an edge count as inside (as pointPolygonTest >= 0).
+        
+        Args:
+            points: (N, 2) array of (x, y) points
+            
+        Returns:
+            (N,) boolean array
+        """
+        pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        inside = np.zeros(len(pts), dtype=bool)
+        if len(self._polygon_array) < 3 or len(pts) == 0:
+            return inside
+        
+        # Fast bounding box rejection test
+        candidates = np.all((pts >= self._bbox_min) & (pts <= self._bbox_max), axis=1)
+        if not candidates.any():
+            return inside
+        
+        px = pts[candidates, 0:1]
+        py = pts[candidates, 1:2]
+        poly = self._polygon_array.astype(np.float64)
+        x0, y0 = poly[:, 0], poly[:, 1]
+        x1, y1 = np.roll(x0, -1), np.roll(y0, -1)
+        
+        # Edges straddling the horizontal ray through each point, crossed to the right of it
+        straddles = (y0 > py) != (y1 > py)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_cross = x0 + (py - y0) * (x1 - x0) / (y1 - y0)
+        crossings = np.count_nonzero(straddles & (px < x_cross), axis=1)
+        
+        # Points lying exactly on an edge
+        on_edge = (((px - x0) * (y1 - y0) - (py - y0) * (x1 - x0)) == 0) & \
+                  (px >= np.minimum(x0, x1)) & (px <= np.maximum(x0, x1)) & \
+                  (py >= np.minimum(y0, y1)) & (py <= np.maximum(y0, y1))
+        
+        inside[candidates] = (crossings % 2 == 1) | on_edge.any(axis=1)
+        return inside
+    
     def is_vehicle_allowed(self, vehicle_class: str) -> bool:
         """Check if vehicle class is allowed in this zone"""
         return vehicle_class in self.allowed_classes
@@ -119,8 +219,15 @@ class ZoneManager:
         """
         self.config_path = Path(config_path)
         self.zones: List[Zone] = []
+        # (width, height, polygon arrays, mask) of the last build_selected_mask call
+        self._mask_cache = None
         self.load_zones()
     
+    @property
+    def count(self) -> int:
+        """Number of zones (len of the list, so it stays correct however zones is changed)"""
+        return len(self.zones)
+    
     def add_zone(self, zone: Zone):
         """Add a new zone"""
         # Check for duplicate zone_id
@@ -149,6 +256,36 @@ class ZoneManager:
                 return zone
         return None
     
+    def build_selected_mask(self, width: int, height: int, zone_ids: List[str]) -> np.ndarray:
+        """
+        Rasterize the union of the given zones into a frame-sized mask
+        
+        The mask is rebuilt only when the frame size or a zone polygon changes
+        (rescale_to and reloads give zones new polygon arrays), so per-frame zone
+        tests become one array lookup per detection instead of polygon tests.
+        
+        Args:
+            width: Frame width
+            height: Frame height
+            zone_ids: Zones to include
+            
+        Returns:
+            (height, width) uint8 mask, non-zero inside any of the zones
+        """
+        polygons = tuple(zone.polygon_array for zone in (self.get_zone(z) for z in zone_ids)
+                         if zone is not None and len(zone.polygon_array) >= 3)
+        cache = self._mask_cache
+        if (cache is not None and cache[0] == width and cache[1] == height and len(cache[2]) == len(polygons)
+                and all(a is b for a, b in zip(cache[2], polygons))):
+            return cache[3]
+        
+        mask = np.zeros((height, width), dtype=np.uint8)
+        if polygons:
+            cv2.fillPoly(mask, [p.reshape(-1, 1, 2) for p in polygons], 1)
+        # Keep the arrays themselves so identity checks cannot match a recycled object
+        self._mask_cache = (width, height, polygons, mask)
+        return mask
+    
     def get_zones_at_point(self, point: Tuple[float, float]) -> List[Zone]:
         """Get all zones containing the point"""
         return [zone for zone in self.zones if zone.contains_point(point)]
@@ -199,6 +336,64 @@ class ZoneManager:
             'total_zones': len(zones_at_point)
         }
     
+    def check_violations(self, vehicle_centers: np.ndarray, vehicle_classes: List[str],
+                         selected_zone_ids: List[str] = None) -> List[Dict]:
+        """
+        Batch version of check_violation for all vehicles in a frame
+        
+        Zone membership is computed once as an (N vehicles, M zones) matrix
+        with Zone.contains_points instead of N x M point tests.
+        
+        Args:
+            vehicle_centers: (N, 2) array of vehicle (x, y) points
+            vehicle_classes: Vehicle class name per point
+            selected_zone_ids: Only check violations in these zones
+            
+        Returns:
+            List of violation dictionaries (same format as check_violation), one per vehicle
+        """
+        zones = self.zones
+        if selected_zone_ids:
+            zones = [z for z in zones if z.zone_id in selected_zone_ids]
+        
+        n = len(vehicle_classes)
+        if zones and n:
+            membership = np.stack([zone.contains_points(vehicle_centers) for zone in zones], axis=1)
+        else:
+            membership = np.zeros((n, len(zones)), dtype=bool)
+        
+        results = []
+        for i, vehicle_class in enumerate(vehicle_classes):
+            zones_at_point = [zone for zone, inside in zip(zones, membership[i]) if inside]
+            if not zones_at_point:
+                # Not in any selected zone - no violation
+                results.append({
+                    'is_violating': False,
+                    'violation_type': None,
+                    'zones': []
+                })
+                continue
+            
+            # Check if vehicle is allowed in all zones it occupies
+            violating_zones = []
+            for zone in zones_at_point:
+                if not zone.is_vehicle_allowed(vehicle_class):
+                    violating_zones.append({
+                        'zone_id': zone.zone_id,
+                        'zone_name': zone.name,
+                        'allowed_classes': zone.allowed_classes,
+                        'vehicle_class': vehicle_class
+                    })
+            
+            results.append({
+                'is_violating': len(violating_zones) > 0,
+                'violation_type': 'wrong_lane_zone' if violating_zones else None,
+                'zones': violating_zones,
+                'total_zones': len(zones_at_point)
+            })
+        
+        return results
+    
     def draw_zones(self, frame: np.ndarray, alpha: float = 0.3) -> np.ndarray:
         """
         Draw zones on frame with transparency
@@ -240,15 +435,12 @@ class ZoneManager:
     
     def save_zones(self):
         """Save zones to configuration file"""
-        self.config_path.parent.mkdir(parents=True, exist_ok=True)
-        
         data = {
             'zones': [zone.to_dict() for zone in self.zones],
             'version': '1.0'
         }
         
-        with open(self.config_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        write_json_atomic(self.config_path, data)
         
         Logger.info(f"Saved {len(self.zones)} zones to {self.config_path}")
     
@@ -272,6 +464,7 @@ class ZoneManager:
     def rescale_to(self, target_width: int, target_height: int):
         """Rescale all zones from their base size to the target frame size.
         If base size is missing, zones are assumed to already be in target scale.
+        Scaled polygons are memoized by (polygon, base size, target size).
         """
         if target_width <= 0 or target_height <= 0:
             Logger.warning("Invalid target size for rescaling zones")
@@ -279,14 +472,13 @@ class ZoneManager:
         
         for zone in self.zones:
             if zone.base_width and zone.base_height and zone.base_width > 0 and zone.base_height > 0:
-                sx = float(target_width) / float(zone.base_width)
-                sy = float(target_height) / float(zone.base_height)
-                zone.polygon = [
-                    (int(round(p[0] * sx)), int(round(p[1] * sy))) for p in zone.polygon
-                ]
+                # Scale from the stored base polygon, so repeated calls do not compound
+                zone.polygon = list(_scaled_polygon(zone._source_polygon, int(zone.base_width), int(zone.base_height),
+                                                    int(target_width), int(target_height)))
                 # Update cached arrays after rescaling
                 zone.update_cache()
-                Logger.info(f"Rescaled zone {zone.zone_id} '{zone.name}' by factors sx={sx:.3f}, sy={sy:.3f}")
+                Logger.info(f"Rescaled zone {zone.zone_id} '{zone.name}' from {zone.base_width}x{zone.base_height} "
+                            f"to {target_width}x{target_height}")
             else:
                 # No base size; assume already correct scale
                 Logger.debug(f"Zone {zone.zone_id} has no base size; skipping rescale")
@@ -299,3 +491,193 @@ class ZoneManager:
     def get_all_zones(self) -> List[Dict]:
         """Get all zones as dictionaries"""
         return [zone.to_dict() for zone in self.zones]
+
+
+class TaskZoneStore:
+    """In-memory write-back cache of per-task zone files (data/tasks/<task_id>/zones.json)
+    
+    Edits update the cache immediately and mark the task dirty; dirty tasks are written
+    to disk together after flush_delay seconds, so a burst of polygon edits from the UI
+    costs one file write. Call flush(task_id) before anything reads the file directly.
+    A clean cache entry is reused while the file's mtime is the one it was read or
+    written with, so a file replaced outside the server is picked up on the next read.
+    """
+    
+    def __init__(self, base_dir: str = "data/tasks", flush_delay: float = 0.5):
+        """
+        Initialize zone store
+        
+        Args:
+            base_dir: Directory holding one sub-directory per task
+            flush_delay: Seconds to coalesce edits before writing dirty tasks
+        """
+        self.base_dir = Path(base_dir)
+        self.flush_delay = flush_delay
+        self._cache: Dict[str, Dict] = {}
+        # task_id -> st_mtime_ns of zones.json when the cached zones were read/written
+        self._mtimes: Dict[str, int] = {}
+        self._dirty = set()
+        self._lock = threading.RLock()
+        self._timer = None
+        # task_id -> zones.json path, and tasks whose directory is known to exist
+        self._paths: Dict[str, Path] = {}
+        self._dirs_ready = set()
+        atexit.register(self.flush)
+    
+    def path(self, task_id: str) -> Path:
+        """zones.json path of a task (built once per task)"""
+        path = self._paths.get(task_id)
+        if path is None:
+            path = self._paths[task_id] = self.base_dir / task_id / 'zones.json'
+        return path
+    
+    def ensure_dir(self, task_id: str) -> Path:
+        """
+        Create the task directory on first call only
+        
+        Args:
+            task_id: Task ID
+            
+        Returns:
+            Task directory path
+        """
+        task_dir = self.path(task_id).parent
+        if task_id not in self._dirs_ready:
+            task_dir.mkdir(parents=True, exist_ok=True)
+            self._dirs_ready.add(task_id)
+        return task_dir
+    
+    def _file_mtime(self, task_id: str) -> Optional[int]:
+        """st_mtime_ns of a task's zones.json, or None if there is no file"""
+        try:
+            return os.stat(self.path(task_id)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+    
+    def _load(self, task_id: str) -> Optional[Dict[str, Dict]]:
+        """Cached zones of a task as {zone_id: zone}, read from disk on first access or after
+        the file changed (None if no file)"""
+        zones = self._cache.get(task_id)
+        # Unflushed edits are newer than the file, so only clean entries are revalidated
+        if zones is not None and (task_id in self._dirty
+                                  or self._file_mtime(task_id) == self._mtimes.get(task_id)):
+            return zones
+        
+        self._cache.pop(task_id, None)
+        self._mtimes.pop(task_id, None)
+        try:
+            with open(self.path(task_id), 'r', encoding='utf-8') as f:
+                mtime = os.fstat(f.fileno()).st_mtime_ns
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        # On disk zones stay a list (ZoneManager reads the same file); index them by id here
+        zone_list = data.get('zones', []) if isinstance(data, dict) else []
+        zones = self._cache[task_id] = {z.get('zone_id'): z for z in zone_list}
+        self._mtimes[task_id] = mtime
+        return zones
+    
+    def get_zones(self, task_id: str) -> Optional[List[Dict]]:
+        """
+        Get zones of a task
+        
+        Args:
+            task_id: Task ID
+            
+        Returns:
+            List of zone dicts, or None if the task has no zone file yet
+        """
+        with self._lock:
+            zones = self._load(task_id)
+            return None if zones is None else list(zones.values())
+    
+    def zone_ids(self, task_id: str) -> Optional[List[str]]:
+        """Zone ids of a task in zone order, or None if the task has no zone file yet"""
+        with self._lock:
+            zones = self._load(task_id)
+            return None if zones is None else list(zones)
+    
+    def unknown_zone_ids(self, task_id: str, zone_ids) -> set:
+        """Ids in zone_ids that the task does not define (set difference against the cached zone keys)"""
+        with self._lock:
+            zones = self._load(task_id) or {}
+            return set(zone_ids) - zones.keys()
+    
+    def put_zone(self, task_id: str, zone: Dict):
+        """Add a zone to a task, replacing any zone with the same zone_id"""
+        with self._lock:
+            zones = self._load(task_id)
+            if zones is None:
+                zones = self._cache[task_id] = {}
+            # A replaced zone moves to the end, as when zones were a list
+            zones.pop(zone['zone_id'], None)
+            zones[zone['zone_id']] = zone
+            self._mark_dirty(task_id)
+    
+    def delete_zone(self, task_id: str, zone_id: str) -> bool:
+        """
+        Remove a zone from a task
+        
+        Returns:
+            False if the task has no zone file, True otherwise
+        """
+        with self._lock:
+            zones = self._load(task_id)
+            if zones is None:
+                return False
+            zones.pop(zone_id, None)
+            self._mark_dirty(task_id)
+            return True
+    
+    def _mark_dirty(self, task_id: str):
+        """Queue a task for the next debounced flush (caller holds the lock)"""
+        self._dirty.add(task_id)
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+    
+    def flush(self, task_id: str = None):
+        """
+        Write dirty zone files to disk
+        
+        A task whose file could not be written stays dirty and is retried by the
+        next debounced flush.
+        
+        Args:
+            task_id: Only flush this task (None = all dirty tasks)
+            
+        Raises:
+            OSError (or the JSON encoding error): if task_id is given and its file could not be
+            written, so callers that read the file next do not run on stale zones
+        """
+        with self._lock:
+            if task_id is None:
+                pending, self._dirty = self._dirty, set()
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            elif task_id in self._dirty:
+                self._dirty.discard(task_id)
+                pending = {task_id}
+            else:
+                return
+            
+            error = None
+            for tid in pending:
+                try:
+                    self._write(tid, {'zones': list(self._cache[tid].values())})
+                except Exception as e:
+                    Logger.error(f"Failed to save zones for {tid}: {e}")
+                    # Keep the edits queued and re-arm the timer to retry the write
+                    self._mark_dirty(tid)
+                    error = e
+            if error is not None and task_id is not None:
+                raise error
+    
+    def _write(self, task_id: str, data: Dict):
+        """Write zones data atomically so readers never see a partial file"""
+        self.ensure_dir(task_id)
+        write_json_atomic(self.path(task_id), data, make_dirs=False)
+        # Write-through: the cache already holds this data, so the new file needs no re-read
+        self._mtimes[task_id] = self._file_mtime(task_id)
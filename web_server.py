@@ -45,8 +45,8 @@ def main():
         print("  Press Ctrl+C to stop the server")
         print("\n" + "="*70 + "\n")
         
-        # Run Flask app
-        app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
+        # Run server (waitress if installed, otherwise Flask dev server)
+        server.run(debug=False)
         
     except ImportError as e:
         print(f"\nError: Missing required packages")